@@ -1,65 +1,80 @@
 # coding:utf-8
-import gym
-import numpy as np
 import time
+from discretizer import Discretizer
+import qtable_io
+import tabular_q
 
+max_number_of_steps = 200   # 1試行のstep数
+num_episodes = 1000         # 総試行回数
+num_digitized = 6           # 分割数
+backend = 'dense'           # 'hash'にすると訪れた状態の分だけQテーブルを確保する（分割数を大きくする時）
+snapshot_interval = 100     # このエピソード数ごとにQテーブルを保存する
+resume = False              # Trueにすると保存したQテーブルから学習を再開する
+record = None               # 'frames'にすると画面に描画せず、録画してこのディレクトリに書き出す（書き出しは別スレッド）
+record_rgb_array = True     # Trueならenv.render(mode='rgb_array')の画像、Falseなら状態から別スレッドで描く合成画像を録画する
+qtable_file = 'Qvalue' + qtable_io.EXTENSION
+# 位置・速度・角度・角速度の区切りは最初に１度だけ作る（状態番号は p + v*d + a*d^2 + w*d^3）
+discretizer = Discretizer.uniform(
+    low=[-2.4, -3.0, -0.5, -2.0], high=[2.4, 3.0, 0.5, 2.0], bins=num_digitized)
 
-def digitize_state(observation):
-    p, v, a, w = observation
-    d = num_digitized
-    pn = np.digitize(p, np.linspace(-2.4, 2.4, d+1)[1:-1])
-    vn = np.digitize(v, np.linspace(-3.0, 3.0, d+1)[1:-1])
-    an = np.digitize(a, np.linspace(-0.5, 0.5, d+1)[1:-1])
-    wn = np.digitize(w, np.linspace(-2.0, 2.0, d+1)[1:-1])
-    return pn + vn*d + an*d**2 + wn*d**3
-
-
-def get_action(next_state, episode):
-    epsilon = 0.5 * (1 / (episode + 1))
-    if epsilon <= np.random.uniform(0, 1):
-        a = np.where(q_table[next_state] == q_table[next_state].max())[0]
-        next_action = np.random.choice(a)
-    else:
-        next_action = np.random.choice([0, 1])
-    return next_action
 
+def digitize_state(observation):
+    return discretizer.encode(observation)
 
-def update_Qtable(q_table, state, action, reward, next_state):
-    gamma = 0.99
-    alpha = 0.5
-    next_maxQ = max(q_table[next_state])
-    q_table[state, action] = (
-        1 - alpha) * q_table[state, action] + alpha * (reward + gamma * next_maxQ)
-    return q_table
 
+if __name__ == '__main__':   # importした時は関数だけ使えるようにする（benchmark.pyなど）
+    import gym
+    env = gym.make('CartPole-v0')
+    q_table = tabular_q.make_table(backend, discretizer.n_states, env.action_space.n, low=-1, high=1)
+    start = 0
+    if resume:  # 区切りが違うQテーブルは使えないので、離散化の設定も確かめる
+        saved, meta = tabular_q.resume(qtable_file, q_table, discretizer=discretizer.spec())
+        if saved is not None:
+            q_table, start = saved, meta['episode'] + 1
+            print('resume from episode', start)
+    agent = tabular_q.TabularQ(q_table, gamma=0.99, alpha=0.5)
+    recorder = None
+    if record is not None:
+        from frame_recorder import FrameRecorder, draw_cartpole
+        recorder = FrameRecorder(record, draw=None if record_rgb_array else draw_cartpole)
 
-env = gym.make('CartPole-v0')
-max_number_of_steps = 200   # 1試行のstep数
-num_episodes = 1000         # 総試行回数
-num_digitized = 6           # 分割数
-q_table = np.random.uniform(
-    low=-1, high=1, size=(num_digitized**4, env.action_space.n))
-#q_table = np.loadtxt('Qvalue.txt')
+    def snapshot(episode):
+        # εは 0.5 / (episode + 1) なので、エピソード数が分かれば続きから同じ値になる
+        tabular_q.save(qtable_file, agent.table, discretizer=discretizer.spec(), episode=episode,
+                       epsilon={'schedule': '0.5/(episode+1)', 'value': 0.5 / (episode + 1)})
 
-for episode in range(num_episodes):  # 試行数分繰り返す
-    # 環境の初期化
-    observation = env.reset()
-    state = digitize_state(observation)
-    action = np.argmax(q_table[state])
-    episode_reward = 0
+    for episode in range(start, num_episodes):  # 試行数分繰り返す
+        # 環境の初期化
+        observation = env.reset()
+        state = digitize_state(observation)
+        action = agent.greedy_action(state)
+        episode_reward = 0
 
-    for t in range(max_number_of_steps):    # 1試行のループ
-        if episode % 10 == 0:
-            env.render()
-        observation, reward, done, info = env.step(action)
-        if done and t < max_number_of_steps - 1:
-            reward -= max_number_of_steps   # 棒が倒れたら罰則
-        episode_reward += reward
-        next_state = digitize_state(observation)  # t+1までの観測状態を、離散値に変換
-        q_table = update_Qtable(q_table, state, action, reward, next_state)
-        action = get_action(next_state, episode)    # a_{t+1}
-        state = next_state
-        if done:
-            break
-    print('end episode:', episode, 'R:', episode_reward)
-np.savetxt('Qvalue.txt', q_table)
+        for t in range(max_number_of_steps):    # 1試行のループ
+            if episode % 10 == 0:
+                if recorder is not None:    # キューに入れるだけで、圧縮して書き出すのは別スレッド
+                    recorder.add(episode, env.render(mode='rgb_array') if record_rgb_array
+                                 else tuple(env.unwrapped.state))
+                else:
+                    env.render()
+            observation, reward, done, info = env.step(action)
+            if done and t < max_number_of_steps - 1:
+                reward -= max_number_of_steps   # 棒が倒れたら罰則
+            episode_reward += reward
+            next_state = digitize_state(observation)  # t+1までの観測状態を、離散値に変換
+            agent.update(state, action, reward, next_state)
+            action = agent.get_action(next_state, episode)    # a_{t+1}
+            state = next_state
+            if done:
+                break
+        print('end episode:', episode, 'R:', episode_reward)
+        if recorder is not None:
+            recorder.check()    # 録画のスレッドで起きたエラーはここで止める
+        if (episode + 1) % snapshot_interval == 0:
+            snapshot(episode)
+    snapshot(num_episodes - 1)
+    if recorder is not None:
+        recorder.close()
+        print('recorded:', len(recorder.written), 'episodes, dropped frames:', recorder.dropped)
+    print('visited states:', agent.table.n_visited(), '/', discretizer.n_states,
+          'memory: {:.1f} MB'.format(agent.table.nbytes() / 2.0 ** 20))
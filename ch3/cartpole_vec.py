@@ -0,0 +1,223 @@
+# coding:utf-8
+""" NumPyで書いた倒立振子（CartPole-v0）をN個まとめて進める
+
+力学・終了条件・200ステップの上限・初期状態（±0.05の一様乱数）はgymのCartPole-v0と同じ。
+N個のカートの状態を (N, 4) の配列で持ち、１回のstepで全て進める。描画はしない。
+auto_reset=True なら終わった環境はstepの中で初期化し、終わった時の観測は infos['terminal_observation'] に入れる。
+
+python cartpole_vec.py                     # gymとの軌道の一致を確かめ（gymがあれば）、steps/sを比べる
+python cartpole_vec.py --train 2000        # N個の環境でQテーブルを学習する（cartpole.pyと同じ離散化・更新式）
+"""
+from __future__ import print_function
+import argparse
+import time
+import numpy as np
+import qtable_io
+
+gravity = 9.8
+masscart = 1.0
+masspole = 0.1
+total_mass = masspole + masscart
+length = 0.5    # 棒の長さの半分
+polemass_length = masspole * length
+force_mag = 10.0
+tau = 0.02      # 状態を更新する時間の刻み（オイラー法）
+theta_threshold_radians = 12 * 2 * np.pi / 360
+x_threshold = 2.4
+max_episode_steps = 200
+
+
+class Discrete():
+    """ gym.spaces.Discreteの代わり（DQNのrandom_action_funcなどで使う分だけ） """
+
+    def __init__(self, n, rng):
+        self.n = n
+        self.rng = rng
+
+    def sample(self):
+        return self.rng.randint(self.n)
+
+
+class Box():
+    def __init__(self, shape):
+        self.shape = shape
+
+
+class VecCartPole():
+    """ N個のCartPole-v0。stepは (観測 (N, 4), 報酬 (N,), 終了 (N,), infos) を返す
+
+    infos['truncated']: 200ステップの上限で終わった環境（棒が倒れたわけではない）
+    infos['terminal_observation']: 終わった時の観測（auto_resetで初期化する前の値）
+    """
+
+    def __init__(self, n_envs, seed=None, auto_reset=True):
+        self.n_envs = n_envs
+        self.auto_reset = auto_reset
+        self.rng = np.random.RandomState(seed)
+        self.action_space = Discrete(2, self.rng)
+        self.observation_space = Box((4,))
+        self.state = np.zeros((n_envs, 4))
+        self.elapsed = np.zeros(n_envs, dtype=np.int64)
+        self.reset()
+
+    def reset(self, mask=None):
+        """ maskがTrueの環境はそのままにして、それ以外を初期化し、全ての環境の観測を返す """
+        reset = np.ones(self.n_envs, dtype=bool) if mask is None else ~np.asarray(mask, dtype=bool)
+        n = int(reset.sum())
+        if n:
+            self.state[reset] = self.rng.uniform(low=-0.05, high=0.05, size=(n, 4))
+            self.elapsed[reset] = 0
+        return self.state.copy()
+
+    def step(self, actions):
+        x, x_dot, theta, theta_dot = self.state.T
+        force = np.where(np.asarray(actions) == 1, force_mag, -force_mag)
+        costheta = np.cos(theta)
+        sintheta = np.sin(theta)
+        temp = (force + polemass_length * theta_dot ** 2 * sintheta) / total_mass
+        thetaacc = (gravity * sintheta - costheta * temp) / (
+            length * (4.0 / 3.0 - masspole * costheta ** 2 / total_mass))
+        xacc = temp - polemass_length * thetaacc * costheta / total_mass
+        self.state = np.stack([x + tau * x_dot, x_dot + tau * xacc,
+                               theta + tau * theta_dot, theta_dot + tau * thetaacc], axis=1)
+        self.elapsed += 1
+        x, theta = self.state[:, 0], self.state[:, 2]
+        fallen = (x < -x_threshold) | (x > x_threshold) | \
+            (theta < -theta_threshold_radians) | (theta > theta_threshold_radians)
+        truncated = ~fallen & (self.elapsed >= max_episode_steps)
+        dones = fallen | truncated
+        rewards = np.ones(self.n_envs)  # 倒れたステップも報酬は1（gymと同じ）
+        infos = {'truncated': truncated, 'terminal_observation': self.state.copy()}
+        if self.auto_reset and dones.any():
+            return self.reset(~dones), rewards, dones, infos
+        return self.state.copy(), rewards, dones, infos
+
+    def close(self):
+        pass
+
+
+def check_against_gym(n_envs=4, n_steps=1000, seed=0):
+    """ 同じseedで初期化したgymの環境と、同じ行動の列で軌道が一致するかを確かめる
+
+    gymの乱数の作り方は真似できないので、gymがreset()した状態をVecCartPoleに写してから同じ行動で進める。
+    一致しなかった最大の差を返す。
+    """
+    import gym
+    envs = [gym.make('CartPole-v0') for _ in range(n_envs)]
+    vec = VecCartPole(n_envs, seed=seed, auto_reset=False)
+    for k, env in enumerate(envs):
+        env.seed(seed + k)
+        vec.state[k] = env.reset()
+    rng = np.random.RandomState(seed)
+    max_diff = 0.0
+    for _ in range(n_steps):
+        actions = rng.randint(0, 2, size=n_envs)
+        obs, rewards, dones, infos = vec.step(actions)
+        for k, env in enumerate(envs):
+            o, r, d, info = env.step(int(actions[k]))
+            max_diff = max(max_diff, float(np.abs(obs[k] - o).max()))
+            assert d == dones[k] and r == rewards[k], (k, d, dones[k])
+            assert info.get('TimeLimit.truncated', False) == infos['truncated'][k]
+            if d:
+                vec.state[k] = env.reset()
+                vec.elapsed[k] = 0
+    for env in envs:
+        env.close()
+    return max_diff
+
+
+def steps_per_second(n_envs, n_steps=200000, seed=0):
+    """ ランダムな行動で合計n_stepsだけ進めた時の１秒あたりのステップ数 """
+    vec = VecCartPole(n_envs, seed=seed)
+    rng = np.random.RandomState(seed)
+    n_iter = max(1, n_steps // n_envs)
+    actions = rng.randint(0, 2, size=(n_iter, n_envs))
+    start = time.perf_counter()
+    for a in actions:
+        vec.step(a)
+    return n_iter * n_envs / (time.perf_counter() - start)
+
+
+def gym_steps_per_second(n_steps=20000, seed=0):
+    import gym
+    env = gym.make('CartPole-v0')
+    env.seed(seed)
+    env.reset()
+    rng = np.random.RandomState(seed)
+    actions = rng.randint(0, 2, size=n_steps).tolist()
+    start = time.perf_counter()
+    for a in actions:
+        done = env.step(a)[2]
+        if done:
+            env.reset()
+    return n_steps / (time.perf_counter() - start)
+
+
+def train_tabular(n_envs=100, num_episodes=2000, seed=0):
+    """ cartpole.pyと同じQ学習を、N個の環境で１つのQテーブルを共有して行う
+
+    同じステップで同じ (状態, 行動) を更新した環境があれば、そのうち１つの更新だけが残る。
+    """
+    import cartpole
+    np.random.seed(seed)
+    env = VecCartPole(n_envs, seed=seed)
+    gamma, alpha = 0.99, 0.5
+    q_table = np.random.uniform(low=-1, high=1, size=(cartpole.discretizer.n_states, 2))
+    observation = env.reset()
+    state = cartpole.discretizer.encode(observation)
+    action = q_table[state].argmax(axis=1)
+    episode_reward = np.zeros(n_envs)
+    episode = 0
+    rewards_log = []
+    steps = 0
+    start = time.perf_counter()
+    while episode < num_episodes:
+        observation, reward, done, info = env.step(action)
+        steps += n_envs
+        reward = reward - np.where(done & ~info['truncated'], max_episode_steps, 0)   # 棒が倒れたら罰則
+        episode_reward += reward
+        # 終わった環境は初期化前の観測でQテーブルを更新する
+        next_state = cartpole.discretizer.encode(np.where(done[:, None], info['terminal_observation'], observation))
+        target = reward + gamma * q_table[next_state].max(axis=1)
+        q_table[state, action] = (1 - alpha) * q_table[state, action] + alpha * target
+        # ε-greedy（εは終わったエピソードの合計数から決める）
+        epsilon = 0.5 * (1 / (episode + 1))
+        greedy = q_table[next_state].argmax(axis=1)
+        action = np.where(np.random.uniform(0, 1, size=n_envs) < epsilon,
+                          np.random.randint(0, 2, size=n_envs), greedy)
+        if done.any():
+            rewards_log.extend(episode_reward[done].tolist())
+            episode += int(done.sum())
+            episode_reward[done] = 0
+            # 初期化した環境は新しい観測から行動を選び直す
+            state = np.where(done, cartpole.discretizer.encode(observation), next_state)
+            action[done] = q_table[state[done]].argmax(axis=1)
+        else:
+            state = next_state
+    return q_table, rewards_log, steps / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--envs', type=int, default=1000, help='同時に進める環境の数')
+    parser.add_argument('--train', type=int, default=0, help='Qテーブルを学習するエピソード数')
+    args = parser.parse_args()
+    if args.train:
+        q_table, rewards, rate = train_tabular(args.envs, args.train)
+        for k in range(0, len(rewards), max(1, len(rewards) // 10)):
+            print('episode:', k, 'R(直近100):', np.mean(rewards[max(0, k - 99):k + 1]))
+        print('{:.0f} steps/s'.format(rate))
+        import cartpole
+        qtable_io.save(cartpole.qtable_file, q_table, discretizer=cartpole.discretizer.spec(), episode=args.train - 1)
+    else:
+        try:
+            print('gymとの最大の差: {:.3g}'.format(check_against_gym()))
+            base = gym_steps_per_second()
+            print('gym CartPole-v0 (1環境): {:.0f} steps/s'.format(base))
+        except ImportError:
+            print('gymがないので、gymとの比較は省略')
+            base = None
+        for n in (1, 100, 1000, 10000):
+            rate = steps_per_second(n)
+            print('VecCartPole ({:5d} 環境): {:12.0f} steps/s{}'.format(
+                n, rate, '' if base is None else ' ({:.1f}倍)'.format(rate / base)))
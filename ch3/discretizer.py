@@ -0,0 +1,89 @@
+# coding:utf-8
+""" 連続値の観測を離散的な状態番号に変換する
+
+次元ごとの区切り（edges）を最初に１度だけ作っておき、観測をまとめて状態番号に変換する。
+状態番号は cartpole.py の digitize_state と同じく、次元kの区間番号に bins[0]*...*bins[k-1] を掛けて足したもの。
+区切りは一様（uniform）でも、次元ごとに任意の値（不等間隔）でもよい。
+
+python discretizer.py で digitize_state との一致と、１秒あたりの変換数を調べる。
+"""
+from __future__ import print_function
+import time
+import numpy as np
+
+
+class Discretizer():
+    """ edges: 次元ごとの内側の区切りのリスト（次元kの区間数は len(edges[k]) + 1） """
+
+    def __init__(self, edges):
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        self.bins = np.array([len(e) + 1 for e in self.edges], dtype=np.int64)
+        self.strides = np.concatenate(([1], np.cumprod(self.bins)[:-1]))
+        self.n_states = int(np.prod(self.bins))
+        # 区切りの数が次元で違っても一度に比べられるよう、足りない分を+infで埋める
+        width = max(len(e) for e in self.edges)
+        self.table = np.full((len(self.edges), width), np.inf)
+        for k, e in enumerate(self.edges):
+            self.table[k, :len(e)] = e
+
+    @classmethod
+    def uniform(cls, low, high, bins):
+        """ 次元ごとに [low, high] をbins等分する（binsは整数なら全次元共通） """
+        bins = np.broadcast_to(bins, np.shape(low))
+        return cls([np.linspace(l, h, b + 1)[1:-1] for l, h, b in zip(low, high, bins)])
+
+    def spec(self):
+        """ 区切りをJSONにできる形で（Qテーブルのメタデータに残して、同じ離散化かを確かめる） """
+        return [e.tolist() for e in self.edges]
+
+    def encode(self, obs):
+        """ (B, D) の観測を (B,) の状態番号に変換する。(D,) の観測１つなら整数を返す """
+        obs = np.asarray(obs, dtype=np.float64)
+        single = obs.ndim == 1
+        # 各次元で、観測以下の区切りの数 = np.digitize の区間番号
+        index = (obs.reshape(-1, len(self.edges), 1) >= self.table).sum(axis=2)
+        states = index.dot(self.strides)
+        return int(states[0]) if single else states
+
+    def decode(self, states):
+        """ 状態番号から次元ごとの区間番号 (B, D) に戻す """
+        return (np.asarray(states)[..., None] // self.strides) % self.bins
+
+
+if __name__ == '__main__':
+    import cartpole
+    d = cartpole.num_digitized
+    low, high = [-2.4, -3.0, -0.5, -2.0], [2.4, 3.0, 0.5, 2.0]
+
+    def digitize_state(observation):
+        """ 以前の cartpole.digitize_state（毎回np.linspaceで区切りを作る） """
+        p, v, a, w = observation
+        pn = np.digitize(p, np.linspace(-2.4, 2.4, d+1)[1:-1])
+        vn = np.digitize(v, np.linspace(-3.0, 3.0, d+1)[1:-1])
+        an = np.digitize(a, np.linspace(-0.5, 0.5, d+1)[1:-1])
+        wn = np.digitize(w, np.linspace(-2.0, 2.0, d+1)[1:-1])
+        return pn + vn*d + an*d**2 + wn*d**3
+
+    discretizer = Discretizer.uniform(low, high, d)
+    obs = np.random.RandomState(0).uniform(-1.2, 1.2, size=(100000, 4)) * np.array(high)
+    expected = np.array([digitize_state(o) for o in obs[:10000]])
+    assert np.array_equal(discretizer.encode(obs[:10000]), expected)
+    assert all(discretizer.encode(o) == e for o, e in zip(obs[:1000], expected))
+    uneven = Discretizer([[-1.0, 0.0, 0.5], [-2.0, 2.0], [0.0], [-0.3, -0.1, 0.1, 0.3]])
+    assert np.array_equal(uneven.encode(obs[:1000]), sum(
+        np.digitize(obs[:1000, k], e) * s for k, (e, s) in enumerate(zip(uneven.edges, uneven.strides))))
+
+    results = []
+    start = time.perf_counter()
+    for o in obs[:10000]:
+        digitize_state(o)
+    results.append(('digitize_state（以前）', 10000 / (time.perf_counter() - start)))
+    start = time.perf_counter()
+    for o in obs[:10000]:
+        discretizer.encode(o)
+    results.append(('Discretizer.encode（１つずつ）', 10000 / (time.perf_counter() - start)))
+    start = time.perf_counter()
+    discretizer.encode(obs)
+    results.append(('Discretizer.encode（まとめて）', len(obs) / (time.perf_counter() - start)))
+    for name, rate in results:
+        print('{:32s} {:12.0f} steps/s ({:.1f}倍)'.format(name, rate, rate / results[0][1]))
@@ -0,0 +1,245 @@
+# coding:utf-8
+""" 学習ループと別のスレッドでの描画と録画
+
+学習ループは env.render(mode='rgb_array') の画像（draw=None）か、状態（CartPoleなら4つの値）を add() で
+キューに入れるだけにして、圧縮して書き出すのは別スレッドで行う。
+gymの描画はgymのウィンドウと同じスレッドでしかできないので、rgb_arrayの画像を作るのは学習ループの側になる。
+状態を渡した時は、別スレッドで draw_cartpole が画像を描く。これはgymの画面の大きさと配置を真似た合成画像で、
+gymが描く画像そのものではない。
+キューが一杯の時は待たずにそのフレームを捨てる（捨てた数は dropped）ので、描画が追いつかなくても学習は止まらない。
+エピソードごとに directory/episode_NNNNN.mp4（imageioがあれば）か .npz（(フレーム数, 高さ, 幅, 3) のuint8）に書き出す。
+画像は１枚ずつ書き出し、エピソード分をメモリに溜めない（600x400の画像は１枚720KBある）。
+npzは枚数が分かるまでヘッダを書けないので、一時ファイルに書き足しておき、エピソードの終わりに
+少しずつ読みながら圧縮レベル1で写す（np.loadでそのまま読める）。
+別スレッドでもCPUは使う。CPUが１つの環境で10エピソードごとに録画すると、
+steps/sは録画なしの0.4〜0.55倍（ループ内で描画して書き出すと0.1〜0.2倍）だった。
+CPUが２つ以上ある時の影響は測っていない。
+
+python frame_recorder.py        # 録画なし・別スレッドで録画・ループ内で描画 の steps/s を比べる（合成画像）
+"""
+from __future__ import print_function
+import argparse
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+import numpy as np
+
+# gymのCartPole-v0の描画と同じ大きさ
+SCREEN_WIDTH = 600
+SCREEN_HEIGHT = 400
+SCALE = SCREEN_WIDTH / (2 * 2.4)
+CART_Y = 100    # 画面の下からのカートの高さ
+POLE_WIDTH = 10.0
+POLE_LENGTH = SCALE * 1.0
+CART_WIDTH = 50
+CART_HEIGHT = 30
+CHUNK = 1 << 20     # 一時ファイルからnpzに写す時に１度に読むバイト数
+
+
+def draw_cartpole(state):
+    """ CartPoleの状態 (x, x_dot, theta, theta_dot) から rgb_array の形の合成画像を作る（gymの描画の近似） """
+    x, _, theta, _ = state
+    image = np.full((SCREEN_HEIGHT, SCREEN_WIDTH, 3), 255, dtype=np.uint8)
+    track = SCREEN_HEIGHT - CART_Y
+    image[track, :] = 0
+    cx = x * SCALE + SCREEN_WIDTH / 2.0
+    left, right = int(cx - CART_WIDTH / 2), int(cx + CART_WIDTH / 2)
+    top, bottom = track - CART_HEIGHT // 2, track + CART_HEIGHT // 2
+    image[max(top, 0):bottom, max(left, 0):max(right, 0)] = 0
+    # 棒は軸から角度thetaに伸ばした太さPOLE_WIDTHの線分。周りの矩形の中だけ画素ごとの距離を調べる
+    ax, ay = cx, track - CART_HEIGHT / 4.0
+    tx, ty = ax + POLE_LENGTH * np.sin(theta), ay - POLE_LENGTH * np.cos(theta)
+    r = POLE_WIDTH / 2
+    x0, x1 = int(max(min(ax, tx) - r, 0)), int(min(max(ax, tx) + r + 1, SCREEN_WIDTH))
+    y0, y1 = int(max(min(ay, ty) - r, 0)), int(min(max(ay, ty) + r + 1, SCREEN_HEIGHT))
+    if x0 < x1 and y0 < y1:
+        py, px = np.mgrid[y0:y1, x0:x1]
+        dx, dy = tx - ax, ty - ay
+        t = np.clip(((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy), 0, 1)
+        near = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2 <= r * r
+        image[y0:y1, x0:x1][near] = (204, 153, 102)
+        axle = (px - ax) ** 2 + (py - ay) ** 2 <= r * r
+        image[y0:y1, x0:x1][axle] = (127, 127, 204)
+    return image
+
+
+class FrameWriter():
+    """ 画像を１枚ずつname.mp4（imageioがあれば）かname.npzに書き出す """
+
+    def __init__(self, name, imageio=None, fps=50):
+        self.name = name
+        self.shape = None
+        self.n = 0
+        self.video = None
+        self.spool = None
+        if imageio is not None:
+            try:
+                self.video = imageio.get_writer(name + '.mp4', fps=fps)
+            except Exception:   # 動画の書き出しに対応していない環境ならnpzにする
+                pass
+        if self.video is None:
+            self.spool = tempfile.TemporaryFile(dir=os.path.dirname(name) or '.')
+
+    def append(self, image):
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        if self.shape is None:
+            self.shape = image.shape
+        elif image.shape != self.shape:
+            raise ValueError('画像の大きさが途中で変わりました: {} != {}'.format(image.shape, self.shape))
+        if self.video is not None:
+            try:
+                self.video.append_data(image)
+            except Exception:
+                if self.n:
+                    raise
+                self.video.close()  # 最初の１枚で書けなければnpzにする
+                self.video = None
+                self.spool = tempfile.TemporaryFile(dir=os.path.dirname(self.name) or '.')
+        if self.spool is not None:
+            self.spool.write(image.tobytes())
+        self.n += 1
+
+    def close(self):
+        """ 書き終えたファイル名を返す """
+        if self.video is not None:
+            self.video.close()
+            return self.name + '.mp4'
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.uint8)), 'fortran_order': False,
+                  'shape': (self.n,) + (self.shape or ())}
+        self.spool.seek(0)
+        with zipfile.ZipFile(self.name + '.npz', 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+            with z.open('frames.npy', 'w', force_zip64=True) as f:
+                np.lib.format.write_array_header_1_0(f, header)
+                shutil.copyfileobj(self.spool, f, CHUNK)
+        self.spool.close()
+        return self.name + '.npz'
+
+
+class FrameRecorder():
+    """ フレームをバックグラウンドで画像にして書き出す
+
+    draw: キューに入れた値を画像にする関数（Noneなら add() に渡すのは env.render(mode='rgb_array') の画像そのもの）
+    max_queue: キューに溜められるフレーム数。一杯ならフレームを捨てる
+               （省略時は状態なら1024、画像なら64。600x400の画像64枚で約46MB）
+    """
+
+    def __init__(self, directory='frames', draw=draw_cartpole, max_queue=None, fps=50):
+        if max_queue is None:
+            max_queue = 64 if draw is None else 1024
+        self.directory = directory
+        self.draw = draw
+        self.fps = fps
+        self.dropped = 0
+        self.written = []
+        self.error = None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        try:
+            import imageio
+            self.imageio = imageio
+        except ImportError:     # なければ圧縮したnpzに書き出す
+            self.imageio = None
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self.worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add(self, episode, frame):
+        """ 学習ループから呼ぶ。待たずに戻る（状態は呼んだ側で書き換えられないようコピーを渡す） """
+        try:
+            self.frames.put_nowait((episode, frame))
+        except queue.Full:
+            self.dropped += 1
+
+    def worker(self):
+        """ フレームを届いた順に書き足し、エピソードの番号が変わったらファイルを閉じる """
+        writer = None
+        current = None
+        while True:
+            item = self.frames.get()
+            try:
+                if writer is not None and (item is None or item[0] != current):
+                    writer, done = None, writer
+                    self.written.append(done.close())
+                if item is None:
+                    return
+                if item[0] != current:
+                    current = item[0]
+                    writer = FrameWriter(os.path.join(self.directory, 'episode_{:05d}'.format(current)),
+                                         self.imageio, self.fps)
+                if writer is not None:
+                    writer.append(item[1] if self.draw is None else self.draw(item[1]))
+            except Exception as e:  # 次のcheck/closeで学習側に伝える（このエピソードの残りは捨てる）
+                self.error = e
+                writer = None
+
+    def check(self):
+        """ 書き込みで起きたエラーがあれば学習側で投げ直す（エピソードごとに呼ぶ） """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        """ 書き込みが全て終わるまで待つ """
+        self.frames.put(None)
+        self.thread.join()
+        self.check()
+
+
+def steps_per_second(mode, n_steps=20000, record_every=1, directory='frames_bench', seed=0):
+    """ ランダムな行動でCartPoleを進めた時の１秒あたりのステップ数
+
+    mode: None（録画なし）, 'thread'（FrameRecorder）, 'inline'（ループの中で画像を作って書き出す）
+    gymを使わないので、録画するのは draw_cartpole の合成画像
+    record_every: このエピソード数ごとに録画する
+    学習ループの時間だけを計る（'thread'で最後に書き込みを待つ時間は含まない）
+    """
+    from cartpole_vec import VecCartPole
+    env = VecCartPole(1, seed=seed, auto_reset=False)
+    rng = np.random.RandomState(seed)
+    recorder = FrameRecorder(directory) if mode == 'thread' else None
+    writer = None
+    episode = 0
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        if episode % record_every == 0:
+            if mode == 'thread':
+                recorder.add(episode, env.state[0].copy())
+            elif mode == 'inline':
+                if writer is None:
+                    writer = FrameWriter(os.path.join(directory, 'inline_{:05d}'.format(episode)))
+                writer.append(draw_cartpole(env.state[0]))
+        done = env.step(rng.randint(0, 2, size=1))[2][0]
+        if done:
+            if recorder is not None:
+                recorder.check()
+            if writer is not None:
+                writer.close()
+                writer = None
+            env.reset()
+            episode += 1
+    rate = n_steps / (time.perf_counter() - start)
+    dropped = 0
+    if recorder is not None:
+        recorder.close()
+        dropped = recorder.dropped
+    return rate, dropped
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='NumPyのCartPoleで録画の有無によるsteps/sを比べる（画像はdraw_cartpoleの合成画像で、gymの描画ではない）')
+    parser.add_argument('--steps', type=int, default=20000, help='進めるステップ数')
+    parser.add_argument('--every', type=int, default=10, help='このエピソード数ごとに録画する')
+    args = parser.parse_args()
+    if not os.path.isdir('frames_bench'):
+        os.makedirs('frames_bench')
+    base = None
+    for mode in (None, 'thread', 'inline'):
+        rate, dropped = steps_per_second(mode, args.steps, args.every)
+        base = base or rate
+        print('{:8s} {:10.0f} steps/s ({:.2f}倍) 捨てたフレーム {}'.format(str(mode), rate, rate / base, dropped))
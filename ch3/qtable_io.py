@@ -0,0 +1,126 @@
+# coding:utf-8
+""" Qテーブルのバイナリ形式での保存と読み込み（学習の再開用）
+
+ファイルの構成（リトルエンディアン）
+    b'QTBL'             マジックナンバー（4バイト）
+    version             形式のバージョン（uint16）
+    header_size         ヘッダ（JSON）のバイト数（uint32）
+    header              JSON。dtype・shapeと、離散化の区切り・エピソード数・εの位置などのメタデータ
+    （64バイト境界まで0で埋める）
+    data                Qテーブルの中身（C順の配列そのもの）
+
+中身はヘッダの後ろにそのまま並んでいるので、mmap=Trueならファイルをメモリマップして読める。
+メモリマップは読み取り専用で、書き換えるとファイルも変わる writable=True は明示した時だけ使う。
+保存は一時ファイルに書いてからrenameするので、途中で落ちても前のスナップショットは壊れない。
+
+python qtable_io.py Qvalue.txt          # np.savetxtのテキストを同じ名前の .qtable に変換する
+python qtable_io.py --bench             # np.savetxt / np.loadtxt と速さ・誤差を比べる
+"""
+from __future__ import print_function
+import argparse
+import json
+import os
+import struct
+import time
+import numpy as np
+
+MAGIC = b'QTBL'
+VERSION = 1
+ALIGN = 64
+EXTENSION = '.qtable'
+
+
+def save(filename, q_table, **meta):
+    """ q_tableとメタデータ（JSONにできる値）を書き出す """
+    q_table = np.ascontiguousarray(q_table)
+    header = dict(meta, dtype=q_table.dtype.str, shape=list(q_table.shape))
+    header = json.dumps(header).encode('utf-8')
+    offset = len(MAGIC) + 6 + len(header)
+    padding = -offset % ALIGN
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<HI', VERSION, len(header) + padding))
+        f.write(header + b' ' * padding)    # JSONの後ろの空白は読む時に無視される
+        f.write(q_table.tobytes())
+    os.replace(tmp, filename)   # 書き終えてから置き換える
+
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError('{} はQテーブルのファイルではありません'.format(f.name))
+    version, header_size = struct.unpack('<HI', f.read(6))
+    if version > VERSION:
+        raise ValueError('{} の形式（バージョン{}）には対応していません'.format(f.name, version))
+    return json.loads(f.read(header_size).decode('utf-8')), f.tell()
+
+
+def load(filename, mmap=False, writable=False):
+    """ (q_table, メタデータのdict) を返す。np.savetxtのテキストならメタデータは空
+
+    mmap=Trueの時、writable=Falseなら読み取り専用（書き込みはエラー）、Trueならq_tableへの書き込みがファイルに反映される
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:     # 以前の Qvalue.txt
+            return np.loadtxt(filename), {}
+        f.seek(0)
+        meta, offset = read_header(f)
+        dtype, shape = np.dtype(meta.pop('dtype')), tuple(meta.pop('shape'))
+        if mmap:
+            return np.memmap(filename, dtype=dtype, mode='r+' if writable else 'r', offset=offset, shape=shape), meta
+        q_table = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return q_table, meta
+
+
+def resume(filename, **expected):
+    """ スナップショットがあれば (q_table, meta) を返し、なければ (None, {}) を返す
+
+    expected（離散化の区切りなど）がメタデータと違えば、同じQテーブルとして使えないのでValueError
+    """
+    if not os.path.exists(filename):
+        return None, {}
+    q_table, meta = load(filename)
+    for key, value in expected.items():
+        if key in meta and meta[key] != value:
+            raise ValueError('{} の {} が今の設定と違います: {} != {}'.format(filename, key, meta[key], value))
+    return q_table, meta
+
+
+def bench(d=20, n_actions=2, repeat=3):
+    """ num_digitized=dのQテーブルでの保存・読み込みの時間と、読み戻した値の最大誤差 """
+    q_table = np.random.RandomState(0).uniform(-1, 1, size=(d ** 4, n_actions))
+    results = []
+    for name, write, read, filename in (
+            ('np.savetxt / np.loadtxt', np.savetxt, np.loadtxt, 'bench_Qvalue.txt'),
+            ('qtable_io', save, lambda f: load(f)[0], 'bench_Qvalue' + EXTENSION),
+            ('qtable_io (mmap)', save, lambda f: load(f, mmap=True)[0], 'bench_Qvalue' + EXTENSION)):
+        t_write = t_read = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            write(filename, q_table)
+            t_write = min(t_write, time.perf_counter() - start)
+            start = time.perf_counter()
+            loaded = read(filename)
+            t_read = min(t_read, time.perf_counter() - start)
+        error = float(np.abs(np.asarray(loaded) - q_table).max())
+        results.append((name, t_write, t_read, os.path.getsize(filename), error))
+        del loaded
+        os.remove(filename)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('filename', nargs='?', help='変換するnp.savetxtのテキスト')
+    parser.add_argument('--bench', type=int, nargs='?', const=20, default=None, help='num_digitizedを指定して比べる')
+    args = parser.parse_args()
+    if args.filename:
+        q_table, meta = load(args.filename)
+        out = os.path.splitext(args.filename)[0] + EXTENSION
+        save(out, q_table, **meta)
+        print('{} -> {} {}'.format(args.filename, out, q_table.shape))
+    if args.bench:
+        print('num_digitized={}: {} x 2'.format(args.bench, args.bench ** 4))
+        for name, t_write, t_read, size, error in bench(args.bench):
+            print('{:24s} 保存 {:8.1f} ms, 読み込み {:8.1f} ms, {:10d} bytes, 最大誤差 {:.3g}'.format(
+                name, t_write * 1e3, t_read * 1e3, size, error))
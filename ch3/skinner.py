@@ -1,19 +1,5 @@
 # coding:utf-8
-import numpy as np
-
-
-def random_action():
-    return np.random.choice([0, 1])
-
-
-def get_action(next_state, episode):
-    epsilon = 0.5 * (1 / (episode + 1))  # 徐々に最適行動のみを取る, ε-greedy法
-    if epsilon <= np.random.uniform(0, 1):
-        a = np.where(q_table[next_state] == q_table[next_state].max())[0]
-        next_action = np.random.choice(a)
-    else:
-        next_action = random_action()
-    return next_action
+import tabular_q
 
 
 def step(state, action):
@@ -32,30 +18,34 @@ def step(state, action):
     return state, reward
 
 
-def update_Qtable(q_table, state, action, reward, next_state):
-    gamma = 0.9
-    alpha = 0.5
-    next_maxQ = max(q_table[next_state])
-    q_table[state, action] = (
-        1 - alpha) * q_table[state, action] + alpha * (reward + gamma * next_maxQ)
-    return q_table
-
-
 max_number_of_steps = 5  # 1試行のstep数
 num_episodes = 10
-q_table = np.zeros((2, 2))
-
-for episode in range(num_episodes):  # 試行数分繰り返す
+snapshot_interval = 5    # このエピソード数ごとにQテーブルを保存する
+resume = False           # Trueにすると保存したQテーブルから学習を再開する
+backend = 'dense'        # 'hash'にすると訪れた状態の分だけQテーブルを確保する
+qtable_file = 'skinner.qtable'
+q_table = tabular_q.make_table(backend, 2, 2, low=0, high=0)   # 0で初期化
+start = 0
+if resume:
+    saved, meta = tabular_q.resume(qtable_file, q_table, n_states=2)
+    if saved is not None:
+        q_table, start = saved, meta['episode'] + 1
+agent = tabular_q.TabularQ(q_table, gamma=0.9, alpha=0.5)
+
+for episode in range(start, num_episodes):  # 試行数分繰り返す
     state = 0
     episode_reward = 0
 
     for t in range(max_number_of_steps):  # 1試行のループ
-        action = get_action(state, episode)  # a_{t+1}
+        action = agent.get_action(state, episode)  # a_{t+1}
         next_state, reward = step(state, action)
         print(state, action, reward)
         episode_reward += reward  # 報酬を追加
-        q_table = update_Qtable(q_table, state, action, reward, next_state)
+        agent.update(state, action, reward, next_state)
         state = next_state
 
     print('episode : %d total reward %d' % (episode+1, episode_reward))
-    print(q_table)
+    print(agent.table.to_array())
+    if (episode + 1) % snapshot_interval == 0 or episode == num_episodes - 1:
+        tabular_q.save(qtable_file, agent.table, n_states=2, episode=episode,
+                       epsilon={'schedule': '0.5/(episode+1)', 'value': 0.5 / (episode + 1)})
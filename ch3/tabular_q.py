@@ -0,0 +1,279 @@
+# coding:utf-8
+""" skinner.py と cartpole.py で共有する表形式のQ学習
+
+Qテーブルの持ち方は２通り
+    DenseQTable     状態数 x 行動数 の配列を最初に全て確保する（状態数が少ない時に速い）
+    HashQTable      訪れた状態の行だけを確保するオープンアドレス法（線形探査）のハッシュ表。
+                    行は初めて参照した時に初期化するので、区切りを細かくしても訪れた状態の分しかメモリを使わない
+
+保存する時、denseは参照した行の印（touched）もメタデータに入れるので、再開しても訪れた状態数は変わらない。
+再開する時に保存した時と設定のbackendが違えば、訪れた状態の行だけを設定の側の表に移す。
+
+python tabular_q.py             # 分割数ごとに、訪れた状態数とメモリ・更新の速さを両方で比べる
+"""
+from __future__ import print_function
+import argparse
+import base64
+import time
+import numpy as np
+import qtable_io
+
+EMPTY = -1
+FIBONACCI = 11400714819323198485   # 2^64 / 黄金比（状態番号を表の位置に散らす）
+MASK64 = (1 << 64) - 1
+
+
+class DenseQTable():
+    backend = 'dense'
+
+    def __init__(self, n_states, n_actions, low=-1, high=1, rng=np.random):
+        self.n_actions = n_actions
+        self.q = rng.uniform(low=low, high=high, size=(n_states, n_actions))
+        self.touched = np.zeros(n_states, dtype=bool)
+
+    def row(self, state):
+        """ 状態stateの行（書き換えるとQテーブルに反映される） """
+        self.touched[state] = True
+        return self.q[state]
+
+    def n_visited(self):
+        return int(np.count_nonzero(self.touched))
+
+    def nbytes(self):
+        return self.q.nbytes + self.touched.nbytes
+
+    def visited(self):
+        """ 訪れた状態番号とその行の (states, values) """
+        states = np.flatnonzero(self.touched)
+        return states, self.q[states]
+
+    def set_rows(self, states, values):
+        self.q[states] = values
+        self.touched[states] = True
+
+    def to_array(self):
+        return self.q
+
+    def meta(self):
+        """ 参照した行の印（1行1bitに詰めてbase64にする） """
+        return {'touched': base64.b64encode(np.packbits(self.touched).tobytes()).decode('ascii')}
+
+    @classmethod
+    def from_array(cls, array, touched=None):
+        """ 保存した配列から作る（乱数で初期化した表は確保しない）。touchedのない以前のファイルは全ての行を訪れたとみなす """
+        table = cls.__new__(cls)
+        table.n_actions = array.shape[1]
+        table.q = np.require(array, np.float64, ['C', 'W'])   # 読み込んだ配列をそのまま使う（コピーしない）
+        if touched is None:
+            table.touched = np.ones(len(array), dtype=bool)
+        else:
+            bits = np.frombuffer(base64.b64decode(touched), dtype=np.uint8)
+            table.touched = np.unpackbits(bits)[:len(array)].astype(bool)
+        return table
+
+
+class HashQTable():
+    """ 状態番号 -> 行 のハッシュ表。keys[i] が状態番号（空きはEMPTY）、index[i] が values の行 """
+    backend = 'hash'
+
+    def __init__(self, n_actions, low=-1, high=1, capacity=1024, max_load=0.5, rng=np.random):
+        self.n_actions = n_actions
+        self.low, self.high = low, high
+        self.max_load = max_load
+        self.rng = rng
+        self.n = 0
+        self.values = np.empty((capacity, n_actions))
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        self.keys = np.full(capacity, EMPTY, dtype=np.int64)
+        self.index = np.zeros(capacity, dtype=np.int64)
+        self.mask = capacity - 1
+        self.shift = 64 - (capacity.bit_length() - 1)
+
+    def find(self, state):
+        """ stateの入っている位置、なければ入れるべき空きの位置 """
+        i = ((state * FIBONACCI) & MASK64) >> self.shift
+        keys = self.keys
+        while True:
+            k = keys[i]
+            if k == state or k == EMPTY:
+                return i
+            i = (i + 1) & self.mask
+
+    def row(self, state):
+        """ 状態stateの行。初めての状態ならここで初期化する（返した行は次のrowの呼び出しまで有効） """
+        state = int(state)
+        i = self.find(state)
+        if self.keys[i] == EMPTY:
+            if self.n + 1 > self.max_load * len(self.keys):     # 埋まってきたら表を倍にして入れ直す
+                self.grow()
+                i = self.find(state)
+            if self.n == len(self.values):
+                self.values = np.concatenate([self.values, np.empty_like(self.values)])
+            self.values[self.n] = self.rng.uniform(low=self.low, high=self.high, size=self.n_actions)
+            self.keys[i] = state
+            self.index[i] = self.n
+            self.n += 1
+        return self.values[self.index[i]]
+
+    def grow(self):
+        used = self.keys != EMPTY
+        keys, index = self.keys[used], self.index[used]
+        self.allocate(2 * len(self.keys))
+        for state, k in zip(keys.tolist(), index.tolist()):
+            i = self.find(state)
+            self.keys[i] = state
+            self.index[i] = k
+
+    def states(self):
+        """ 訪れた状態番号（valuesの行の順） """
+        states = np.empty(self.n, dtype=np.int64)
+        used = self.keys != EMPTY
+        states[self.index[used]] = self.keys[used]
+        return states
+
+    def n_visited(self):
+        return self.n
+
+    def nbytes(self):
+        return self.keys.nbytes + self.index.nbytes + self.values.nbytes
+
+    def visited(self):
+        return self.states(), self.values[:self.n]
+
+    def set_rows(self, states, values):
+        for state, v in zip(np.asarray(states).tolist(), values):
+            self.row(state)[:] = v
+
+    def meta(self):
+        return {}
+
+    def to_array(self):
+        """ 1列目が状態番号（2^53未満なら正確）、残りがQ値の (訪れた状態数, 1 + 行動数) の配列 """
+        return np.column_stack([self.states(), self.values[:self.n]])
+
+    @classmethod
+    def from_array(cls, array):
+        capacity = 1024
+        while capacity * 0.5 < len(array):
+            capacity *= 2
+        table = cls(array.shape[1] - 1, capacity=capacity)
+        table.set_rows(array[:, 0].astype(np.int64), array[:, 1:])
+        return table
+
+
+def make_table(backend, n_states, n_actions, low=-1, high=1):
+    if backend == 'dense':
+        return DenseQTable(n_states, n_actions, low, high)
+    if backend == 'hash':
+        return HashQTable(n_actions, low, high)
+    raise ValueError('不明なQテーブルの種類です: {}'.format(backend))
+
+
+class TabularQ():
+    """ ε-greedyで行動を選び、Q学習でQテーブルを更新する（εは 0.5 / (episode + 1)） """
+
+    def __init__(self, table, gamma=0.99, alpha=0.5):
+        self.table = table
+        self.gamma = gamma
+        self.alpha = alpha
+
+    def get_action(self, next_state, episode):
+        epsilon = 0.5 * (1 / (episode + 1))  # 徐々に最適行動のみを取る, ε-greedy法
+        if epsilon <= np.random.uniform(0, 1):
+            q = self.table.row(next_state)
+            a = np.where(q == q.max())[0]
+            next_action = np.random.choice(a)
+        else:
+            next_action = np.random.choice(self.table.n_actions)
+        return next_action
+
+    def greedy_action(self, state):
+        return int(np.argmax(self.table.row(state)))
+
+    def update(self, state, action, reward, next_state):
+        next_maxQ = self.table.row(next_state).max()   # 先に参照する（行の追加で配列が作り直されることがある）
+        q = self.table.row(state)
+        q[action] = (1 - self.alpha) * q[action] + self.alpha * (reward + self.gamma * next_maxQ)
+
+
+def save(filename, table, **meta):
+    qtable_io.save(filename, table.to_array(), backend=table.backend, **dict(table.meta(), **meta))
+
+
+def from_array(array, meta):
+    """ 保存した配列からQテーブルを作る。backendのない以前のファイルはdense """
+    backend = meta.pop('backend', 'dense')
+    if backend == 'dense':
+        return DenseQTable.from_array(array, meta.pop('touched', None)), meta
+    return HashQTable.from_array(array), meta
+
+
+def load(filename):
+    return from_array(*qtable_io.load(filename))
+
+
+def resume(filename, table=None, **expected):
+    """ qtable_io.resumeと同じ。スナップショットがなければ (None, {})
+
+    table（設定どおりに作った表）を渡すと、保存した表のbackendが違う時は訪れた状態の行をtableに移して返す
+    """
+    array, meta = qtable_io.resume(filename, **expected)
+    if array is None:
+        return None, meta
+    saved, meta = from_array(array, meta)
+    if table is None or saved.backend == table.backend:
+        return saved, meta
+    if saved.n_actions != table.n_actions:
+        raise ValueError('{} の行動数が今の設定と違います: {} != {}'.format(filename, saved.n_actions, table.n_actions))
+    table.set_rows(*saved.visited())
+    return table, meta
+
+
+def transitions(num_digitized, n_steps=200000, n_envs=1000, seed=0):
+    """ ランダムな行動でCartPoleを進めた時の (状態, 行動, 報酬, 次の状態) の列 """
+    from cartpole_vec import VecCartPole
+    from discretizer import Discretizer
+    discretizer = Discretizer.uniform(
+        low=[-2.4, -3.0, -0.5, -2.0], high=[2.4, 3.0, 0.5, 2.0], bins=num_digitized)
+    env = VecCartPole(n_envs, seed=seed)
+    rng = np.random.RandomState(seed)
+    obs = env.reset()
+    rows = []
+    for _ in range(n_steps // n_envs):
+        actions = rng.randint(0, 2, size=n_envs)
+        next_obs, rewards, dones, infos = env.step(actions)
+        terminal = np.where(dones[:, None], infos['terminal_observation'], next_obs)
+        rows.append(np.column_stack([discretizer.encode(obs), actions, rewards, discretizer.encode(terminal)]))
+        obs = next_obs
+    return discretizer.n_states, np.concatenate(rows).astype(np.int64).tolist()
+
+
+def bench(sizes=(6, 10, 20, 40), n_steps=200000, dense_limit=2 ** 30):
+    """ 分割数ごとに、訪れた状態数・メモリ・１秒あたりの更新数を返す（denseはdense_limitバイトまで） """
+    results = []
+    for d in sizes:
+        n_states, rows = transitions(d, n_steps)
+        for backend in ('dense', 'hash'):
+            if backend == 'dense' and n_states * 2 * 8 > dense_limit:
+                results.append((d, backend, None, n_states * 2 * 8 + n_states, None))
+                continue
+            agent = TabularQ(make_table(backend, n_states, 2))
+            start = time.perf_counter()
+            for s, a, r, s2 in rows:
+                agent.update(s, a, r, s2)
+            rate = len(rows) / (time.perf_counter() - start)
+            results.append((d, backend, agent.table.n_visited(), agent.table.nbytes(), rate))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='6,10,20,40', help='num_digitized（カンマ区切り）')
+    parser.add_argument('--steps', type=int, default=200000, help='更新する遷移の数')
+    args = parser.parse_args()
+    for d, backend, visited, nbytes, rate in bench([int(s) for s in args.sizes.split(',')], args.steps):
+        print('d={:3d} {:5s} 状態数 {:>12d}, 訪れた状態 {:>8}, メモリ {:>10.2f} MB, {}'.format(
+            d, backend, d ** 4, '-' if visited is None else visited, nbytes / 2.0 ** 20,
+            '（確保しない）' if rate is None else '{:.0f} updates/s'.format(rate)))
@@ -0,0 +1,190 @@
+# -*- coding:utf-8 -*-
+""" アクター・ラーナー分離による並列自己対戦学習
+
+N個のアクタープロセスがそれぞれBoardとQ関数（CPU上のコピー）を持って自己対戦し、
+遷移をキューでラーナープロセス（このプロセス）に送る。ラーナーは遷移を
+agent_black/agent_whiteのReplay Bufferに入れて学習し、publish_interval回の更新ごとに
+最新の重みを各アクターに配る。
+
+python actor_learner.py --actors 4 --episodes 2000 [--compare]
+--compare を付けると、同じエピソード数で単一プロセスのmain()も実行して episodes/s を比べる。
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing as mp
+import queue
+import random
+import time
+import chainer
+import chainerrl
+from train_reversi_DNN import (Board, MaskedQFunction, masked_observation, main,
+                               SIZE, BLACK, WHITE, REWARD_WIN, REWARD_LOSE)
+
+N_NODES = 256   # 中間層のノード数
+
+
+def get_weights(q_func):
+    return {name: chainer.cuda.to_cpu(p.data).copy() for name, p in q_func.namedparams()}
+
+
+def set_weights(q_func, weights):
+    for name, p in q_func.namedparams():
+        p.data[...] = weights[name]
+
+
+def actor(actor_id, n_episodes, transition_queue, weight_queue, decay_steps, seed):
+    """ アクタープロセス。自己対戦した１局分の遷移をまとめてtransition_queueに送る
+
+    decay_steps: このアクターでのεの減衰ステップ数（全体の減衰ステップ数 / アクター数）
+    """
+    rng = random.Random(seed)
+    board = Board()
+    q_func = MaskedQFunction(SIZE * SIZE, SIZE * SIZE, N_NODES)
+    set_weights(q_func, weight_queue.get())  # 最初の重みが届くまで待つ
+    t = [0, 0, 0]   # ε の減衰用ステップ数（main()のエージェントと同じく色ごと）
+    for _ in range(n_episodes):
+        try:    # 新しい重みが届いていれば反映する
+            set_weights(q_func, weight_queue.get_nowait())
+        except queue.Empty:
+            pass
+        board.board_reset()
+        history = [None, [], []]    # 色ごとの (状態, 行動) の列
+        while not board.game_end:
+            if not board.available_pos:
+                board.pss += 1
+                board.end_check()
+            else:
+                obs = masked_observation(board)
+                epsilon = max(0.1, 1.0 - 0.9 * t[board.turn] / decay_steps)  # LinearDecayEpsilonGreedyと同じ
+                if rng.random() < epsilon:  # board.random_action()のグローバルなrandomはfork元と同じ状態になる
+                    i, j = rng.choice(board.available_pos)
+                    action = i * SIZE + j
+                else:
+                    with chainer.no_backprop_mode(), chainer.using_config('train', False):
+                        action = int(q_func(obs[None]).greedy_actions.data[0])
+                history[board.turn].append((obs, action))
+                t[board.turn] += 1
+                board.agent_action(divmod(action, SIZE))
+                if board.pss == 1:
+                    board.pss = 0
+            board.change_turn()
+        # 勝敗に応じた報酬で遷移を作る（main()のact_and_train/stop_episode_and_trainと同じ並び）
+        final_obs = masked_observation(board)
+        rewards = [0, REWARD_LOSE, REWARD_LOSE]
+        rewards[board.winner] = REWARD_WIN
+        transitions = []
+        for color in (BLACK, WHITE):
+            steps = history[color]
+            for k, (obs, action) in enumerate(steps):
+                if k + 1 < len(steps):
+                    transitions.append((color, obs, action, 0, steps[k + 1][0], False))
+                else:
+                    transitions.append((color, obs, action, rewards[color], final_obs, True))
+        transition_queue.put((actor_id, board.winner, transitions))
+    transition_queue.put((actor_id, None, None))    # 終了の合図
+
+
+def make_agent(q_func, optimizer, explorer, gamma=0.99):
+    replay_buffer = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
+    return chainerrl.agents.DQN(q_func, optimizer, replay_buffer, gamma, explorer,
+                                replay_start_size=1000, minibatch_size=128, update_interval=1, target_update_interval=1000)
+
+
+def observe_transition(agent, obs, action, reward, next_obs, terminal):
+    """ act_and_trainの学習部分だけを行う（Replay Bufferへの追加、ターゲット同期、更新） """
+    agent.t += 1
+    agent.replay_buffer.append(state=obs, action=action, reward=reward,
+                               next_state=next_obs, next_action=None, is_state_terminal=terminal)
+    if agent.t % agent.target_update_interval == 0:
+        agent.sync_target_network()
+    agent.replay_updater.update_if_necessary(agent.t)
+
+
+def learner(n_actors=4, n_episodes=2000, publish_interval=100, decay_steps=50000):
+    """ ラーナー。アクターを起動し、届いた遷移で agent_black/agent_white を学習する """
+    q_func = MaskedQFunction(SIZE * SIZE, SIZE * SIZE, N_NODES)
+    optimizer = chainer.optimizers.Adam(eps=1e-2)
+    optimizer.setup(q_func)
+    # 行動はアクターが選ぶので、ラーナーのexplorerは使われない
+    explorer = chainerrl.explorers.Greedy()
+    agent_black = make_agent(q_func, optimizer, explorer)
+    agent_white = make_agent(q_func, optimizer, explorer)
+    agents = ['', agent_black, agent_white]
+
+    transition_queue = mp.Queue(maxsize=1000)
+    weight_queues = [mp.Queue(maxsize=1) for _ in range(n_actors)]
+    for q in weight_queues:
+        q.cancel_join_thread()  # 読まれずに残った重みで終了時に待たないように
+    actors = []
+    # N個のアクターが並列にεを下げるので、遷移の合計数で見て単一プロセスと同じ速さになるよう1/Nにする
+    actor_decay_steps = float(decay_steps) / n_actors
+    for k in range(n_actors):
+        n = n_episodes // n_actors + (1 if k < n_episodes % n_actors else 0)
+        p = mp.Process(target=actor, args=(k, n, transition_queue, weight_queues[k], actor_decay_steps, k))
+        p.daemon = True
+        p.start()
+        actors.append(p)
+
+    def publish():
+        weights = get_weights(q_func)
+        for q in weight_queues:
+            try:
+                q.get_nowait()  # 古い重みが残っていれば捨てる
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait(weights)
+            except queue.Full:  # まだ読まれていなければ次の機会に配る
+                pass
+
+    weights = get_weights(q_func)
+    for q in weight_queues:     # 最初の重みは必ず届ける
+        q.put(weights)
+    start = time.perf_counter()
+    n_updates = 0
+    episode = 0
+    win = lose = 0
+    running = n_actors
+    while running > 0:
+        _, winner, transitions = transition_queue.get()
+        if transitions is None:
+            running -= 1
+            continue
+        for color, obs, action, reward, next_obs, terminal in transitions:
+            observe_transition(agents[color], obs, action, reward, next_obs, terminal)
+            n_updates += 1
+            if n_updates % publish_interval == 0:   # 一定間隔で最新の重みを配る
+                publish()
+        episode += 1
+        if winner == BLACK:
+            win += 1
+        else:
+            lose += 1
+        if episode % 100 == 0:
+            print('===== Episode {} : black win {}, black lose {}, {:.1f} episodes/s ====='.format(
+                episode, win, lose, episode / (time.perf_counter() - start)))
+            print('<BLACK> statistics: {}'.format(agent_black.get_statistics()))
+            print('<WHITE> statistics: {}'.format(agent_white.get_statistics()))
+            win = lose = 0
+        if episode % 1000 == 0:   # 1000エピソードごとにモデルを保存する
+            agent_black.save('agent_black_' + str(episode))
+            agent_white.save('agent_white_' + str(episode))
+    for p in actors:
+        p.join()
+    return episode / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--actors', type=int, default=max(1, mp.cpu_count() - 1), help='アクタープロセスの数')
+    parser.add_argument('--episodes', type=int, default=2000, help='学習ゲーム回数')
+    parser.add_argument('--publish-interval', type=int, default=100, help='重みを配る間隔（更新回数）')
+    parser.add_argument('--compare', action='store_true', help='単一プロセスのmain()と速度を比べる')
+    args = parser.parse_args()
+    eps = learner(args.actors, args.episodes, args.publish_interval)
+    print('actor-learner ({} actors): {:.1f} episodes/s'.format(args.actors, eps))
+    if args.compare:
+        start = time.perf_counter()
+        main(n_episodes=args.episodes, masked=True)
+        print('single process: {:.1f} episodes/s'.format(args.episodes / (time.perf_counter() - start)))
+        print('actor-learner ({} actors): {:.1f} episodes/s'.format(args.actors, eps))
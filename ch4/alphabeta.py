@@ -0,0 +1,235 @@
+# -*- coding:utf-8 -*-
+""" αβ探索によるリバーシの対戦相手
+
+Boardのmake_move/unmake_moveとZobristハッシュ（board.hash）を使い、
+固定サイズの置換表つきの反復深化αβ探索（negamax）で１手あたりの制限時間内に着手を決める。
+main_playの対戦相手（難易度 ab）と、学習済みエージェントの評価相手として使う。
+
+python alphabeta.py agent_black_20000 agent_white_20000 ... で、保存したエージェントをαβ探索と対戦させて評価する。
+"""
+from __future__ import print_function
+import random
+import sys
+import time
+from reversi import Board, SIZE, NONE, BLACK, WHITE
+
+EXACT, LOWER, UPPER = 0, 1, 2   # 置換表の値の種類（正確な値, 下限, 上限）
+WIN_SCORE = 1000    # 終局時の評価値の基準（石差を足して使う）
+
+
+class TranspositionTable():
+    """ 固定サイズの置換表。ハッシュの下位ビットで場所を決め、常に上書きする """
+
+    def __init__(self, size_bits=20):
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.keys = [None] * self.size  # 衝突検出用のハッシュ値
+        self.entries = [None] * self.size  # (depth, value, flag, best)
+        self.hits = 0
+        self.probes = 0
+
+    def get(self, h):
+        self.probes += 1
+        idx = h & self.mask
+        if self.keys[idx] == h:
+            self.hits += 1
+            return self.entries[idx]
+        return None
+
+    def put(self, h, depth, value, flag, best):
+        idx = h & self.mask
+        self.keys[idx] = h
+        self.entries[idx] = (depth, value, flag, best)
+
+
+class SearchTimeout(Exception):
+    """ 制限時間切れで探索を打ち切る """
+    pass
+
+
+# 盤面の場所ごとの重み。角は取られにくく有利、角の隣は角を取られやすく不利
+def make_weights(size):
+    w = [[1] * size for _ in range(size)]
+    last = size - 1
+    corners = ((0, 0), (0, last), (last, 0), (last, last))
+    if size > 4:    # 4x4では辺のマスが全て角の隣になるので区別しない
+        for i, j in corners:
+            for di in (-1, 0, 1):
+                for dj in (-1, 0, 1):
+                    if 0 <= i + di < size and 0 <= j + dj < size:
+                        w[i + di][j + dj] = -3
+    for i, j in corners:
+        w[i][j] = 8
+    return w
+
+
+class AlphaBetaPlayer():
+    """ 反復深化αβ探索プレイヤー """
+
+    def __init__(self, time_limit=1.0, max_depth=None, tt_bits=20):
+        self.time_limit = time_limit    # １手あたりの制限時間（秒）
+        self.max_depth = max_depth  # 探索の深さの上限（Noneなら残りマス数まで）
+        self.tt = TranspositionTable(tt_bits)
+        self.weights = make_weights(SIZE)
+        self.nodes = 0  # 探索したノード数
+        self.depth = 0  # 直前の着手で探索し終えた深さ
+
+    # 手番側から見た評価値（場所の重みつき石差＋着手可能数の差）
+    def evaluate(self, board):
+        own = board.turn
+        score = 0
+        for i, row in enumerate(board.board.tolist()):
+            for j, c in enumerate(row):
+                if c == own:
+                    score += self.weights[i][j]
+                elif c != NONE:
+                    score -= self.weights[i][j]
+        mobility = len(board.legal_moves())
+        token = board.make_move(None)
+        mobility -= len(board.legal_moves())
+        board.unmake_move(token)
+        return score + mobility
+
+    # 終局時の手番側から見た評価値
+    def final_score(self, board):
+        diff = int((board.board == board.turn).sum()) - int(((board.board != board.turn) & (board.board != NONE)).sum())
+        if diff > 0:
+            return WIN_SCORE + diff
+        elif diff < 0:
+            return -WIN_SCORE + diff
+        return 0
+
+    def search(self, board, depth, alpha, beta, passed):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        alpha0 = alpha
+        entry = self.tt.get(board.hash)
+        best = None
+        if entry is not None:
+            e_depth, e_value, e_flag, best = entry
+            if e_depth >= depth:
+                if e_flag == EXACT:
+                    return e_value
+                elif e_flag == LOWER:
+                    alpha = max(alpha, e_value)
+                else:
+                    beta = min(beta, e_value)
+                if alpha >= beta:
+                    return e_value
+        moves = list(board.legal_moves())
+        if not moves:
+            if passed:  # 双方とも置けなければ終局
+                return self.final_score(board)
+            token = board.make_move(None)   # パス（深さは減らさない）
+            value = -self.search(board, depth, -beta, -alpha, True)
+            board.unmake_move(token)
+            return value
+        if depth == 0:
+            return self.evaluate(board)
+        if best in moves:   # 置換表の最善手から調べる
+            moves.remove(best)
+            moves.insert(0, best)
+        value = -WIN_SCORE * 2
+        for pos in moves:
+            token = board.make_move(pos)
+            v = -self.search(board, depth - 1, -beta, -alpha, False)
+            board.unmake_move(token)
+            if v > value:
+                value = v
+                best = pos
+            alpha = max(alpha, v)
+            if alpha >= beta:
+                break
+        flag = UPPER if value <= alpha0 else LOWER if value >= beta else EXACT
+        self.tt.put(board.hash, depth, value, flag, best)
+        return value
+
+    # ルート局面の探索。最善手とその評価値を返す
+    def search_root(self, board, moves, depth):
+        alpha = -WIN_SCORE * 2
+        best = moves[0]
+        for pos in moves:
+            token = board.make_move(pos)
+            try:
+                v = -self.search(board, depth - 1, -WIN_SCORE * 2, -alpha, False)
+            finally:
+                while board.undo_stack and board.undo_stack[-1] is not token:   # 時間切れなら探索途中の手を戻す
+                    board.unmake_move(board.undo_stack[-1])
+                board.unmake_move(token)
+            if v > alpha:
+                alpha = v
+                best = pos
+        return best, alpha
+
+    def act(self, board):
+        """ boardの手番の着手 (i, j) を返す。置く場所がなければNone。boardは元の状態に戻る """
+        moves = list(board.legal_moves())
+        if not moves:
+            return None
+        if len(moves) == 1:
+            return moves[0]
+        self.deadline = time.perf_counter() + self.time_limit
+        self.nodes = 0
+        empties = int((board.board == NONE).sum())
+        max_depth = empties if self.max_depth is None else min(self.max_depth, empties)
+        best = moves[0]
+        for depth in range(1, max_depth + 1):
+            try:
+                best, _ = self.search_root(board, moves, depth)
+            except SearchTimeout:
+                break
+            self.depth = depth
+            moves.remove(best)  # 次の深さでは最善手から調べる
+            moves.insert(0, best)
+        return best
+
+
+def play_game(black_move, white_move, board=None):
+    """ black_move/white_move（board -> (i,j) or None）で１局対戦し、終局したboardを返す """
+    board = board or Board()
+    board.board_reset()
+    moves = [None, black_move, white_move]
+    while not board.game_end:
+        pos = moves[board.turn](board) if board.available_pos else None
+        if pos is None:     # 置く場所がなければパス
+            board.pss += 1
+            board.end_check()
+        else:
+            board.agent_action(pos)
+            board.pss = 0
+        board.change_turn()
+    return board
+
+
+def random_move(board):
+    return random.choice(board.available_pos) if board.available_pos else None
+
+
+def evaluate(move, color, opponent_move, n_games=10):
+    """ moveをcolor側で打たせ、opponent_moveと対戦した (勝ち, 負け, 引き分け) の数 """
+    win = lose = draw = 0
+    board = Board()
+    for _ in range(n_games):
+        if color == BLACK:
+            play_game(move, opponent_move, board)
+        else:
+            play_game(opponent_move, move, board)
+        own, opp = (board.nofb, board.nofw) if color == BLACK else (board.nofw, board.nofb)
+        if own > opp:
+            win += 1
+        elif own < opp:
+            lose += 1
+        else:
+            draw += 1
+    return win, lose, draw
+
+
+if __name__ == '__main__':
+    from train_reversi_DNN import load_q_function, greedy_move
+    player = AlphaBetaPlayer(time_limit=0.1)
+    for path in sys.argv[1:]:
+        q_func = load_q_function(path)
+        color = WHITE if 'white' in path else BLACK
+        result = evaluate(lambda board: greedy_move(q_func, board), color, player.act)
+        print('{} vs αβ探索: win {}, lose {}, draw {}'.format(path, *result))
@@ -0,0 +1,185 @@
+# -*- coding:utf-8 -*-
+""" 複数局を同時に進めるリバーシ盤面
+
+N局分の盤面を (N, SIZE, SIZE) の配列で持ち、着手可能位置の生成・石の配置と反転・
+パス処理・終局判定を全局まとめてNumPyで行う。終局した局は自動で初期化されるので、
+select_actions() で１回のQFunction呼び出しで全局の行動を選べる。
+
+python batch_board.py で、BitBoardとのランダム対戦比較と速度計測を行う。
+"""
+from __future__ import print_function
+import numpy as np
+import time
+from reversi import SIZE, NONE, BLACK, WHITE, DIR
+
+DIRS = tuple(d for d in DIR if d != (0, 0))  # 隣接８方向
+
+
+def shift(x, di, dj):
+    """ (N, size, size) の配列を (di, dj) 方向にずらす（はみ出した分は捨て、空いた所は0） """
+    size = x.shape[1]
+    out = np.zeros_like(x)
+    out[:, max(di, 0):size + min(di, 0), max(dj, 0):size + min(dj, 0)] = \
+        x[:, max(-di, 0):size - max(di, 0), max(-dj, 0):size - max(dj, 0)]
+    return out
+
+
+class BatchBoard():
+    """ N局分のリバーシボードクラス """
+
+    def __init__(self, n, size=SIZE):
+        self.n = n
+        self.size = size
+        self.board = np.zeros((n, size, size), dtype=np.int8)
+        self.turn = np.zeros(n, dtype=np.int8)
+        self.pss = np.zeros(n, dtype=np.int8)
+        self.board_reset()
+
+    # ボードの初期化。indexを指定するとその局だけ初期化する
+    def board_reset(self, index=slice(None)):
+        mid = self.size // 2
+        self.board[index] = NONE
+        self.board[index, mid, mid] = WHITE
+        self.board[index, mid - 1, mid - 1] = WHITE
+        self.board[index, mid - 1, mid] = BLACK
+        self.board[index, mid, mid - 1] = BLACK
+        self.turn[index] = BLACK
+        self.pss[index] = 0
+
+    # NNへの入力（Boardと同じく石の値をそのまま並べた１次元のfloat32）
+    def observations(self):
+        return self.board.reshape(self.n, -1).astype(np.float32)
+
+    # 手番の石が置ける場所のマスク (N, size*size)
+    def legal_moves(self):
+        turn = self.turn[:, None, None]
+        own = self.board == turn
+        opp = self.board == (BLACK + WHITE - turn)
+        empty = self.board == NONE
+        moves = np.zeros_like(own)
+        for di, dj in DIRS:
+            x = shift(own, di, dj) & opp
+            for _ in range(self.size - 3):  # 相手の石は最大 size-2 個続く
+                x |= shift(x, di, dj) & opp
+            moves |= shift(x, di, dj) & empty
+        return moves.reshape(self.n, -1)
+
+    # index の局に actions（１次元座標）の石を置いてリバースする
+    def put_stones(self, index, actions):
+        size = self.size
+        r, c = np.divmod(actions, size)
+        own = self.turn[index]
+        opp = BLACK + WHITE - own
+        self.board[index, r, c] = own
+        for di, dj in DIRS:
+            running = np.ones(len(index), dtype=bool)   # 相手の石が続いているか
+            captured = np.zeros(len(index), dtype=bool)  # 自分の石で挟めたか
+            run = []
+            for t in range(1, size):
+                rr = r + t * di
+                cc = c + t * dj
+                inside = (0 <= rr) & (rr < size) & (0 <= cc) & (cc < size)
+                cell = np.where(inside, self.board[index, np.clip(rr, 0, size - 1),
+                                                   np.clip(cc, 0, size - 1)], NONE)
+                captured |= running & (cell == own) & (t > 1)
+                running &= cell == opp
+                run.append((rr, cc, running.copy()))
+            for rr, cc, mask in run:    # 挟めた方向だけ自分の石にひっくり返す
+                flip = mask & captured
+                self.board[index[flip], rr[flip], cc[flip]] = own[flip]
+
+    # 全局を１手進める
+    def step(self, actions):
+        """ actions: 各局の１次元座標。進行中の局は必ず置ける場所を指定する
+
+        戻り値は (done, winner, final_board)。done の局は終局しており、
+        winner はBoard.end_checkと同じ規則（黒の石数が多ければ黒、それ以外は白）、
+        final_board は終局時の盤面。終局した局は初期化済み。
+        """
+        index = np.arange(self.n)
+        self.put_stones(index, np.asarray(actions))
+        self.pss[:] = 0
+        done = np.all(self.board.reshape(self.n, -1) != NONE, axis=1)
+        active = ~done
+        # 手番を交代し、置ける場所がなければパス（双方パスで終局）
+        for _ in range(2):
+            self.turn[active] = BLACK + WHITE - self.turn[active]
+            no_move = active & ~self.legal_moves().any(axis=1)
+            self.pss[no_move] += 1
+            done |= no_move & (self.pss == 2)
+            active = no_move & ~done
+        final_board = self.board[done].copy()
+        nofb = np.count_nonzero(final_board == BLACK, axis=(1, 2))
+        nofw = np.count_nonzero(final_board == WHITE, axis=(1, 2))
+        winner = np.zeros(self.n, dtype=np.int8)
+        winner[done] = np.where(nofb > nofw, BLACK, WHITE)
+        self.board_reset(done)  # 終局した局は自動で初期化
+        return done, winner, final_board
+
+
+def select_actions(q_func, batch_board, epsilon=0.0, rng=np.random):
+    """ １回のQFunction呼び出しで全局の行動を選ぶ（置ける場所に限定したε-greedy） """
+    import chainer
+    legal = batch_board.legal_moves()
+    with chainer.no_backprop_mode(), chainer.using_config('train', False):
+        q = q_func(batch_board.observations()).q_values.data
+    q = np.where(legal, chainer.cuda.to_cpu(q), -np.inf)
+    actions = np.argmax(q, axis=1)
+    explore = rng.uniform(size=batch_board.n) < epsilon
+    if explore.any():   # 置ける場所から一様に選ぶ
+        actions[explore] = np.argmax(rng.uniform(size=legal[explore].shape) * legal[explore], axis=1)
+    return actions
+
+
+def random_actions(batch_board, rng=np.random):
+    """ 置ける場所から一様ランダムに選ぶ """
+    legal = batch_board.legal_moves()
+    return np.argmax(rng.uniform(size=legal.shape) * legal, axis=1)
+
+
+def check_against_bitboard(size, n=64, n_steps=300, seed=0):
+    """ 同じ着手でBitBoardをN局並走させ、盤面・手番・勝者が一致することを確認する """
+    from bitboard import BitBoard
+    rng = np.random.RandomState(seed)
+    batch = BatchBoard(n, size)
+    refs = [BitBoard(size) for _ in range(n)]
+    for _ in range(n_steps):
+        legal = batch.legal_moves()
+        for k, ref in enumerate(refs):
+            assert np.array_equal(ref.board, batch.board[k]) and ref.turn == batch.turn[k]
+            assert [i * size + j for i, j in ref.available_pos] == list(np.flatnonzero(legal[k]))
+        actions = random_actions(batch, rng)
+        done, winner, _ = batch.step(actions)
+        for k, ref in enumerate(refs):
+            ref.agent_action(divmod(int(actions[k]), size))
+            ref.pss = 0
+            while not ref.game_end:
+                ref.change_turn()
+                if ref.available_pos:
+                    break
+                ref.pss += 1
+                ref.end_check()
+            assert ref.game_end == done[k]
+            if ref.game_end:
+                assert ref.winner == winner[k]
+                ref.board_reset()
+
+
+def games_per_second(n, size=SIZE, n_games=2000, seed=0):
+    """ N局同時のランダム対戦での１秒あたりの終局数 """
+    rng = np.random.RandomState(seed)
+    batch = BatchBoard(n, size)
+    finished = 0
+    start = time.perf_counter()
+    while finished < n_games:
+        done, _, _ = batch.step(random_actions(batch, rng))
+        finished += np.count_nonzero(done)
+    return finished / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    for size in (4, 6, 8):
+        check_against_bitboard(size)
+        print('SIZE {}: 一致OK'.format(size))
+    for n in (1, 64, 1024):
+        print('N={:5d}: {:.0f} games/s'.format(n, games_per_second(n)))
@@ -0,0 +1,210 @@
+# -*- coding:utf-8 -*-
+""" 性能の回帰を調べるためのベンチマーク
+
+乱数の種を固定して、次の処理の１秒あたりの回数を測り、JSONに書き出す。
+- Board.search_positions / is_available / do_reverse / end_check（ランダム対戦で記録した局面）
+- ランダム対戦の対局数（Board, BitBoard）
+- main() の学習エピソード数（エピソード数を減らして実行。chainerが必要）
+- ch3/cartpole.py の digitize_state と、TabularQの更新（dense / hash）
+
+python benchmark.py [--out benchmark.json] [--only engine,games,train,tabular] [--episodes 200]
+python benchmark.py --compare old.json            # 前回の結果との比も表示する
+"""
+from __future__ import print_function
+import argparse
+import json
+import platform
+import random
+import time
+import numpy as np
+import reversi
+from reversi import Board, SIZE
+
+SEED = 0
+SECTIONS = ('engine', 'games', 'train', 'tabular')
+
+
+def per_second(func, n, repeat=5):
+    """ n回分の処理funcをrepeat回計り、最も速かった回の１秒あたりの回数 """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return n / best
+
+
+def record_positions(n_games=50, seed=SEED):
+    """ ランダム対戦の全局面を (盤面, 手番) で記録する """
+    rng = random.Random(seed)
+    board = Board()
+    positions = []
+    for _ in range(n_games):
+        board.board_reset()
+        while not board.game_end:
+            positions.append((board.board.copy(), board.turn))
+            if not board.available_pos:
+                board.pss += 1
+                board.end_check()
+            else:
+                board.agent_action(rng.choice(board.available_pos))
+                board.pss = 0
+            board.change_turn()
+    return positions
+
+
+def bench_engine(positions):
+    board = Board()
+    cells = [(i, j) for i in range(SIZE) for j in range(SIZE)]
+
+    def search_positions():
+        for b, turn in positions:
+            board.board, board.turn = b, turn
+            board.search_positions()
+
+    def search_positions_cold():
+        reversi.MOVE_CACHE.clear()
+        search_positions()
+
+    def is_available():
+        for b, turn in positions:
+            board.board, board.turn = b, turn
+            for pos in cells:
+                board.is_available(pos)
+
+    # do_reverseは石を置いた後の盤面で呼ぶので、置いた後の盤面を先に作っておく
+    placed = []
+    for b, turn in positions:
+        board.board, board.turn = b, turn
+        for pos in board.search_positions():
+            after = b.copy()
+            after[pos] = turn
+            placed.append((after, turn, pos))
+
+    def do_reverse():
+        for after, turn, pos in placed:
+            board.board, board.turn = after.copy(), turn
+            board.do_reverse(pos)
+
+    def end_check():
+        for b, turn in positions:
+            board.board, board.turn, board.pss = b, turn, 0
+            board.end_check()
+
+    search_positions()  # キャッシュを温めておく
+    return {
+        'search_positions_cold': (per_second(search_positions_cold, len(positions)), 'calls/s'),
+        'search_positions_warm': (per_second(search_positions, len(positions)), 'calls/s'),
+        'is_available': (per_second(is_available, len(positions) * len(cells)), 'calls/s'),
+        'do_reverse': (per_second(do_reverse, len(placed)), 'calls/s'),
+        'end_check': (per_second(end_check, len(positions)), 'calls/s'),
+    }
+
+
+def bench_games(n_games=200):
+    from bitboard import BitBoard, play_random_game
+    results = {}
+    for name, board in (('board', Board()), ('bitboard', BitBoard())):
+        reversi.MOVE_CACHE.clear()
+        rng = random.Random(SEED)
+        start = time.perf_counter()
+        for _ in range(n_games):
+            play_random_game(board, rng)
+        results['random_games_' + name] = (n_games / (time.perf_counter() - start), 'games/s')
+    return results
+
+
+def bench_train(n_episodes=200):
+    try:
+        import train_reversi_DNN
+    except ImportError as e:
+        return {'main_episodes': (None, 'episodes/s', 'skipped: {}'.format(e))}
+    results = {}
+    for name, kwargs in (('main_episodes', {}), ('main_episodes_masked', {'masked': True})):
+        random.seed(SEED)
+        np.random.seed(SEED)
+        start = time.perf_counter()
+        train_reversi_DNN.main(n_episodes=n_episodes, **kwargs)
+        results[name] = (n_episodes / (time.perf_counter() - start), 'episodes/s')
+    return results
+
+
+def bench_tabular(n_steps=20000):
+    from chapter3 import ch3_import
+    cartpole = ch3_import('cartpole')
+    tabular_q = ch3_import('tabular_q')
+    rng = np.random.RandomState(SEED)
+    # CartPoleの観測の範囲に収まる程度の乱数
+    observations = rng.uniform(-1, 1, size=(n_steps, 4)) * np.array([2.4, 3.0, 0.5, 2.0])
+    n_states = cartpole.num_digitized ** 4
+    states = rng.randint(0, n_states, size=(n_steps, 2))
+    actions = rng.randint(0, 2, size=n_steps)
+    rewards = rng.uniform(-1, 1, size=n_steps)
+
+    def digitize():
+        for obs in observations:
+            cartpole.digitize_state(obs)
+
+    def digitize_batch():
+        cartpole.discretizer.encode(observations)
+
+    def update(backend):
+        agent = tabular_q.TabularQ(tabular_q.make_table(backend, n_states, 2))
+        rows = list(zip(states[:, 0].tolist(), actions.tolist(), rewards.tolist(), states[:, 1].tolist()))
+        return lambda: [agent.update(*row) for row in rows]
+
+    return {
+        'cartpole_digitize_state': (per_second(digitize, n_steps, repeat=3), 'steps/s'),
+        'cartpole_discretizer_batch': (per_second(digitize_batch, n_steps, repeat=3), 'steps/s'),
+        'cartpole_update_dense': (per_second(update('dense'), n_steps, repeat=3), 'steps/s'),
+        'cartpole_update_hash': (per_second(update('hash'), n_steps, repeat=3), 'steps/s'),
+    }
+
+
+def run(sections=SECTIONS, n_episodes=200):
+    results = {}
+    if 'engine' in sections:
+        results.update(bench_engine(record_positions()))
+    if 'games' in sections:
+        results.update(bench_games())
+    if 'train' in sections:
+        results.update(bench_train(n_episodes))
+    if 'tabular' in sections:
+        results.update(bench_tabular())
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': SEED,
+            'board_size': SIZE,
+            'episodes': n_episodes,
+        },
+        'results': {name: dict(zip(('value', 'unit', 'note'), r)) for name, r in results.items()},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default='benchmark.json', help='結果のJSON')
+    parser.add_argument('--only', default=','.join(SECTIONS), help='計測する項目（カンマ区切り）')
+    parser.add_argument('--episodes', type=int, default=200, help='main()のエピソード数')
+    parser.add_argument('--compare', default=None, help='比較する前回の結果のJSON')
+    args = parser.parse_args()
+    report = run(args.only.split(','), args.episodes)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    old = {}
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)['results']
+    for name, r in sorted(report['results'].items()):
+        if r['value'] is None:
+            print('{:28s} {}'.format(name, r['note']))
+            continue
+        line = '{:28s} {:12.1f} {}'.format(name, r['value'], r['unit'])
+        if old.get(name, {}).get('value'):
+            line += '  ({:.2f}x)'.format(r['value'] / old[name]['value'])
+        print(line)
+    print('-> {}'.format(args.out))
@@ -0,0 +1,280 @@
+# -*- coding:utf-8 -*-
+""" ビットボード版リバーシ盤面
+
+黒石・白石をそれぞれ1つの整数（ビットマスク）で持ち、シフトとマスクで
+着手可能位置の生成と石の反転を行う。Boardクラスと同じAPIを持つので置き換えて使える。
+ビット番号は i * size + j で、NNの行動番号（pos[0] * SIZE + pos[1]）と一致する。
+
+python bitboard.py で、SIZE 4, 6, 8 についてBoardとのランダム対戦比較と速度計測を行う。
+"""
+from __future__ import print_function
+import numpy as np
+import random
+import time
+from reversi import SIZE, NONE, BLACK, WHITE, STONE, N2L, DIR
+
+_SHIFT_TABLES = {}  # ボードサイズごとのシフト表のキャッシュ
+
+
+def shift_table(size):
+    """ 隣接８方向それぞれの (シフト量, 端の折り返し防止マスク) を返す """
+    if size not in _SHIFT_TABLES:
+        full = (1 << size * size) - 1
+        col0 = 0    # 左端の列のビット
+        for i in range(size):
+            col0 |= 1 << (i * size)
+        col_last = col0 << (size - 1)   # 右端の列のビット
+        table = []
+        for di, dj in DIR:
+            if di == 0 and dj == 0:
+                continue
+            mask = full
+            if dj == 1:
+                mask &= ~col0       # 右へずらした結果が左端に回り込まないように
+            elif dj == -1:
+                mask &= ~col_last   # 左へずらした結果が右端に回り込まないように
+            table.append((di * size + dj, mask))
+        _SHIFT_TABLES[size] = tuple(table)
+    return _SHIFT_TABLES[size]
+
+
+def shift(b, s, mask):
+    """ ビットボードを s だけずらす（正なら下・右方向） """
+    return ((b << s) if s > 0 else (b >> -s)) & mask
+
+
+def popcount(b):
+    return bin(b).count('1')
+
+
+class BitBoard():
+    """ ビットボード版リバーシボードクラス（Boardと同じAPI） """
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.full = (1 << size * size) - 1
+        self.shifts = shift_table(size)
+        self.bitpos = np.arange(size * size, dtype=np.uint64)  # board配列への展開用
+        self.board_reset()
+
+    # ボードの初期化
+    def board_reset(self):
+        size = self.size
+        mid = size // 2
+        self.bb = [0, 0, 0]  # bb[BLACK], bb[WHITE] が各色の石のビットマスク
+        self.bb[WHITE] = (1 << (mid * size + mid)) | (1 << ((mid - 1) * size + mid - 1))
+        self.bb[BLACK] = (1 << ((mid - 1) * size + mid)) | (1 << (mid * size + mid - 1))
+        self.winner = NONE  # 勝者
+        self.turn = BLACK   # 黒石スタート
+        self.game_end = False   # ゲーム終了チェックフラグ
+        self.pss = 0    # パスチェック用フラグ。双方がパスをするとゲーム終了
+        self.nofb = 0   # ボード上の黒石の数
+        self.nofw = 0   # ボード上の白石の数
+        self.undo_stack = []    # make_moveで指した手の取り消し用スタック
+        self.available_pos = self.search_positions()    # self.turnの石が置ける場所のリスト
+
+    # Boardと同じ形式（float32の２次元配列）の盤面。読み出し専用
+    @property
+    def board(self):
+        black = (np.uint64(self.bb[BLACK]) >> self.bitpos) & np.uint64(1)
+        white = (np.uint64(self.bb[WHITE]) >> self.bitpos) & np.uint64(1)
+        return (black * BLACK + white * WHITE).astype(np.float32).reshape(self.size, self.size)
+
+    # 着手可能位置のビットマスク
+    def legal_moves(self):
+        own = self.bb[self.turn]
+        opp = self.bb[BLACK if self.turn == WHITE else WHITE]
+        empty = self.full & ~(own | opp)
+        moves = 0
+        for s, mask in self.shifts:
+            x = shift(own, s, mask) & opp
+            for _ in range(self.size - 3):  # 相手の石は最大 size-2 個続く
+                x |= shift(x, s, mask) & opp
+            moves |= shift(x, s, mask) & empty
+        return moves
+
+    # ビット番号 p に置いたときに反転する石のビットマスク
+    def flips(self, p):
+        own = self.bb[self.turn]
+        opp = self.bb[BLACK if self.turn == WHITE else WHITE]
+        m = 1 << p
+        f = 0
+        for s, mask in self.shifts:
+            x = 0
+            y = shift(m, s, mask)
+            while y & opp:
+                x |= y
+                y = shift(y, s, mask)
+            if y & own:  # 自分の石で挟んでいれば反転確定
+                f |= x
+        return f
+
+    # 石を置く＆リバース処理
+    def put_stone(self, pos):
+        if self.is_available(pos):
+            self.bb[self.turn] |= 1 << int(pos[0] * self.size + pos[1])
+            self.do_reverse(pos)    # リバース
+            return True
+        else:
+            return False
+
+    # ターンチェンジ
+    def change_turn(self):
+        self.turn = WHITE if self.turn == BLACK else BLACK
+        self.available_pos = self.search_positions()    # 石が置ける場所を探索しておく
+
+    # ランダムに石を置く場所を決める　（ε-greedy用）
+    def random_action(self):
+        if len(self.available_pos) > 0:
+            pos = random.choice(self.available_pos)  # 置く場所をランダムに決める
+            pos = pos[0] * self.size + pos[1]    # １次元座標に変換
+            return pos
+        return False    # 置く場所なし
+
+    # エージェントの行動と勝敗判定
+    def agent_action(self, pos):
+        self.put_stone(pos)
+        self.end_check()    # 石が置けたら、ゲーム終了をチェック
+
+    # リバース処理（posには既に自分の石が置かれている）
+    def do_reverse(self, pos):
+        f = self.flips(int(pos[0] * self.size + pos[1]))
+        opp = BLACK if self.turn == WHITE else WHITE
+        self.bb[self.turn] |= f
+        self.bb[opp] &= ~f
+
+    # 探索用の着手。posに石を置いて手番を交代し、取り消し用のトークンを返す
+    # pos=Noneでパス。posは置ける場所であること。available_posやgame_endは更新しない
+    def make_move(self, pos):
+        token = (pos, self.bb[BLACK], self.bb[WHITE], self.turn, self.pss)
+        if pos is None:
+            self.pss += 1
+        else:
+            p = int(pos[0] * self.size + pos[1])
+            f = self.flips(p)
+            opp = BLACK if self.turn == WHITE else WHITE
+            self.bb[self.turn] |= f | (1 << p)
+            self.bb[opp] &= ~f
+            self.pss = 0
+        self.turn = WHITE if self.turn == BLACK else BLACK
+        self.undo_stack.append(token)
+        return token
+
+    # make_moveの取り消し。最後に指した手から順に戻す
+    def unmake_move(self, token):
+        assert self.undo_stack and self.undo_stack[-1] is token, '最後の手から順に戻してください'
+        self.undo_stack.pop()
+        _, self.bb[BLACK], self.bb[WHITE], self.turn, self.pss = token
+
+    # 石が置ける場所をリストアップする（Boardと同じ行優先の順序）
+    def search_positions(self):
+        pos = []
+        moves = self.legal_moves()
+        while moves:
+            low = moves & -moves    # 最下位ビットを取り出す
+            pos.append(divmod(low.bit_length() - 1, self.size))
+            moves ^= low
+        return pos
+
+    # 石が置けるかをチェックする
+    def is_available(self, pos):
+        p = int(pos[0] * self.size + pos[1])
+        if (self.bb[BLACK] | self.bb[WHITE]) >> p & 1:  # すでに石が置いてあれば、置けない
+            return False
+        return self.flips(p) != 0
+
+    # ゲーム終了チェック
+    def end_check(self):
+        # ボードに全て石が埋まるか、双方がパスしたら
+        if (self.bb[BLACK] | self.bb[WHITE]) == self.full or self.pss == 2:
+            self.game_end = True
+            self.nofb = popcount(self.bb[BLACK])
+            self.nofw = popcount(self.bb[WHITE])
+            self.winner = BLACK if self.nofb > self.nofw else WHITE
+
+    # ボード表示
+    def show_board(self):
+        board = self.board
+        print('  ', end='')
+        for i in range(1, self.size + 1):
+            print(' {}'.format(N2L[i]), end='')  # 横軸ラベル表示
+        print('')
+        for i in range(0, self.size):
+            print('{0:2d} '.format(i+1), end='')
+            for j in range(0, self.size):
+                print('{} '.format(STONE[int(board[i][j])]), end='')
+            print('')
+
+
+def play_random_game(board, rng):
+    """ main()と同じ手順でランダム対戦を１局行い、着手数を返す """
+    board.board_reset()
+    n_moves = 0
+    while not board.game_end:
+        if not board.available_pos:
+            board.pss += 1
+            board.end_check()
+        else:
+            board.agent_action(rng.choice(board.available_pos))
+            n_moves += 1
+            if board.pss == 1:
+                board.pss = 0
+        board.change_turn()
+    return n_moves
+
+
+def check_against_board(size, n_games=200, seed=0):
+    """ 同じ乱数でBoardとBitBoardを並走させ、全局面が一致することを確認する """
+    import reversi
+    reversi.SIZE = size   # Boardはモジュール変数SIZEを参照する
+    try:
+        rng = random.Random(seed)
+        ref = reversi.Board()
+        bit = BitBoard(size)
+        for _ in range(n_games):
+            ref.board_reset()
+            bit.board_reset()
+            while not ref.game_end:
+                assert [tuple(map(int, p)) for p in ref.available_pos] == bit.available_pos
+                if not ref.available_pos:
+                    ref.pss += 1
+                    bit.pss += 1
+                    ref.end_check()
+                    bit.end_check()
+                else:
+                    pos = rng.choice(bit.available_pos)
+                    ref.agent_action(pos)
+                    bit.agent_action(pos)
+                    if ref.pss == 1:
+                        ref.pss = 0
+                        bit.pss = 0
+                assert np.array_equal(ref.board, bit.board)
+                assert (ref.game_end, ref.winner, ref.nofb, ref.nofw) == \
+                    (bit.game_end, bit.winner, bit.nofb, bit.nofw)
+                ref.change_turn()
+                bit.change_turn()
+    finally:
+        reversi.SIZE = SIZE
+
+
+def moves_per_second(board, n_games=200, seed=0):
+    """ ランダム対戦での１秒あたりの着手数 """
+    rng = random.Random(seed)
+    n_moves = 0
+    start = time.perf_counter()
+    for _ in range(n_games):
+        n_moves += play_random_game(board, rng)
+    return n_moves / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    import reversi
+    for size in (4, 6, 8):
+        check_against_board(size)
+        reversi.SIZE = size
+        reversi.MOVE_CACHE.clear()    # 合法手キャッシュを空にしてから計測
+        ref = moves_per_second(reversi.Board())
+        reversi.SIZE = SIZE
+        bit = moves_per_second(BitBoard(size))
+        print('SIZE {}: 一致OK  Board {:.0f} moves/s, BitBoard {:.0f} moves/s ({:.1f}倍)'.format(
+            size, ref, bit, bit / ref))
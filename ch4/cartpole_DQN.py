@@ -1,7 +1,6 @@
 # coding: utf-8
 #import myenv
 import gym  # 倒立振子（cartpole）の実行環境
-from gym import wrappers    # gymの画像保存
 import numpy as np
 import time
 import chainer
@@ -29,18 +28,38 @@ gamma = 0.9
 alpha = 0.5
 max_number_of_steps = 200   # ループ回数
 num_episodes = 300          # 総試行回数
+prioritized = False         # Trueにすると優先度付きReplay Bufferを使う
+profile = None              # 'profile'にすると段階ごとの時間を計測し、profile.csv / profile.json に書き出す
+record = None               # 'frames'にすると画面に描画せず、録画してこのディレクトリに書き出す（書き出しは別スレッド）
+record_rgb_array = True     # Trueならenv.render(mode='rgb_array')の画像、Falseなら状態から別スレッドで描く合成画像を録画する
 
 q_func = QFunction(env.observation_space.shape[0], env.action_space.n)
 optimizer = chainer.optimizers.Adam(eps=1e-2)
 optimizer.setup(q_func)
 explorer = chainerrl.explorers.LinearDecayEpsilonGreedy(start_epsilon=1.0, end_epsilon=0.1, decay_steps=num_episodes, random_action_func=env.action_space.sample)
-replay_buffer = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
+if prioritized: # TD誤差の大きい遷移ほど多く使う
+    from prioritized_replay_buffer import PrioritizedReplayBuffer
+    replay_buffer = PrioritizedReplayBuffer(capacity=10 ** 6, betasteps=num_episodes * max_number_of_steps)
+else:
+    replay_buffer = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
 phi = lambda x: x.astype(np.float32, copy=False)
 agent = chainerrl.agents.DQN(
     q_func, optimizer, replay_buffer, gamma, explorer,
     replay_start_size=500, update_interval=1, target_update_interval=100,
     phi=phi
 )
+timer = None
+if profile is not None: # 計測しない時は何も差し替えない
+    from phase_timer import PhaseTimer, instrument_agent
+    timer = PhaseTimer()
+    instrument_agent(timer, agent)
+    timer.wrap(env, 'step', 'env_step')
+    timer.wrap(env, 'render')
+recorder = None
+if record is not None:  # 画像にして書き出すのは別スレッド（../ch3/frame_recorder.py）
+    from chapter3 import ch3_import
+    frame_recorder = ch3_import('frame_recorder')
+    recorder = frame_recorder.FrameRecorder(record, draw=None if record_rgb_array else frame_recorder.draw_cartpole)
 
 for episode in range(num_episodes): # 試行数分繰り返す
     observation = env.reset()
@@ -49,12 +68,23 @@ for episode in range(num_episodes): # 試行数分繰り返す
     R = 0
     for t in range(max_number_of_steps):    # 1試行のループ
         if episode % 100 == 0:
-            env.render()
+            if recorder is not None:
+                recorder.add(episode, env.render(mode='rgb_array') if record_rgb_array
+                             else tuple(env.unwrapped.state))
+            else:
+                env.render()
         action = agent.act_and_train(observation, reward)
         observation, reward, done, info = env.step(action)
         R += reward
         if done:
             break
     agent.stop_episode_and_train(observation, reward, done)
+    if recorder is not None:
+        recorder.check()    # 録画のスレッドで起きたエラーはここで止める
     if episode % 10 == 0:
         print('episode:', episode, 'R:', R, 'statistics:', agent.get_statistics())
+        if timer is not None:
+            print(timer.report())
+            timer.dump(profile)
+if recorder is not None:
+    recorder.close()    # 書き込みが終わるまで待つ
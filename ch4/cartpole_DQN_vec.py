@@ -0,0 +1,175 @@
+# coding: utf-8
+""" 複数の倒立振子（cartpole）を同時に進めるDQN
+
+N個のCartPole-v0を足並みを揃えて１ステップずつ進め、chainerrlのDQNのバッチ版
+（batch_act_and_train / batch_observe_and_train）で、１回のQFunctionの呼び出しで全ての環境の行動を選ぶ。
+環境は同じプロセス内で順に進めるか（SerialVectorEnv）、環境ごとのサブプロセスで並列に進める
+（chainerrl.envs.MultiprocessVectorEnv）。描画はしない（--renderで同じプロセス内の１つ目の環境を描画）。
+--numpy を付けると、gymの代わりにNumPyで書いたCartPole（../ch3/cartpole_vec.py）で全ての環境を配列のまま進める。
+
+python cartpole_DQN_vec.py --envs 8 [--subprocess | --numpy] [--steps 60000] [--compare]
+--compare を付けると、cartpole_DQN.pyと同じ１環境ずつのループも同じステップ数だけ実行して steps/s を比べる。
+"""
+from __future__ import print_function
+import argparse
+import functools
+import time
+import numpy as np
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import chainerrl
+
+gamma = 0.9
+max_number_of_steps = 200   # ループ回数
+
+
+# Q関数の定義（cartpole_DQN.pyと同じ）
+class QFunction(chainer.Chain):
+    def __init__(self, obs_size, n_actions, n_hidden_cannels=50):
+        super().__init__()
+        with self.init_scope():
+            self.l0 = L.Linear(obs_size, n_hidden_cannels)
+            self.l1 = L.Linear(n_hidden_cannels, n_hidden_cannels)
+            self.l2 = L.Linear(n_hidden_cannels, n_actions)
+
+    def __call__(self, x, test=False):
+        h = F.tanh(self.l0(x))
+        h = F.tanh(self.l1(h))
+        return chainerrl.action_value.DiscreteActionValue(self.l2(h))
+
+
+class SerialVectorEnv():
+    """ 複数の環境を同じプロセス内で順に進める（MultiprocessVectorEnvと同じAPI） """
+
+    def __init__(self, envs):
+        self.envs = envs
+        self.action_space = envs[0].action_space
+        self.observation_space = envs[0].observation_space
+        self.last_obs = [None] * len(envs)
+
+    def step(self, actions):
+        results = [env.step(a) for env, a in zip(self.envs, actions)]
+        obs, rewards, dones, infos = zip(*results)
+        self.last_obs = list(obs)
+        return obs, rewards, dones, infos
+
+    def reset(self, mask=None):
+        """ maskがTrueの環境はそのままにして、それ以外を初期化し、全ての環境の観測を返す """
+        if mask is None:
+            mask = [False] * len(self.envs)
+        self.last_obs = [o if m else env.reset() for env, m, o in zip(self.envs, mask, self.last_obs)]
+        return self.last_obs
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def make_env(seed):
+    import gym  # 倒立振子（cartpole）の実行環境
+    env = gym.make('CartPole-v0')
+    env.seed(seed)
+    return env
+
+
+def make_vec_env(n_envs, subprocess=False, seed=0, numpy=False):
+    if numpy:   # 終わった環境の初期化はtrain_vecが行う
+        from chapter3 import ch3_import
+        return ch3_import('cartpole_vec').VecCartPole(n_envs, seed=seed, auto_reset=False)
+    if subprocess:
+        return chainerrl.envs.MultiprocessVectorEnv(
+            [functools.partial(make_env, seed + k) for k in range(n_envs)])
+    return SerialVectorEnv([make_env(seed + k) for k in range(n_envs)])
+
+
+def make_agent(env, decay_steps):
+    q_func = QFunction(env.observation_space.shape[0], env.action_space.n)
+    optimizer = chainer.optimizers.Adam(eps=1e-2)
+    optimizer.setup(q_func)
+    explorer = chainerrl.explorers.LinearDecayEpsilonGreedy(
+        start_epsilon=1.0, end_epsilon=0.1, decay_steps=decay_steps, random_action_func=env.action_space.sample)
+    replay_buffer = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
+    phi = lambda x: x.astype(np.float32, copy=False)
+    return chainerrl.agents.DQN(
+        q_func, optimizer, replay_buffer, gamma, explorer,
+        replay_start_size=500, update_interval=1, target_update_interval=100,
+        phi=phi
+    )
+
+
+def train_vec(n_envs, n_steps, subprocess=False, render=False, decay_steps=300, seed=0, numpy=False):
+    """ N個の環境を同時に進めて学習し、１秒あたりの環境のステップ数を返す """
+    env = make_vec_env(n_envs, subprocess, seed, numpy)
+    agent = make_agent(env, decay_steps)
+    obss = env.reset()
+    episode_r = np.zeros(n_envs)
+    episode_len = np.zeros(n_envs, dtype=np.int64)
+    episode = 0
+    steps = 0
+    start = time.perf_counter()
+    while steps < n_steps:
+        actions = agent.batch_act_and_train(obss)   # 全ての環境の行動を１回の順伝播で選ぶ
+        obss, rewards, dones, infos = env.step(actions)
+        if render and isinstance(env, SerialVectorEnv):
+            env.envs[0].render()
+        steps += n_envs
+        episode_r += rewards
+        episode_len += 1
+        dones = np.asarray(dones)
+        resets = episode_len == max_number_of_steps
+        agent.batch_observe_and_train(obss, rewards, dones, resets)
+        for k in np.flatnonzero(dones | resets):
+            if episode % 10 == 0:
+                print('episode:', episode, 'R:', episode_r[k], 'statistics:', agent.get_statistics())
+            episode += 1
+        episode_r[dones | resets] = 0
+        episode_len[dones | resets] = 0
+        obss = env.reset(~(dones | resets))     # 終わった環境だけ初期化する
+    elapsed = time.perf_counter() - start
+    env.close()
+    return steps / elapsed
+
+
+def train_single(n_steps, decay_steps=300, seed=0):
+    """ cartpole_DQN.pyと同じ１環境ずつのループ（描画なし）。１秒あたりのステップ数を返す """
+    env = make_env(seed)
+    agent = make_agent(env, decay_steps)
+    steps = 0
+    episode = 0
+    start = time.perf_counter()
+    while steps < n_steps:
+        observation = env.reset()
+        reward = 0
+        R = 0
+        for t in range(max_number_of_steps):
+            action = agent.act_and_train(observation, reward)
+            observation, reward, done, info = env.step(action)
+            R += reward
+            steps += 1
+            if done:
+                break
+        agent.stop_episode_and_train(observation, reward, done)
+        if episode % 10 == 0:
+            print('episode:', episode, 'R:', R, 'statistics:', agent.get_statistics())
+        episode += 1
+    return steps / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--envs', type=int, default=8, help='同時に進める環境の数')
+    parser.add_argument('--subprocess', action='store_true', help='環境ごとにサブプロセスで進める')
+    parser.add_argument('--steps', type=int, default=60000, help='学習する環境のステップ数（全環境の合計）')
+    parser.add_argument('--numpy', action='store_true', help='NumPyで書いたCartPoleで配列のまま進める（gym不要）')
+    parser.add_argument('--render', action='store_true', help='１つ目の環境を描画する（同じプロセスの時のみ）')
+    parser.add_argument('--compare', action='store_true', help='１環境ずつのループとsteps/sを比べる')
+    args = parser.parse_args()
+    vec = train_vec(args.envs, args.steps, args.subprocess, args.render, numpy=args.numpy)
+    if args.compare:
+        single = train_single(args.steps)
+        print('１環境ずつ: {:.0f} steps/s'.format(single))
+    print('{} 環境（{}）: {:.0f} steps/s'.format(
+        args.envs, 'NumPy' if args.numpy else 'サブプロセス' if args.subprocess else '同じプロセス', vec))
+    if args.compare:
+        print('{:.1f}倍'.format(vec / single))
@@ -0,0 +1,21 @@
+# -*- coding:utf-8 -*-
+""" ch3のモジュール（frame_recorder, cartpole_vec, cartpole, tabular_q など）をch4から使う
+
+同じ実装を章ごとに複製しないように、ch3のディレクトリを１度だけimportの検索パスの最後に加えてから読み込む。
+最後に加えるので、ch4に同じ名前のモジュールがあればそちらが優先される。
+
+    from chapter3 import ch3_import
+    FrameRecorder = ch3_import('frame_recorder').FrameRecorder
+"""
+import importlib
+import os
+import sys
+
+CH3_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ch3'))
+
+
+def ch3_import(name):
+    """ ch3のモジュールnameをimportして返す """
+    if CH3_DIR not in sys.path:
+        sys.path.append(CH3_DIR)
+    return importlib.import_module(name)
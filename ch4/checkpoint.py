@@ -0,0 +1,274 @@
+# -*- coding:utf-8 -*-
+""" バックグラウンドでのチェックポイント保存と再開
+
+学習ループでは、モデル・optimizer・Replay Bufferの中身をメモリ上にコピーするだけにして、
+ファイルへの書き込みは別スレッドで行う。スナップショットは一時ディレクトリに書いてから
+renameするので、途中で落ちても壊れたスナップショットは残らない。新しいものからkeep個だけ残す。
+
+directory/episode_001000/
+    black/model.npz, target_model.npz, optimizer.npz    agent.load()でそのまま読める
+    black/replay_buffer.*                               Replay Bufferの中身
+    white/...
+    agents.json     エージェントごとのステップ数（ε-greedyのεはここから決まる）と統計
+    state.json      エピソード番号や累計の手数など
+    rng.pkl         random / numpy の乱数の状態
+
+PackedReplayBufferは（メモリマップ版も）保存した分の行をコピーしてスナップショットに入れる。
+メモリマップのファイルは学習が続く間に上書きされるので、位置だけでは古いスナップショットに戻せないため。
+2bitに詰めてあるので、10^6遷移でも4x4で15MB、8x8で40MB程度。
+
+python checkpoint.py    # Replay Bufferを保存して戻し、中身と容量が変わらないことを確かめる
+"""
+from __future__ import print_function
+import collections
+import json
+import os
+import pickle
+import queue
+import random
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+PREFIX = 'episode_'
+
+
+def copy_link(obj):
+    """ chainerのLink/Optimizerをsave_npzと同じ形式のdictにコピーする """
+    import chainer
+    s = chainer.serializers.DictionarySerializer()
+    s.save(obj)
+    return {k: np.array(v) for k, v in s.target.items()}
+
+
+def unwrap(replay_buffer):
+    """ SymmetricReplayBufferなどのラッパーを外す """
+    while hasattr(replay_buffer, 'replay_buffer'):
+        replay_buffer = replay_buffer.replay_buffer
+    return replay_buffer
+
+
+def copy_replay_buffer(replay_buffer):
+    """ Replay Bufferの中身をコピーし、dirnameに書き出す関数を返す（書き出しは別スレッドで呼ぶ） """
+    from packed_replay_buffer import PackedReplayBuffer
+    from prioritized_replay_buffer import PrioritizedReplayBuffer
+    buf = unwrap(replay_buffer)
+    if isinstance(buf, PrioritizedReplayBuffer):    # 遷移と優先度
+        snapshot = buf.snapshot()
+        return lambda dirname: buf.save(os.path.join(dirname, 'replay_buffer.pkl'), snapshot)
+    if isinstance(buf, PackedReplayBuffer):     # 保存した分の行だけコピーする
+        n = len(buf)
+        arrays = {name: getattr(buf, name)[:n].copy() for name in
+                  ('state', 'next_state', 'action', 'reward', 'is_state_terminal')}
+        arrays['meta'] = np.array(buf.meta)
+        return lambda dirname: np.savez(os.path.join(dirname, 'replay_buffer.npz'), **arrays)
+    # chainerrlのReplayBuffer。遷移のdictは追加後に書き換えられないので、参照のリストをコピーすれば十分
+    memory = list(buf.memory)
+    capacity = buf.capacity
+
+    def write(dirname):
+        # load()はこれをそのままmemoryにするので、maxlenを付けて容量を保つ
+        with open(os.path.join(dirname, 'replay_buffer.pkl'), 'wb') as f:
+            pickle.dump(collections.deque(memory, maxlen=capacity), f, protocol=pickle.HIGHEST_PROTOCOL)
+    return write
+
+
+def restore_replay_buffer(replay_buffer, dirname):
+    buf = unwrap(replay_buffer)
+    packed = os.path.join(dirname, 'replay_buffer.npz')
+    if os.path.exists(packed):  # PackedReplayBuffer（メモリマップ版ならファイルに書き戻す）
+        with np.load(packed) as data:
+            n = int(data['meta'][0])
+            for name in ('state', 'next_state', 'action', 'reward', 'is_state_terminal'):
+                getattr(buf, name)[:n] = data[name]
+            buf.meta[...] = data['meta']
+        buf.flush()
+    else:
+        buf.load(os.path.join(dirname, 'replay_buffer.pkl'))
+
+
+def write_agent(dirname, links):
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    for name, target in links.items():
+        np.savez(os.path.join(dirname, name + '.npz'), **target)
+
+
+def export_agent(dirname, links):
+    """ agent_black_N などを書き出す。書き終えてからrenameするので、tournament.pyなどが途中のものを読まない """
+    parent, base = os.path.split(os.path.normpath(dirname))
+    tmp = os.path.join(parent, '.tmp-' + base)
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    write_agent(tmp, links)
+    if os.path.exists(dirname):
+        shutil.rmtree(dirname)
+    os.rename(tmp, dirname)
+
+
+class Checkpointer():
+    """ チェックポイントをバックグラウンドで書き出す
+
+    directory=Noneならスナップショットは作らず、exportsに指定したエージェントの保存
+    （agent.save()と同じ形式）だけをバックグラウンドで行う。
+    """
+
+    def __init__(self, directory=None, keep=3):
+        self.directory = directory
+        self.keep = keep
+        self.jobs = queue.Queue(maxsize=1)  # 書き込みが追いつかなければ次の保存で待つ
+        self.error = None
+        self.thread = threading.Thread(target=self.worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            try:
+                job()
+            except Exception as e:  # 次のsave/closeで学習側に伝える
+                self.error = e
+
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def save(self, episode, agents, replay_buffers=None, state=None, exports=None):
+        """ 学習ループから呼ぶ。コピーだけしてすぐに戻る
+
+        agents: {'black': agent, ...}
+        replay_buffers: {'black': replay_buffer, ...}
+        state: JSONにできるdict（エピソード番号・累計の手数など）
+        exports: {'agent_black_1000': agent, ...}（agent.save()の代わり）
+        """
+        self.check()
+        links = {}
+        for name, agent in dict(agents, **(exports or {})).items():
+            if id(agent) not in links:
+                links[id(agent)] = {attr: copy_link(getattr(agent, attr)) for attr in agent.saved_attributes}
+        job_exports = [(path, links[id(agent)]) for path, agent in (exports or {}).items()]
+        if self.directory is None:
+            self.jobs.put(lambda: [export_agent(path, l) for path, l in job_exports])
+            return
+        job_agents = [(name, links[id(agent)]) for name, agent in agents.items()]
+        info = {name: {'t': agent.t, 'average_q': float(agent.average_q), 'average_loss': float(agent.average_loss)}
+                for name, agent in agents.items()}
+        buffers = [(name, copy_replay_buffer(buf)) for name, buf in (replay_buffers or {}).items()]
+        rng = pickle.dumps((random.getstate(), np.random.get_state()))
+        state = dict(state or {}, episode=episode)
+
+        def job():
+            for path, l in job_exports:
+                export_agent(path, l)
+            final = os.path.join(self.directory, '{}{:06d}'.format(PREFIX, episode))
+            tmp = os.path.join(self.directory, '.tmp-{}{:06d}'.format(PREFIX, episode))
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp)
+            for name, l in job_agents:
+                write_agent(os.path.join(tmp, name), l)
+            for name, write in buffers:
+                write(os.path.join(tmp, name))
+            with open(os.path.join(tmp, 'agents.json'), 'w') as f:
+                json.dump(info, f)
+            with open(os.path.join(tmp, 'state.json'), 'w') as f:
+                json.dump(state, f)
+            with open(os.path.join(tmp, 'rng.pkl'), 'wb') as f:
+                f.write(rng)
+            if os.path.exists(final):
+                shutil.rmtree(final)
+            os.rename(tmp, final)   # 書き終えてから名前を付けるので、壊れたスナップショットは見えない
+            for old in snapshots(self.directory)[:-self.keep]:
+                shutil.rmtree(old)
+        self.jobs.put(job)
+
+    def close(self):
+        """ 書き込みが全て終わるまで待つ """
+        self.jobs.put(None)
+        self.thread.join()
+        self.check()
+
+
+def snapshots(directory):
+    """ 書き終わったスナップショットを古い順に """
+    if directory is None or not os.path.isdir(directory):
+        return []
+    names = sorted(n for n in os.listdir(directory) if n.startswith(PREFIX))
+    return [os.path.join(directory, n) for n in names]
+
+
+def latest(directory):
+    found = snapshots(directory)
+    return found[-1] if found else None
+
+
+def restore(path, agents, replay_buffers=None):
+    """ スナップショットpathからエージェント・Replay Buffer・乱数の状態を戻し、stateのdictを返す """
+    with open(os.path.join(path, 'agents.json')) as f:
+        info = json.load(f)
+    for name, agent in agents.items():
+        agent.load(os.path.join(path, name))    # model, target_model, optimizer
+        agent.t = info[name]['t']   # ε-greedyのεはステップ数から決まる
+        agent.average_q = info[name]['average_q']
+        agent.average_loss = info[name]['average_loss']
+    for name, buf in (replay_buffers or {}).items():
+        restore_replay_buffer(buf, os.path.join(path, name))
+    with open(os.path.join(path, 'rng.pkl'), 'rb') as f:
+        py_state, np_state = pickle.load(f)
+    random.setstate(py_state)
+    np.random.set_state(np_state)
+    with open(os.path.join(path, 'state.json')) as f:
+        return json.load(f)
+
+
+def roundtrip(make, n_before=150, n_after=30):
+    """ 容量100のバッファに容量を超えて追加し、スナップショットを取った後もさらに追加してから戻す
+
+    戻したバッファの (中身のaction, 容量いっぱいまで追加した後の長さ) を返す
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        buf = make(directory)
+        for t in range(n_before):
+            buf.append(state=np.zeros(16), action=t, reward=1.0, next_state=np.zeros(16))
+        write = copy_replay_buffer(buf)
+        for t in range(n_after):    # スナップショットの後も学習は続いてメモリマップは上書きされる
+            buf.append(state=np.zeros(16), action=1000 + t, reward=0.0, next_state=np.zeros(16))
+        snapshot = os.path.join(directory, 'snapshot')
+        os.makedirs(snapshot)
+        write(snapshot)
+        restored = make(directory)
+        restore_replay_buffer(restored, snapshot)
+        buf = unwrap(restored)
+        if hasattr(buf, 'memory'):
+            actions = sorted(e['action'] for e in buf.memory)
+        else:
+            actions = sorted(buf.action[:len(buf)].tolist())
+        for t in range(n_after):
+            restored.append(state=np.zeros(16), action=t, reward=0.0, next_state=np.zeros(16))
+        return actions, len(restored)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    from packed_replay_buffer import PackedReplayBuffer
+    buffers = [
+        ('PackedReplayBuffer', lambda d: PackedReplayBuffer(100, 16, nested=False)),
+        ('PackedReplayBuffer（メモリマップ）',
+         lambda d: PackedReplayBuffer(100, 16, path=os.path.join(d, 'replay'), nested=False)),
+    ]
+    try:
+        import chainerrl
+        buffers.append(('ReplayBuffer', lambda d: chainerrl.replay_buffers.ReplayBuffer(capacity=100)))
+    except ImportError:
+        print('chainerrlがないので、ReplayBufferの確認は省略')
+    for name, make in buffers:
+        actions, length = roundtrip(make)
+        assert actions == list(range(50, 150)), (name, actions)     # スナップショットの時点の中身
+        assert length == 100, (name, length)    # 容量を保っている
+        print('{}: OK'.format(name))
@@ -0,0 +1,27 @@
+# -*- coding:utf-8 -*-
+""" 合法手マスクの効果の計測
+
+main()をマスクなし・マスクありで同じエピソード数だけ学習させ、
+１手あたりの順伝播（act_and_train）の回数と学習時間を比べる。
+
+python masking_benchmark.py [エピソード数]
+"""
+from __future__ import print_function
+import sys
+import time
+from train_reversi_DNN import main
+
+if __name__ == '__main__':
+    n_episodes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    results = []
+    for masked in (False, True):
+        start = time.perf_counter()
+        stats = main(n_episodes=n_episodes, masked=masked)
+        results.append((masked, stats, time.perf_counter() - start))
+    print('===== {} episodes ====='.format(n_episodes))
+    for masked, stats, elapsed in results:
+        print('masked={!s:5}: {:.3f} forward passes per move ({} passes / {} moves), {:.1f} s'.format(
+            masked, stats['forward_passes'] / stats['moves'], stats['forward_passes'], stats['moves'], elapsed))
+    saved = 1 - results[1][1]['forward_passes'] / results[1][1]['moves'] / \
+        (results[0][1]['forward_passes'] / results[0][1]['moves'])
+    print('１手あたりの順伝播の削減率: {:.1%}'.format(saved))
@@ -0,0 +1,125 @@
+# -*- coding:utf-8 -*-
+""" NumPyだけで動くQ関数（推論専用）
+
+QFunctionの推論は L.Linear ４層とReLUだけなので、重みを１つの .npz に書き出せば
+chainer/chainerrl を読み込まずに着手を決められる。書き出しも model.npz を
+NumPyで読むだけなのでchainerは要らない。
+
+python numpy_qfunction.py export agent_black_20000 ...   # 各ディレクトリに qfunction.npz を書き出す
+python numpy_qfunction.py check agent_black_20000 ...    # chainer版との出力の差を調べる（chainerが必要）
+python numpy_qfunction.py bench agent_black_20000        # 起動時間と１手あたりの時間をchainer版と比べる
+"""
+from __future__ import print_function
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+LAYERS = ('l1', 'l2', 'l3', 'l4')
+EXPORT_FILE = 'qfunction.npz'
+
+
+def export(path, out=None):
+    """ agent.save()したディレクトリのmodel.npzからQ関数の重みだけを書き出す """
+    out = out or os.path.join(path, EXPORT_FILE)
+    weights = {}
+    with np.load(os.path.join(path, 'model.npz')) as model:
+        for layer in LAYERS:
+            for name in ('W', 'b'):
+                key = [k for k in model.files if k.split('/')[-2:] == [layer, name]][0]
+                weights['{}_{}'.format(layer, name)] = model[key].astype(np.float32)
+    np.savez(out, **weights)
+    return out
+
+
+class NumpyQFunction():
+    """ QFunctionと同じ計算をNumPyで行う。入力は (B, SIZE*SIZE) の盤面 """
+
+    def __init__(self, filename):
+        with np.load(filename) as w:
+            # L.Linearは x.dot(W.T) + b なので、転置した連続配列を持っておく
+            self.layers = [(np.ascontiguousarray(w[l + '_W'].T), w[l + '_b']) for l in LAYERS]
+        self.n_actions = self.layers[-1][1].shape[0]
+        self.size = int(round(self.n_actions ** 0.5))
+
+    def __call__(self, x):
+        """ Q値 (B, n_actions) を返す """
+        h = np.asarray(x, dtype=np.float32)
+        for k, (W, b) in enumerate(self.layers):
+            h = h.dot(W) + b
+            if k < len(self.layers) - 1:
+                np.maximum(h, 0, out=h)     # ReLU
+        return h
+
+    def act(self, boards, legal):
+        """ 置ける場所（legal: (B, n_actions) のbool）の中でQ値最大の行動をまとめて選ぶ """
+        q = self(np.reshape(boards, (len(boards), -1)))
+        return np.argmax(np.where(legal, q, -np.inf), axis=1)
+
+    def best_move(self, board):
+        """ Board/BitBoardで置ける場所の中でQ値最大の場所 (i, j)。置く場所がなければNone """
+        if not board.available_pos:
+            return None
+        q = self(np.reshape(board.board, (1, -1)))[0]
+        return max(board.available_pos, key=lambda pos: q[pos[0] * self.size + pos[1]])
+
+
+def load_model(path):
+    """ 書き出したqfunction.npzがあればNumPy版、なければchainer版のQ関数を読み込む """
+    npz = os.path.join(path, EXPORT_FILE)
+    if os.path.exists(npz):
+        return NumpyQFunction(npz)
+    from train_reversi_DNN import load_q_function
+    return load_q_function(path)
+
+
+def check(path, n=1000, seed=0):
+    """ chainer版のQFunctionとの出力の最大誤差 """
+    import chainer
+    from train_reversi_DNN import load_q_function
+    q_chainer = load_q_function(path)
+    q_numpy = NumpyQFunction(export(path))
+    x = np.random.RandomState(seed).randint(0, 3, size=(n, q_numpy.n_actions)).astype(np.float32)
+    with chainer.no_backprop_mode(), chainer.using_config('train', False):
+        expected = q_chainer(x).q_values.data
+    return float(np.max(np.abs(q_numpy(x) - expected)))
+
+
+def startup_time(code):
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - start
+
+
+def bench(path, n_moves=1000):
+    from reversi import Board
+    from train_reversi_DNN import load_q_function, greedy_move
+    npz = export(path)
+    path = os.path.abspath(path)
+    t_chainer = startup_time('from train_reversi_DNN import load_q_function; load_q_function({!r})'.format(path))
+    t_numpy = startup_time('from numpy_qfunction import NumpyQFunction; NumpyQFunction({!r})'.format(os.path.abspath(npz)))
+    board = Board()
+    q_chainer = load_q_function(path)
+    q_numpy = NumpyQFunction(npz)
+    start = time.perf_counter()
+    for _ in range(n_moves):
+        greedy_move(q_chainer, board)
+    lat_chainer = (time.perf_counter() - start) / n_moves
+    start = time.perf_counter()
+    for _ in range(n_moves):
+        q_numpy.best_move(board)
+    lat_numpy = (time.perf_counter() - start) / n_moves
+    print('起動時間  chainer {:.3f} s, numpy {:.3f} s'.format(t_chainer, t_numpy))
+    print('１手あたり chainer {:.1f} us, numpy {:.1f} us'.format(lat_chainer * 1e6, lat_numpy * 1e6))
+
+
+if __name__ == '__main__':
+    command, paths = sys.argv[1], sys.argv[2:]
+    for path in paths:
+        if command == 'export':
+            print('{} -> {}'.format(path, export(path)))
+        elif command == 'check':
+            print('{}: 最大誤差 {:.3g}'.format(path, check(path)))
+        elif command == 'bench':
+            bench(path)
@@ -0,0 +1,171 @@
+# -*- coding:utf-8 -*-
+""" 盤面を2bitに詰めて保存するReplay Buffer
+
+chainerrlのReplayBufferは遷移ごとにdictとfloat32の盤面配列を持つが、盤面の値は0/1/2
+（合法手マスクも0/1）しかないので、１マス2bitに詰めたuint8配列に保存する。
+行動・報酬・終局フラグも型付きの配列に持ち、全て事前確保する。
+pathを指定するとnp.memmapのファイルになり、別プロセスから PackedReplayBuffer.open(path) で共有できる
+（書き込みは１プロセスのみ）。
+
+python packed_replay_buffer.py で、chainerrlのReplayBufferとの１遷移あたりのバイト数を比べる。
+"""
+from __future__ import print_function
+import os
+import sys
+import numpy as np
+
+SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)  # １バイトに4マス分
+
+
+def pack(obs):
+    """ (B, obs_size) の0〜3の値を (B, ceil(obs_size/4)) のuint8に詰める """
+    obs = np.asarray(obs)
+    n, obs_size = obs.shape
+    width = (obs_size + 3) // 4
+    cells = np.zeros((n, width * 4), dtype=np.uint8)
+    cells[:, :obs_size] = obs
+    return np.bitwise_or.reduce(cells.reshape(n, width, 4) << SHIFTS, axis=2).astype(np.uint8)
+
+
+def unpack(packed, obs_size):
+    """ packの逆変換。float32の (B, obs_size) を返す """
+    cells = (packed[:, :, None] >> SHIFTS) & 3
+    return cells.reshape(len(packed), -1)[:, :obs_size].astype(np.float32)
+
+
+def nested_samples():
+    """ 使っているchainerrlがn-step版（sampleが遷移のリストのリストを返す）かどうか """
+    import inspect
+    import chainerrl
+    try:
+        params = inspect.signature(chainerrl.replay_buffers.ReplayBuffer.__init__).parameters
+    except (TypeError, ValueError):
+        return False
+    return 'num_steps' in params
+
+
+class PackedReplayBuffer():
+    """ 2bit詰めの盤面を型付き配列で持つReplay Buffer（chainerrlのReplayBufferと同じAPI） """
+
+    def __init__(self, capacity, obs_size, path=None, nested=None, seed=None):
+        self.capacity = capacity
+        self.obs_size = obs_size
+        self.path = path
+        self.nested = nested_samples() if nested is None else nested
+        self.rng = np.random.RandomState(seed)
+        width = (obs_size + 3) // 4
+        columns = [('state', np.uint8, (capacity, width)),
+                   ('next_state', np.uint8, (capacity, width)),
+                   ('action', np.int16, (capacity,)),
+                   ('reward', np.float32, (capacity,)),
+                   ('is_state_terminal', np.bool_, (capacity,)),
+                   ('meta', np.int64, (2,))]    # [保存数, 次の書き込み位置]
+        for name, dtype, shape in columns:
+            if path is None:
+                array = np.zeros(shape, dtype=dtype)
+            else:
+                filename = os.path.join(path, name + '.npy')
+                if os.path.exists(filename):
+                    array = np.load(filename, mmap_mode='r+')
+                    assert array.shape == shape and array.dtype == dtype, filename
+                else:
+                    if not os.path.isdir(path):
+                        os.makedirs(path)
+                    array = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+            setattr(self, name, array)
+        if path is not None:
+            np.save(os.path.join(path, 'obs_size.npy'), np.array(obs_size))
+
+    @classmethod
+    def open(cls, path, nested=None, seed=None):
+        """ 他のプロセスが作ったメモリマップ版のバッファを開く """
+        capacity = np.load(os.path.join(path, 'state.npy'), mmap_mode='r').shape[0]
+        obs_size = int(np.load(os.path.join(path, 'obs_size.npy')))
+        return cls(capacity, obs_size, path=path, nested=nested, seed=seed)
+
+    def __len__(self):
+        return int(self.meta[0])
+
+    def append(self, state, action, reward, next_state=None, next_action=None,
+               is_state_terminal=False, **kwargs):
+        i = int(self.meta[1])
+        self.state[i] = pack(np.reshape(state, (1, -1)))[0]
+        if next_state is not None:
+            self.next_state[i] = pack(np.reshape(next_state, (1, -1)))[0]
+        self.action[i] = action
+        self.reward[i] = reward
+        self.is_state_terminal[i] = is_state_terminal
+        self.meta[1] = (i + 1) % self.capacity  # 満杯になったら古いものから上書き
+        self.meta[0] = min(self.meta[0] + 1, self.capacity)
+
+    def sample_arrays(self, n):
+        """ n件を一様に（重複ありで）選び、型付き配列のdictで返す """
+        idx = self.rng.randint(0, len(self), size=n)
+        return {'state': unpack(self.state[idx], self.obs_size),
+                'action': self.action[idx].astype(np.int32),
+                'reward': self.reward[idx],
+                'next_state': unpack(self.next_state[idx], self.obs_size),
+                'is_state_terminal': self.is_state_terminal[idx]}
+
+    def sample(self, n):
+        """ chainerrlのDQNが使う形式（遷移のdictのリスト）で返す """
+        batch = self.sample_arrays(n)
+        experiences = []
+        for k in range(n):
+            exp = {'state': batch['state'][k], 'action': int(batch['action'][k]),
+                   'reward': float(batch['reward'][k]), 'next_state': batch['next_state'][k],
+                   'next_action': None, 'is_state_terminal': bool(batch['is_state_terminal'][k])}
+            experiences.append([exp] if self.nested else exp)
+        return experiences
+
+    def stop_current_episode(self, *args, **kwargs):
+        pass    # 遷移ごとに保存しているので何もしない
+
+    def flush(self):
+        """ メモリマップ版をディスクに書き出す（他のプロセスが読めるように） """
+        if self.path is not None:
+            for name in ('state', 'next_state', 'action', 'reward', 'is_state_terminal', 'meta'):
+                getattr(self, name).flush()
+
+    def save(self, filename):
+        if self.path is not None:
+            self.flush()
+        else:
+            np.savez_compressed(filename, state=self.state, next_state=self.next_state, action=self.action,
+                                reward=self.reward, is_state_terminal=self.is_state_terminal, meta=self.meta)
+
+    def load(self, filename):
+        if self.path is not None:
+            return  # メモリマップ版はファイルそのものが中身
+        with np.load(filename if filename.endswith('.npz') else filename + '.npz') as data:
+            for name in ('state', 'next_state', 'action', 'reward', 'is_state_terminal', 'meta'):
+                getattr(self, name)[...] = data[name]
+
+    def nbytes_per_transition(self):
+        return sum(getattr(self, name)[0].nbytes for name in
+                   ('state', 'next_state', 'action', 'reward', 'is_state_terminal'))
+
+
+def reference_nbytes_per_transition(obs_size):
+    """ chainerrlのReplayBufferの１遷移あたりのおおよそのバイト数
+
+    遷移のdictとfloat32の盤面配列。next_stateは次の遷移のstateと同じ配列を指すので１つ分だけ数える。
+    """
+    state = np.zeros(obs_size, dtype=np.float32)
+    experience = dict(state=state, action=0, reward=0, next_state=state,
+                      next_action=None, is_state_terminal=False)
+    return sys.getsizeof(experience) + sys.getsizeof(state) + 8  # 8はdequeのポインタ分
+
+
+if __name__ == '__main__':
+    from reversi import SIZE
+    for name, obs_size in (('board', SIZE * SIZE), ('board+mask', 2 * SIZE * SIZE)):
+        buf = PackedReplayBuffer(1000, obs_size, nested=False)
+        obs = np.random.randint(0, 3, size=(1000, obs_size)).astype(np.float32)
+        for k in range(1000):
+            buf.append(obs[k], k % obs_size, 0.0, obs[(k + 1) % 1000], is_state_terminal=False)
+        assert np.array_equal(unpack(buf.state, obs_size), obs)
+        ref = reference_nbytes_per_transition(obs_size)
+        packed = buf.nbytes_per_transition()
+        print('{:10s}: ReplayBuffer {} bytes/transition, PackedReplayBuffer {} bytes/transition ({:.1f}倍)'.format(
+            name, ref, packed, ref / packed))
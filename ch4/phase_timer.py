@@ -0,0 +1,158 @@
+# -*- coding:utf-8 -*-
+""" 学習ループの段階ごとの時間計測
+
+エージェントや盤面のメソッドをインスタンス単位で計測付きのものに差し替えるので、
+学習ループのコードは変えずに、着手生成・act_and_train・Replay Bufferからのサンプリング・
+optimizerの更新・target networkの同期などにかかった時間がわかる。
+計測しない時は何も差し替えないので、余計なコストは一切かからない。
+
+段階ごとに呼び出し回数・合計時間と、1us〜10sを対数で区切ったヒストグラムを持つ。
+段階は入れ子になることがある（act_and_trainの中でupdateが呼ばれるなど）ので、
+時間はそれぞれの段階の中にかかった時間の合計（内側の段階を含む）である。
+"""
+from __future__ import print_function
+import csv
+import json
+import math
+import time
+from collections import OrderedDict
+
+BINS_PER_DECADE = 4
+MIN_EXP, MAX_EXP = -6, 1    # ヒストグラムの範囲 10^-6〜10^1 秒
+N_BINS = (MAX_EXP - MIN_EXP) * BINS_PER_DECADE
+BIN_EDGES = [10 ** (MIN_EXP + k / BINS_PER_DECADE) for k in range(N_BINS + 1)]  # 各ビンの上限（秒）
+
+
+class Phase():
+    """ １つの段階の集計 """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.hist = [0] * N_BINS
+
+    def add(self, dt):
+        self.count += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+        k = int((math.log10(dt) - MIN_EXP) * BINS_PER_DECADE) if dt > 0 else 0
+        self.hist[min(max(k, 0), N_BINS - 1)] += 1
+
+    def percentile(self, q):
+        """ ヒストグラムから求めたq分位点（ビンの上限なので近似値） """
+        rank = q * self.count
+        seen = 0
+        for k, n in enumerate(self.hist):
+            seen += n
+            if seen >= rank and n:
+                return min(BIN_EDGES[k + 1], self.max)
+        return self.max
+
+    def summary(self):
+        return OrderedDict([
+            ('count', self.count),
+            ('total_s', self.total),
+            ('mean_us', self.total / self.count * 1e6 if self.count else 0.0),
+            ('p50_us', self.percentile(0.5) * 1e6),
+            ('p90_us', self.percentile(0.9) * 1e6),
+            ('p99_us', self.percentile(0.99) * 1e6),
+            ('max_us', self.max * 1e6),
+        ])
+
+
+class PhaseTimer():
+    """ 段階ごとの時間とカウンタ """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.counters = OrderedDict()
+        self.wrapped = set()
+        self.start = time.perf_counter()
+
+    def add(self, name, dt):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase()
+        phase.add(dt)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def wrap(self, obj, method, name=None):
+        """ obj.methodを、呼び出しごとに時間を計る関数にインスタンス単位で差し替える（同じものは１度だけ） """
+        if (id(obj), method) in self.wrapped:
+            return
+        self.wrapped.add((id(obj), method))
+        func = getattr(obj, method)
+        name = name or method
+        add = self.add
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            t = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add(name, clock() - t)
+        setattr(obj, method, timed)
+
+    def reset(self):
+        self.phases.clear()
+        self.counters.clear()
+        self.start = time.perf_counter()
+
+    def summary(self):
+        return OrderedDict((name, p.summary()) for name, p in self.phases.items())
+
+    def report(self):
+        """ 表示用の文字列 """
+        elapsed = time.perf_counter() - self.start
+        lines = ['{:22s} {:>9s} {:>8s} {:>6s} {:>10s} {:>10s} {:>10s}'.format(
+            'phase', 'count', 'total_s', '%', 'mean_us', 'p90_us', 'max_us')]
+        for name, s in self.summary().items():
+            lines.append('{:22s} {:9d} {:8.2f} {:6.1f} {:10.1f} {:10.1f} {:10.1f}'.format(
+                name, s['count'], s['total_s'], 100 * s['total_s'] / elapsed,
+                s['mean_us'], s['p90_us'], s['max_us']))
+        if self.counters:
+            lines.append('counters: ' + ', '.join('{} {}'.format(k, v) for k, v in self.counters.items()))
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return OrderedDict([
+            ('elapsed_s', time.perf_counter() - self.start),
+            ('phases', OrderedDict((name, dict(p.summary(), hist=p.hist)) for name, p in self.phases.items())),
+            ('hist_edges_s', BIN_EDGES),
+            ('counters', self.counters),
+        ])
+
+    def dump(self, prefix):
+        """ prefix.json（ヒストグラム込み）と prefix.csv（段階ごとの集計とカウンタ）に書き出す """
+        with open(prefix + '.json', 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        with open(prefix + '.csv', 'w') as f:
+            writer = csv.writer(f)
+            fields = ['count', 'total_s', 'mean_us', 'p50_us', 'p90_us', 'p99_us', 'max_us']
+            writer.writerow(['kind', 'name'] + fields)
+            for name, s in self.summary().items():
+                writer.writerow(['phase', name] + [s[k] for k in fields])
+            for name, n in self.counters.items():
+                writer.writerow(['counter', name, n] + [''] * (len(fields) - 1))
+
+
+def instrument_agent(timer, agent):
+    """ chainerrlのDQNエージェントの各段階を計測する
+
+    act_and_train / stop_episode_and_train: 行動選択（順伝播）と学習の全体
+    replay_sample: Replay Bufferからのミニバッチのサンプリング
+    update: ミニバッチでの損失計算・逆伝播・optimizerの更新
+    optimizer: optimizerの更新（updateの内側）
+    target_sync: target networkの同期
+    """
+    timer.wrap(agent, 'act_and_train')
+    timer.wrap(agent, 'stop_episode_and_train')
+    timer.wrap(agent, 'sync_target_network', 'target_sync')
+    timer.wrap(agent.replay_buffer, 'sample', 'replay_sample')
+    timer.wrap(agent.replay_updater, 'update_func', 'update')
+    timer.wrap(agent.optimizer, 'update', 'optimizer')
@@ -0,0 +1,154 @@
+# -*- coding:utf-8 -*-
+""" 対戦用の常駐モデルプール
+
+難易度（level 1〜10 → agent_{black,white}_{level*2000}）ごとのQ関数を一度だけ読み込んでLRUで持ち、
+(盤面, 手番, 難易度) ごとのQ値もキャッシュして、着手の問い合わせにすぐ答える。
+関数（PlayService.best_move）でも、ローカルのソケット（１行１JSON）でも使える。
+
+python play_service.py [--port 5000]       # 全ての難易度を読み込んで待ち受ける
+
+リクエスト: {"board": [0, 0, 1, ...], "turn": 1, "level": 5}
+レスポンス: {"move": [i, j]}（置く場所がなければ {"move": null}）、不正なリクエストには {"error": "..."}
+
+チェックポイントに numpy_qfunction.py export で書き出した qfunction.npz があれば、
+chainerを読み込まずにNumPyだけで推論する。
+"""
+from __future__ import print_function
+import argparse
+import json
+import os
+import socket
+import threading
+from collections import OrderedDict
+import numpy as np
+from numpy_qfunction import NumpyQFunction, load_model
+from reversi import Board, MoveCache, SIZE, BLACK, WHITE
+
+LEVELS = range(1, 11)   # 難易度
+
+
+def checkpoint_path(color, level):
+    """ 難易度levelでcolorを打つエージェントの保存先（main_playと同じ命名） """
+    return 'agent_{}_{}'.format('black' if color == BLACK else 'white', level * 2000)
+
+
+class ModelPool():
+    """ (色, 難易度) -> Q関数 のLRUプール """
+
+    def __init__(self, capacity=2 * len(LEVELS), loader=load_model):
+        self.capacity = capacity
+        self.loader = loader
+        self.models = OrderedDict()
+
+    def get(self, color, level):
+        key = (color, level)
+        if key in self.models:
+            self.models.move_to_end(key)
+        else:
+            self.models[key] = self.loader(checkpoint_path(color, level))
+            if len(self.models) > self.capacity:
+                self.models.popitem(last=False)
+        return self.models[key]
+
+    def warm(self, levels=LEVELS):
+        """ 保存されている全ての難易度を先に読み込んでおく """
+        for level in levels:
+            for color in (BLACK, WHITE):
+                if os.path.exists(checkpoint_path(color, level)):
+                    self.get(color, level)
+
+
+class PlayService():
+    """ 着手の問い合わせに答えるサービス """
+
+    def __init__(self, pool=None, cache_size=100000, warm=False):
+        self.pool = pool or ModelPool()
+        self.q_cache = MoveCache(cache_size)    # (盤面, 手番, 難易度) -> Q値
+        self.board = Board()    # 合法手を求めるための作業用ボード
+        self.lock = threading.Lock()    # chainerとボードはスレッドセーフではないので排他する
+        if warm:
+            self.pool.warm()
+
+    def q_values(self, cells, turn, level):
+        key = (cells.tobytes(), turn, level)
+        q = self.q_cache.get(key)
+        if q is None:
+            q_func = self.pool.get(turn, level)
+            if isinstance(q_func, NumpyQFunction):
+                q = q_func(cells.reshape(1, -1))[0]
+            else:
+                import chainer
+                with chainer.no_backprop_mode(), chainer.using_config('train', False):
+                    q = chainer.cuda.to_cpu(q_func(cells.reshape(1, -1)).q_values.data)[0]
+            self.q_cache.put(key, q)
+        return q
+
+    def best_move(self, cells, turn, level):
+        """ 盤面cells（SIZE*SIZEの0/1/2）で手番turnが置く場所 (i, j)。置く場所がなければNone """
+        cells = np.asarray(cells, dtype=np.float32).reshape(SIZE, SIZE)
+        with self.lock:
+            self.board.board = cells
+            self.board.turn = turn
+            legal = self.board.legal_moves()
+            if not legal:
+                return None
+            q = self.q_values(cells, turn, level)
+        return max(legal, key=lambda pos: q[pos[0] * SIZE + pos[1]])
+
+    def player(self, level):
+        """ main_play用。boardを受け取って置く場所を返すオブジェクト """
+        service = self
+
+        class Player():
+            def act(self, board):
+                return service.best_move(board.board, board.turn, level)
+        return Player()
+
+    def handle(self, line):
+        request = json.loads(line)
+        move = self.best_move(request['board'], request['turn'], request['level'])
+        return json.dumps({'move': None if move is None else list(move)})
+
+    def serve(self, host='127.0.0.1', port=5000):
+        """ ローカルのソケットで待ち受ける（１接続１スレッド、１行１リクエスト） """
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(128)
+        print('listening on {}:{}'.format(host, port))
+
+        def client(conn):
+            with conn, conn.makefile('r') as reader:
+                for line in reader:
+                    try:
+                        response = self.handle(line)
+                    except Exception as e:  # 不正なリクエストでも接続は切らない
+                        response = json.dumps({'error': str(e)})
+                    conn.sendall((response + '\n').encode('utf-8'))
+
+        while True:
+            conn, _ = server.accept()
+            t = threading.Thread(target=client, args=(conn,))
+            t.daemon = True
+            t.start()
+
+
+def request_move(board, turn, level, host='127.0.0.1', port=5000):
+    """ ソケット版のクライアント。サーバーがエラーを返したらValueError """
+    with socket.create_connection((host, port)) as conn:
+        request = {'board': [int(c) for c in np.reshape(board, (-1,))], 'turn': int(turn), 'level': int(level)}
+        conn.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with conn.makefile('r') as reader:
+            reply = json.loads(reader.readline())
+    if 'error' in reply:    # 難易度や盤面が不正
+        raise ValueError('サーバーがエラーを返しました: {}'.format(reply['error']))
+    move = reply['move']
+    return None if move is None else tuple(move)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    PlayService(warm=True).serve(args.host, args.port)
@@ -0,0 +1,221 @@
+# -*- coding:utf-8 -*-
+""" Sum-treeによる優先度付きReplay Buffer
+
+TD誤差の大きい遷移ほど多くサンプリングする（Prioritized Experience Replay）。
+優先度は配列で持つ完全二分木（sum-tree）に入れるので、追加・優先度の更新・
+バッチでのサンプリングはどれもO(log n)で、木の段ごとにNumPyでまとめて処理する。
+重要度サンプリングの重みもmin-treeから求める。
+
+chainerrlのDQNは、sampleが返す遷移に 'weight' があれば損失に重みを掛け、
+TD誤差を update_errors() で返してくるので、DQNの replay_buffer にそのまま渡せる。
+
+python prioritized_replay_buffer.py                   # サンプリングのコストを一様なReplayBufferと比べる
+python prioritized_replay_buffer.py --train 2000      # main()を一様・優先度付きで学習してランダム相手の勝ち数を比べる
+"""
+from __future__ import print_function
+import argparse
+import pickle
+import time
+import numpy as np
+from packed_replay_buffer import nested_samples
+
+
+class SumTree():
+    """ 葉に優先度を持ち、内部ノードに子の合計（と最小値）を持つ配列の二分木 """
+
+    def __init__(self, capacity):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.sum = np.zeros(2 * self.size, dtype=np.float64)
+        self.min = np.full(2 * self.size, np.inf, dtype=np.float64)
+
+    def total(self):
+        return self.sum[1]
+
+    def minimum(self):
+        return self.min[1]
+
+    def leaves(self):
+        return self.sum[self.size:]
+
+    def set(self, index, priority):
+        """ 葉１つの優先度の更新（追加のたびに呼ぶのでNumPyの配列演算を使わずに根までたどる） """
+        node = index + self.size
+        total, low = self.sum, self.min
+        total[node] = low[node] = priority
+        node //= 2
+        while node:
+            left, right = 2 * node, 2 * node + 1
+            total[node] = total[left] + total[right]
+            low[node] = min(low[left], low[right])
+            node //= 2
+
+    def update(self, index, priority):
+        """ 葉index（配列可）の優先度をpriorityにして、根までの合計と最小値を更新する """
+        node = np.asarray(index, dtype=np.int64) + self.size
+        self.sum[node] = priority
+        self.min[node] = priority
+        for _ in range(self.size.bit_length() - 1):    # 木の段ごとにまとめて親を更新する
+            node = node // 2    # 同じ親が重複しても同じ値を書くだけなので、そのままでよい
+            self.sum[node] = self.sum[2 * node] + self.sum[2 * node + 1]
+            self.min[node] = np.minimum(self.min[2 * node], self.min[2 * node + 1])
+
+    def find(self, value):
+        """ 累積和がvalue（配列）を超える葉の番号 """
+        value = np.array(value, dtype=np.float64)
+        node = np.ones(len(value), dtype=np.int64)
+        while node[0] < self.size:
+            left = self.sum[2 * node]
+            right = value >= left
+            value -= left * right
+            node = 2 * node + right
+        return node - self.size
+
+
+class PrioritizedReplayBuffer():
+    """ 優先度付きReplay Buffer（chainerrlのReplayBufferと同じAPI）
+
+    alpha: 優先度の強さ（0で一様）、beta0: 重要度サンプリングの補正の初期値（betastepsで1まで上げる）、
+    eps: TD誤差が0でもサンプリングされるように足す値
+    """
+
+    def __init__(self, capacity=10 ** 6, alpha=0.6, beta0=0.4, betasteps=2e5, eps=0.01,
+                 nested=None, seed=None):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.beta = beta0
+        self.beta_add = (1.0 - beta0) / betasteps
+        self.eps = eps
+        self.nested = nested_samples() if nested is None else nested
+        self.rng = np.random.RandomState(seed)
+        self.tree = SumTree(capacity)
+        self.memory = []
+        self.pos = 0    # 次の書き込み位置
+        self.max_priority = 1.0     # 新しい遷移は最大の優先度で入れて、少なくとも１度は使われるようにする
+        self.sampled = None     # 直前にサンプリングした位置（update_errors用）
+
+    def __len__(self):
+        return len(self.memory)
+
+    def append(self, state, action, reward, next_state=None, next_action=None,
+               is_state_terminal=False, **kwargs):
+        experience = dict(state=state, action=action, reward=reward, next_state=next_state,
+                          next_action=next_action, is_state_terminal=is_state_terminal, **kwargs)
+        if len(self.memory) < self.capacity:
+            self.memory.append(experience)
+        else:
+            self.memory[self.pos] = experience  # 満杯になったら古いものから上書き
+        self.tree.set(self.pos, self.max_priority)
+        self.pos = (self.pos + 1) % self.capacity
+
+    def sample_indices(self, n):
+        """ 合計をn等分した区間から１つずつ、優先度に比例して選ぶ（層化サンプリング） """
+        total = self.tree.total()
+        value = (np.arange(n) + self.rng.uniform(size=n)) * (total / n)
+        index = self.tree.find(np.minimum(value, total * (1 - 1e-12)))
+        return np.minimum(index, len(self.memory) - 1)
+
+    def sample(self, n):
+        index = self.sample_indices(n)
+        # 重要度サンプリングの重み (N * P(i))^-beta を最大値で割ったもの
+        prob = self.tree.leaves()[index] / self.tree.total()
+        min_prob = self.tree.minimum() / self.tree.total()
+        weight = (prob / min_prob) ** -self.beta
+        self.beta = min(1.0, self.beta + self.beta_add)
+        self.sampled = index
+        experiences = []
+        for i, w in zip(index.tolist(), weight.tolist()):
+            exp = dict(self.memory[i], weight=w)
+            experiences.append([exp] if self.nested else exp)
+        return experiences
+
+    def update_errors(self, errors):
+        """ 直前にsampleした遷移の優先度をTD誤差から更新する """
+        priority = (np.abs(np.asarray(errors, dtype=np.float64)) + self.eps) ** self.alpha
+        self.tree.update(self.sampled, priority)
+        self.max_priority = max(self.max_priority, float(priority.max()))
+
+    def stop_current_episode(self, *args, **kwargs):
+        pass    # 遷移ごとに保存しているので何もしない
+
+    def snapshot(self):
+        """ 保存用に今の中身をコピーする（遷移のdictは書き換えないので参照のコピーで十分） """
+        return {'memory': list(self.memory), 'priority': self.tree.leaves()[:len(self.memory)].copy(),
+                'pos': self.pos, 'max_priority': self.max_priority, 'beta': self.beta}
+
+    def save(self, filename, snapshot=None):
+        with open(filename, 'wb') as f:
+            pickle.dump(snapshot or self.snapshot(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, filename):
+        with open(filename, 'rb') as f:
+            data = pickle.load(f)
+        self.memory = data['memory']
+        self.tree = SumTree(self.capacity)
+        if self.memory:
+            self.tree.update(np.arange(len(self.memory)), data['priority'])
+        self.pos, self.max_priority, self.beta = data['pos'], data['max_priority'], data['beta']
+
+
+def sampling_cost(sizes=(10 ** 4, 10 ** 5, 10 ** 6), batch=128, n_iter=200, seed=0):
+    """ バッチ１回のサンプリング（と優先度の更新）にかかる時間を、一様なサンプリングと比べる """
+    rng = np.random.RandomState(seed)
+    results = []
+    for size in sizes:
+        buf = PrioritizedReplayBuffer(size, nested=False, seed=seed)
+        state = np.zeros(16, dtype=np.float32)
+        for k in range(size):
+            buf.append(state, k % 16, 0.0, state)
+        try:
+            import chainerrl
+            uniform = chainerrl.replay_buffers.ReplayBuffer(capacity=size)
+            for k in range(size):
+                uniform.append(state=state, action=k % 16, reward=0.0, next_state=state)
+            uniform_sample, name = uniform.sample, 'ReplayBuffer'
+        except ImportError:     # chainerrlがなければ、同じ遷移のリストから一様に選ぶ処理と比べる
+            uniform_sample = lambda n: [buf.memory[i] for i in rng.randint(0, size, n)]
+            name = 'uniform'
+        start = time.perf_counter()
+        for _ in range(n_iter):
+            uniform_sample(batch)
+        t_uniform = (time.perf_counter() - start) / n_iter
+        start = time.perf_counter()
+        for _ in range(n_iter):
+            buf.sample(batch)
+            buf.update_errors(rng.standard_normal(batch))
+        t_prioritized = (time.perf_counter() - start) / n_iter
+        results.append((size, name, t_uniform, t_prioritized))
+    return results
+
+
+def terminal_rate(buf, n_batches=100, batch=128):
+    """ サンプリングした遷移のうち終局（勝ち負けの報酬が付く）遷移の割合 """
+    hits = 0
+    for _ in range(n_batches):
+        for e in buf.sample(batch):
+            hits += bool((e[0] if isinstance(e, list) else e)['is_state_terminal'])
+    return hits / float(n_batches * batch)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--train', type=int, default=0, help='学習して比べるエピソード数（chainerが必要）')
+    parser.add_argument('--games', type=int, default=100, help='評価の対局数')
+    args = parser.parse_args()
+    for size, name, t_uniform, t_prioritized in sampling_cost():
+        print('{:8d} 遷移: {} {:.1f} us/batch, PrioritizedReplayBuffer {:.1f} us/batch（優先度の更新込み）'.format(
+            size, name, t_uniform * 1e6, t_prioritized * 1e6))
+    if args.train:
+        from alphabeta import evaluate, random_move
+        from reversi import BLACK, WHITE
+        from train_reversi_DNN import main, greedy_move
+        for prioritized in (False, True):
+            start = time.perf_counter()
+            stats = main(n_episodes=args.train, prioritized=prioritized)
+            minutes = (time.perf_counter() - start) / 60
+            move = lambda board, q=stats['q_func']: greedy_move(q, board)
+            win_b = evaluate(move, BLACK, random_move, args.games)[0]
+            win_w = evaluate(move, WHITE, random_move, args.games)[0]
+            print('prioritized={!s:5}: 学習 {:.1f} 分, 黒 {} 勝, 白 {} 勝（各{}局）, 終局遷移のサンプリング率 {:.3f}'.format(
+                prioritized, minutes, win_b, win_w, args.games, terminal_rate(stats['replay_buffer'])))
@@ -0,0 +1,300 @@
+# -*- coding:utf-8 -*-
+""" リバーシのルール（盤面・合法手・表示）
+
+NumPyしか使わないので、ルールだけが必要なツールやワーカープロセスは
+chainer/chainerrl を読み込まずにこのモジュールだけをimportすればよい。
+学習（Q関数・DQN）は train_reversi_DNN にある。
+"""
+from __future__ import print_function
+import numpy as np
+import random
+import itertools
+from collections import OrderedDict
+
+# 定数定義 #
+SIZE = 4    # ボードサイズ SIZE*SIZE
+NONE = 0    # ボードのある座標にある石：なし
+BLACK = 1   # ボードのある座標にある石：黒
+WHITE = 2   # ボードのある座標にある石：しろ
+STONE = [' ', '●', '○']    # 石の表示用
+ROWLABEL = {chr(ord('a') + x): x + 1 for x in range(8)}  # ボードの横軸ラベル
+N2L = [''] + [chr(ord('a') + x) for x in range(8)]
+REWARD_WIN = 1      # 買った時の報酬
+REWARD_LOSE = -1    # 負けた時の報酬
+ILLEGAL_Q = -1e9    # 置けない場所に付けるQ値（合法手マスク用）
+# ２次元のボード上での隣接８方向の定義
+DIR = tuple(itertools.product(range(-1, 2), range(-1, 2)))
+_RAY_TABLES = {}    # ボードサイズごとのレイ表
+
+
+def ray_table(size):
+    """ 各マス(i,j)から８方向へ伸びる盤面内の座標列。table[i][j] は方向ごとのタプルのタプル """
+    if size not in _RAY_TABLES:
+        table = []
+        for i in range(size):
+            row = []
+            for j in range(size):
+                rays = []
+                for di, dj in DIR:
+                    if di == 0 and dj == 0:
+                        continue
+                    ray = []
+                    y, x = i + di, j + dj
+                    while 0 <= y < size and 0 <= x < size:
+                        ray.append((y, x))
+                        y += di
+                        x += dj
+                    if len(ray) >= 2:   # 挟むには最低２マス必要
+                        rays.append(tuple(ray))
+                row.append(tuple(rays))
+            table.append(tuple(row))
+        _RAY_TABLES[size] = tuple(table)
+    return _RAY_TABLES[size]
+
+
+class MoveCache():
+    """ (盤面, 手番) -> {置ける場所: ひっくり返る石} の上限付きLRUキャッシュ """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0   # キャッシュヒット数
+        self.misses = 0  # キャッシュミス数
+
+    def get(self, key):
+        moves = self.data.get(key)
+        if moves is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.data.move_to_end(key)
+        return moves
+
+    def put(self, key, moves):
+        self.data[key] = moves
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)   # 最も古く使われたものを捨てる
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        total = self.hits + self.misses
+        return 'hits {}, misses {}, hit rate {:.3f}, size {}'.format(
+            self.hits, self.misses, self.hits / total if total else 0.0, len(self.data))
+
+
+MOVE_CACHE = MoveCache()    # 全てのBoardで共有する合法手キャッシュ
+_ZOBRIST_TABLES = {}    # ボードサイズごとのZobrist乱数表
+
+
+def zobrist_table(size):
+    """ Zobristハッシュ用の64bit乱数表 (cells, turn_key)。cells[p][color] はマスpにcolorの石がある時の値 """
+    if size not in _ZOBRIST_TABLES:
+        rng = random.Random(size)   # サイズごとに固定の乱数列
+        cells = tuple((0, rng.getrandbits(64), rng.getrandbits(64)) for _ in range(size * size))
+        _ZOBRIST_TABLES[size] = (cells, rng.getrandbits(64))
+    return _ZOBRIST_TABLES[size]
+
+
+def masked_observation(board):
+    """ MaskedQFunction用の入力。１次元の盤面の後ろに手番の合法手マスクを連結する """
+    mask = np.zeros(SIZE * SIZE, dtype=np.float32)
+    for i, j in board.available_pos:
+        mask[i * SIZE + j] = 1
+    return np.concatenate((np.reshape(board.board, (-1,)), mask))
+
+
+class Board():
+    """ リバーシボードクラス """
+    # インスタンス（最初はボードの初期化）
+
+    def __init__(self):
+        self.board_reset()
+
+    # ボードの初期化
+    def board_reset(self):
+        # 全ての石をクリア。ボードは２次元配列(i,j)で定義する
+        self.board = np.zeros((SIZE, SIZE), dtype=np.float32)
+        mid = SIZE // 2  # 真ん中の基準ポジション
+        # 初期４つの石を配置
+        self.board[mid, mid] = WHITE
+        self.board[mid - 1, mid - 1] = WHITE
+        self.board[mid - 1, mid] = BLACK
+        self.board[mid, mid - 1] = BLACK
+        self.winner = NONE  # 勝者
+        self.turn = BLACK   # 黒石スタート
+        self.game_end = False   # ゲーム終了チェックフラグ
+        self.pss = 0    # パスチェック用フラグ。双方がパスをするとゲーム終了
+        self.nofb = 0   # ボード上の黒石の数
+        self.nofw = 0   # ボード上の白石の数
+        self.undo_stack = []    # make_moveで指した手の取り消し用スタック
+        self.hash = self.compute_hash()  # 盤面と手番のZobristハッシュ。着手ごとに差分更新する
+        self.available_pos = self.search_positions()    # self.turnの石が置ける場所のリスト
+
+    # Zobristハッシュを盤面から計算し直す
+    def compute_hash(self):
+        cells, turn_key = zobrist_table(SIZE)
+        h = turn_key if self.turn == WHITE else 0
+        for p, c in enumerate(self.board.reshape(-1).tolist()):
+            h ^= cells[p][int(c)]
+        return h
+
+    # posにself.turnの石を置き、flipsを裏返したときのハッシュの差分更新
+    def _update_hash(self, pos, flips):
+        cells = zobrist_table(SIZE)[0]
+        opp = BLACK if self.turn == WHITE else WHITE
+        h = self.hash ^ cells[pos[0] * SIZE + pos[1]][self.turn]
+        for i, j in flips:
+            h ^= cells[i * SIZE + j][opp] ^ cells[i * SIZE + j][self.turn]
+        self.hash = h
+
+    # 石を置く＆リバース処理
+    def put_stone(self, pos):
+        flips = self.legal_moves().get((int(pos[0]), int(pos[1])))
+        if flips:
+            self._update_hash(pos, flips)
+            self.board[pos[0], pos[1]] = self.turn
+            for i, j in flips:  # リバース
+                self.board[i, j] = self.turn
+            return True
+        else:
+            return False
+
+    # ターンチェンジ
+    def change_turn(self):
+        self.turn = WHITE if self.turn == BLACK else BLACK
+        self.hash ^= zobrist_table(SIZE)[1]
+        self.available_pos = self.search_positions()    # 石が置ける場所を探索しておく
+
+    # ランダムに石を置く場所を決める　（ε-greedy用）
+    def random_action(self):
+        if len(self.available_pos) > 0:
+            pos = random.choice(self.available_pos)  # 置く場所をランダムに決める
+            pos = pos[0] * SIZE + pos[1]    # １次元座標に変換（NNの教師データは１次元でないといけない）
+            return pos
+        return False    # 置く場所なし
+
+    # エージェントの行動と勝敗判定。置けない場所に置いたら負けとする
+    def agent_action(self, pos):
+        self.put_stone(pos)
+        self.end_check()    # 石が置けたら、ゲーム終了をチェック
+
+    # リバース処理（posには既に自分の石が置かれている）
+    def do_reverse(self, pos):
+        flips = self.get_flips(pos)
+        cells = zobrist_table(SIZE)[0]
+        opp = BLACK if self.turn == WHITE else WHITE
+        for i, j in flips:
+            self.board[i, j] = self.turn  # 自分の石にひっくり返す
+            self.hash ^= cells[i * SIZE + j][opp] ^ cells[i * SIZE + j][self.turn]
+
+    # posに置いたときにひっくり返る石の座標リスト。盤面はコピーしない
+    def get_flips(self, pos):
+        opp = BLACK if self.turn == WHITE else WHITE    # 対戦相手の石
+        board = self.board
+        flips = []
+        for ray in ray_table(SIZE)[pos[0]][pos[1]]:
+            for k, (i, j) in enumerate(ray):
+                if board[i, j] != opp:
+                    # 自分と同じ色の石が来れば挟んでいるのでリバース確定
+                    if k > 0 and board[i, j] == self.turn:
+                        flips.extend(ray[:k])
+                    break
+        return flips
+
+    # 置ける場所とひっくり返る石の辞書 {(i,j): ((i,j), ...)}。(盤面, 手番)ごとにキャッシュする
+    # 返り値はキャッシュと共有しているので書き換えないこと
+    def legal_moves(self):
+        key = (self.board.tobytes(), self.turn)
+        moves = MOVE_CACHE.get(key)
+        if moves is None:
+            moves = OrderedDict()   # 行優先の順序を保つ
+            emp = np.where(self.board == NONE)  # 石が置かれていない場所を取得
+            for i, j in zip(emp[0].tolist(), emp[1].tolist()):
+                flips = self.get_flips((i, j))
+                if flips:
+                    moves[(i, j)] = tuple(flips)
+            MOVE_CACHE.put(key, moves)
+        return moves
+
+    # 探索用の着手。posに石を置いて手番を交代し、取り消し用のトークンを返す
+    # pos=Noneでパス。posは置ける場所であること。available_posやgame_endは更新しない
+    def make_move(self, pos):
+        flips = [] if pos is None else self.legal_moves()[(int(pos[0]), int(pos[1]))]
+        token = (pos, flips, self.turn, self.pss, self.hash)
+        if pos is not None:
+            self._update_hash(pos, flips)
+            self.board[pos[0], pos[1]] = self.turn
+            for i, j in flips:
+                self.board[i, j] = self.turn
+        self.pss = self.pss + 1 if pos is None else 0
+        self.turn = WHITE if self.turn == BLACK else BLACK
+        self.hash ^= zobrist_table(SIZE)[1]
+        self.undo_stack.append(token)
+        return token
+
+    # make_moveの取り消し。最後に指した手から順に戻す
+    def unmake_move(self, token):
+        assert self.undo_stack and self.undo_stack[-1] is token, '最後の手から順に戻してください'
+        self.undo_stack.pop()
+        pos, flips, turn, pss, self.hash = token
+        if pos is not None:
+            opp = BLACK if turn == WHITE else WHITE
+            self.board[pos[0], pos[1]] = NONE
+            for i, j in flips:
+                self.board[i, j] = opp
+        self.turn = turn
+        self.pss = pss
+
+    # 石が置ける場所をリストアップする。石が置ける場所がなければ「パス」となる
+    def search_positions(self):
+        return list(self.legal_moves())
+
+    # 石が置けるかをチェックする
+    def is_available(self, pos):
+        if self.board[pos[0], pos[1]] != NONE:  # すでに石が置いてあれば、置けない
+            return False
+        return (int(pos[0]), int(pos[1])) in self.legal_moves()
+
+    # ゲーム終了チェック
+    def end_check(self):
+        # ボードに全て石が埋まるか、双方がパスしたら
+        if np.count_nonzero(self.board) == SIZE * SIZE or self.pss == 2:
+            self.game_end = True
+            self.nofb = len(np.where(self.board == BLACK)[0])
+            self.nofw = len(np.where(self.board == WHITE)[0])
+            self.winner = BLACK if len(np.where(self.board == BLACK)[0]) > len(
+                np.where(self.board == WHITE)[0]) else WHITE
+
+    # ボード表示
+    def show_board(self):
+        print('  ', end='')
+        for i in range(1, SIZE + 1):
+            print(' {}'.format(N2L[i]), end='')  # 横軸ラベル表示
+        print('')
+        for i in range(0, SIZE):
+            print('{0:2d} '.format(i+1), end='')
+            for j in range(0, SIZE):
+                print('{} '.format(STONE[int(self.board[i][j])]), end='')
+            print('')
+
+# キーボードから入力した座標を２次元配列に対応するよう変換する
+
+
+def convert_coordinate(pos):
+    pos = pos.split(' ')
+    i = int(pos[0]) - 1
+    j = int(ROWLABEL[pos[1]]) - 1
+    return (i, j)   # タプルで返す。iが縦、jが横
+
+
+def judge(board, a, you):
+    if board.winner == a:
+        print('Game over. You lose!')
+    elif board.winner == you:
+        print('Game over You win!')
+    else:
+        print('Game over. Draw.')
@@ -0,0 +1,196 @@
+# -*- coding:utf-8 -*-
+""" 4x4リバーシの完全解析と完全読みテーブル
+
+初期局面から到達できる全局面（盤面と手番）をnegamaxで解き、
+各局面の最終石差（手番側から見た値）と最善手をディスク上のテーブルに書き出す。
+テーブルはオープンアドレス法のハッシュ表（.npy）で、読み込み時はメモリマップするので
+１局面の参照はO(1)で済む。
+
+python solver.py                              # 解析してテーブルを書き出す
+python solver.py agent_black_20000 ...        # 保存したエージェントの最善手率を調べる
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import numpy as np
+from bitboard import BitBoard, popcount
+from reversi import BLACK, WHITE
+
+SOLVE_SIZE = 4  # 完全解析するボードサイズ
+TABLE_FILE = 'reversi4x4_table.npy'
+TABLE_DTYPE = np.dtype([('key', '<u8'),     # 局面のキー（0は空き）
+                        ('value', 'i1'),    # 最善を尽くした時の最終石差（手番側から見た値）
+                        ('best', '<u2'),    # 石差が最大になる手のビットマスク
+                        ('keep', '<u2')])   # 勝ち・引き分け・負けの結果を保つ手のビットマスク
+HASH_MULT = 0x9E3779B97F4A7C15  # ハッシュ用の乗数（黄金比）
+MASK64 = (1 << 64) - 1
+
+
+def position_key(black, white, turn):
+    """ 黒・白のビットマスクと手番から局面のキーを作る（0は空き表示に使うので+1する） """
+    return (black | (white << 16) | ((turn - 1) << 32)) + 1
+
+
+def slot(key, bits):
+    return ((key * HASH_MULT) & MASK64) >> (64 - bits)
+
+
+def sign(x):
+    return (x > 0) - (x < 0)
+
+
+def solve():
+    """ 全局面を解いて {キー: (値, 最善手マスク, 結果を保つ手のマスク)} を返す """
+    sys.setrecursionlimit(10000)
+    board = BitBoard(SOLVE_SIZE)
+    memo = {}
+
+    def negamax(passed):
+        key = position_key(board.bb[BLACK], board.bb[WHITE], board.turn)
+        if key in memo:
+            return memo[key][0]
+        moves = board.legal_moves()
+        if not moves:
+            if passed:  # 双方とも置けなければ終局
+                value = popcount(board.bb[board.turn]) - popcount(board.bb[BLACK + WHITE - board.turn])
+            else:
+                token = board.make_move(None)   # パス
+                value = -negamax(True)
+                board.unmake_move(token)
+            memo[key] = (value, 0, 0)
+            return value
+        children = []
+        for pos in board.search_positions():
+            token = board.make_move(pos)
+            children.append((pos[0] * SOLVE_SIZE + pos[1], -negamax(False)))
+            board.unmake_move(token)
+        value = max(v for _, v in children)
+        best = sum(1 << p for p, v in children if v == value)
+        keep = sum(1 << p for p, v in children if sign(v) == sign(value))
+        memo[key] = (value, best, keep)
+        return value
+
+    negamax(False)
+    return memo
+
+
+def write_table(memo, filename=TABLE_FILE):
+    """ 解析結果を負荷率1/2以下のオープンアドレス法のハッシュ表にして書き出す """
+    bits = max(1, (2 * len(memo) - 1).bit_length())
+    table = np.lib.format.open_memmap(filename, mode='w+', dtype=TABLE_DTYPE, shape=(1 << bits,))
+    keys = np.zeros(1 << bits, dtype=np.uint64)
+    mask = (1 << bits) - 1
+    for key, (value, best, keep) in memo.items():
+        idx = slot(key, bits)
+        while keys[idx]:    # 線形探索で空きを探す
+            idx = (idx + 1) & mask
+        keys[idx] = key
+        table[idx] = (key, value, best, keep)
+    table.flush()
+    return filename
+
+
+class PerfectTable():
+    """ メモリマップした完全読みテーブル """
+
+    def __init__(self, filename=TABLE_FILE):
+        self.table = np.load(filename, mmap_mode='r')
+        self.bits = len(self.table).bit_length() - 1
+        self.mask = len(self.table) - 1
+        self.weights = 1 << np.arange(SOLVE_SIZE * SOLVE_SIZE, dtype=np.int64)
+
+    def lookup_key(self, key):
+        idx = slot(key, self.bits)
+        while True:
+            entry = self.table[idx]
+            if entry['key'] == key:
+                return int(entry['value']), int(entry['best']), int(entry['keep'])
+            if entry['key'] == 0:
+                raise KeyError('到達できない局面です')
+            idx = (idx + 1) & self.mask
+
+    def board_key(self, board):
+        cells = np.reshape(board.board, (-1,))
+        return position_key(int(self.weights[cells == BLACK].sum()),
+                            int(self.weights[cells == WHITE].sum()), board.turn)
+
+    def lookup(self, board):
+        """ Board（またはBitBoard）の局面の (値, 最善手マスク, 結果を保つ手のマスク) """
+        return self.lookup_key(self.board_key(board))
+
+    def is_optimal(self, board, pos, strict=False):
+        """ posが最善手か。strict=Falseなら勝ち・引き分け・負けの結果を保つ手なら最善とみなす """
+        _, best, keep = self.lookup(board)
+        return bool(((best if strict else keep) >> int(pos[0] * SOLVE_SIZE + pos[1])) & 1)
+
+
+class PerfectPlayer():
+    """ 完全読みテーブルで最善手を打つプレイヤー（main_playの難易度 perfect） """
+
+    def __init__(self, table=None):
+        self.table = table or PerfectTable(load_or_build_table())
+
+    def act(self, board):
+        if not board.available_pos:
+            return None
+        best = self.table.lookup(board)[1]
+        p = (best & -best).bit_length() - 1  # 最善手のうち最初のもの
+        return divmod(p, SOLVE_SIZE)
+
+
+def load_or_build_table(filename=TABLE_FILE):
+    """ テーブルがなければ解析して作る """
+    if not os.path.exists(filename):
+        write_table(solve(), filename)
+    return filename
+
+
+def all_positions(table):
+    """ テーブルの全局面を (盤面 (N,16) float32, 手番 (N,), 最善手マスク, 結果を保つ手のマスク) で返す """
+    t = table.table
+    entries = t[t['key'] != 0]
+    entries = entries[entries['best'] != 0]    # パスするしかない局面は除く
+    keys = entries['key'].astype(np.int64) - 1
+    p = np.arange(SOLVE_SIZE * SOLVE_SIZE)
+    black = (keys[:, None] >> p) & 1
+    white = (keys[:, None] >> (p + 16)) & 1
+    boards = (black * BLACK + white * WHITE).astype(np.float32)
+    turn = ((keys >> 32) & 1) + 1
+    return boards, turn, entries['best'].astype(np.int64), entries['keep'].astype(np.int64)
+
+
+def optimal_rate(q_func, color, table, strict=False):
+    """ colorの手番の全局面で、Q関数が置ける場所のうちQ値最大の手を選んだ時に最善手である割合 """
+    import chainer
+    from batch_board import BatchBoard
+    boards, turn, best, keep = all_positions(table)
+    boards, best, keep = boards[turn == color], best[turn == color], keep[turn == color]
+    batch = BatchBoard(len(boards), SOLVE_SIZE)
+    batch.board[...] = boards.reshape(-1, SOLVE_SIZE, SOLVE_SIZE)
+    batch.turn[...] = color
+    legal = batch.legal_moves()
+    with chainer.no_backprop_mode(), chainer.using_config('train', False):
+        q = chainer.cuda.to_cpu(q_func(boards).q_values.data)
+    action = np.argmax(np.where(legal, q, -np.inf), axis=1)
+    target = best if strict else keep
+    return float(np.mean((target >> action) & 1))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 1:
+        start = time.perf_counter()
+        memo = solve()
+        write_table(memo)
+        value = memo[position_key(BitBoard(SOLVE_SIZE).bb[BLACK], BitBoard(SOLVE_SIZE).bb[WHITE], BLACK)][0]
+        print('{} 局面を {:.1f} 秒で解析しました。初期局面の値（黒から見た石差）: {}'.format(
+            len(memo), time.perf_counter() - start, value))
+        print('テーブル: {} ({} bytes)'.format(TABLE_FILE, os.path.getsize(TABLE_FILE)))
+    else:
+        from train_reversi_DNN import load_q_function
+        table = PerfectTable(load_or_build_table())
+        for path in sys.argv[1:]:
+            color = WHITE if 'white' in path else BLACK
+            q_func = load_q_function(path)
+            print('{}: 結果を保つ手の割合 {:.3f}, 石差最大の手の割合 {:.3f}'.format(
+                path, optimal_rate(q_func, color, table), optimal_rate(q_func, color, table, strict=True)))
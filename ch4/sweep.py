@@ -0,0 +1,260 @@
+# -*- coding:utf-8 -*-
+""" main()のハイパーパラメータの並列スイープ
+
+スペック（JSON）からグリッドまたはランダムに設定を作り、設定ごとに別プロセスでmain()を学習する。
+同時に動かすプロセス数はCPU数まで。各設定はeval_intervalエピソードごとにgreedyな方策で
+ランダムな相手と対戦し、直近window回の勝率の平均（rolling win rate）を記録する。
+min_episodes * eta^k エピソード（rung）に達した時点で、そのrungでの勝率がそれまでに同じrungに
+達した設定の上位 1/eta に入らなければ打ち切る（非同期のsuccessive halving）。
+結果は１つの表（sweep/results.csv）にまとめる。
+main()がコールバックを呼ぶのは100エピソードごとなので、rungとeval_intervalは100の倍数でなければならない。
+
+python sweep.py spec.json [--workers 4] [--out sweep]
+
+スペックの例:
+{"method": "grid",
+ "params": {"n_nodes": [64, 256], "gamma": [0.9, 0.99]},
+ "fixed": {"n_episodes": 8000, "masked": true}}
+
+{"method": "random", "n_samples": 16, "seed": 0,
+ "params": {"gamma": {"uniform": [0.9, 0.999]}, "decay_steps": {"loguniform": [10000, 100000]},
+            "minibatch_size": [32, 64, 128], "target_update_interval": {"randint": [100, 2000]}},
+ "fixed": {"n_episodes": 8000, "masked": true},
+ "halving": {"min_episodes": 1000, "eta": 2}, "eval": {"interval": 500, "games": 50, "window": 3}}
+"""
+from __future__ import print_function
+import argparse
+import csv
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import queue
+import random
+import sys
+import time
+import numpy as np
+
+CALLBACK_INTERVAL = 100     # main()がcallbackを呼ぶ間隔（エピソード）
+DECISION_TIMEOUT = 600      # coordinatorの返事を待つ秒数。返事がなければ打ち切る
+
+
+def grid_configs(params):
+    names = sorted(params)
+    return [dict(zip(names, values)) for values in itertools.product(*(params[n] for n in names))]
+
+
+def sample_value(spec, rng):
+    """ リストなら選択、{"uniform"|"loguniform"|"randint": [a, b]} ならその分布から１つ選ぶ """
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if not isinstance(spec, dict):
+        return spec
+    (kind, (a, b)), = spec.items()
+    if kind == 'randint':
+        return rng.randint(a, b)
+    if kind == 'uniform':
+        value = rng.uniform(a, b)
+    elif kind == 'loguniform':
+        value = 10 ** rng.uniform(math.log10(a), math.log10(b))
+    else:
+        raise ValueError('不明な分布です: {}'.format(kind))
+    return int(round(value)) if isinstance(a, int) and isinstance(b, int) else value
+
+
+def make_configs(spec):
+    if spec.get('method', 'grid') == 'grid':
+        configs = grid_configs(spec['params'])
+    else:
+        rng = random.Random(spec.get('seed', 0))
+        configs = [{n: sample_value(v, rng) for n, v in sorted(spec['params'].items())}
+                   for _ in range(spec['n_samples'])]
+    return [dict(spec.get('fixed', {}), **c) for c in configs]
+
+
+def rungs(min_episodes, eta, n_episodes):
+    """ 打ち切りを判定するエピソード数の列 """
+    r = []
+    episodes = min_episodes
+    while episodes < n_episodes:
+        r.append(episodes)
+        episodes *= eta
+    return r
+
+
+def check_intervals(settings):
+    """ main()がcallbackを呼ばないエピソードにrungや評価を置くと判定されないので、スペックの時点で弾く """
+    bad = [e for e in settings['rungs'] + [settings['eval_interval']] if e % CALLBACK_INTERVAL]
+    if bad:
+        raise ValueError('rung（min_episodes * eta^k）とeval.intervalは{}の倍数にしてください: {}'.format(
+            CALLBACK_INTERVAL, bad))
+
+
+def greedy_player(q_func, config):
+    """ 学習中のQ関数でgreedyに置くプレイヤー（masked/symmetryの設定に合わせる） """
+    if config.get('masked'):
+        from symmetry_benchmark import make_move
+        return make_move(q_func, config.get('symmetry'))
+    from train_reversi_DNN import greedy_move
+    if config.get('symmetry') != 'canonical':   # expandは元の盤面のまま学習している
+        return lambda board: greedy_move(q_func, board)
+    return canonical_greedy_move(q_func)
+
+
+def canonical_greedy_move(q_func):
+    """ symmetry='canonical'（マスクなし）で学習したQ関数で置く。盤面を正規形にしてQ値を求め、元の座標で選ぶ """
+    import chainer
+    import symmetry as sym
+    from train_reversi_DNN import SIZE, masked_observation
+
+    def move(board):
+        if not board.available_pos:
+            return None
+        obs, t = sym.canonicalize(board.board.reshape(1, -1).astype(np.float32))
+        with chainer.no_backprop_mode(), chainer.using_config('train', False):
+            q = chainer.cuda.to_cpu(q_func(obs).q_values.data)[0]
+        q_original = np.empty_like(q)   # 正規形の行動kは元の盤面の行動to_original_action(k)
+        q_original[sym.to_original_action(np.arange(SIZE * SIZE), int(t[0]))] = q
+        legal = masked_observation(board)[SIZE * SIZE:] > 0
+        return divmod(int(np.where(legal, q_original, -np.inf).argmax()), SIZE)
+    return move
+
+
+def worker(run_id, config, run_dir, settings, messages, decision):
+    """ １つの設定を学習するプロセス。rungごとにcoordinatorに勝率を送り、続けるか聞く """
+    os.chdir(run_dir)
+    sys.stdout = open('log.txt', 'w')   # main()の進捗表示はファイルに
+    from alphabeta import evaluate, random_move
+    from reversi import BLACK, WHITE
+    from train_reversi_DNN import main
+    random.seed(run_id)
+    np.random.seed(run_id)
+    history = []
+    milestones = set(settings['rungs'])
+
+    def callback(episode, q_func):
+        if episode % settings['eval_interval'] and episode not in milestones:
+            return True
+        move = greedy_player(q_func, config)
+        n = settings['eval_games']
+        win = evaluate(move, BLACK, random_move, n)[0] + evaluate(move, WHITE, random_move, n)[0]
+        history.append(win / (2.0 * n))
+        if episode not in milestones:
+            return True
+        rolling = sum(history[-settings['window']:]) / len(history[-settings['window']:])
+        messages.put(('rung', run_id, episode, rolling))
+        try:
+            return decision.get(timeout=DECISION_TIMEOUT)
+        except queue.Empty:     # coordinatorがいなくなっていれば学習を続けても結果は集められない
+            return False
+
+    start = time.perf_counter()
+    stats = main(callback=callback, **config)
+    window = history[-settings['window']:]
+    messages.put(('done', run_id, {
+        'episodes': stats['episodes'],
+        'win_rate': sum(window) / len(window) if window else None,
+        'minutes': (time.perf_counter() - start) / 60,
+    }))
+
+
+class Halving():
+    """ 非同期のsuccessive halving。rungごとにそれまでの勝率を覚えておき、上位1/etaかを判定する """
+
+    def __init__(self, eta):
+        self.eta = eta
+        self.results = {}
+
+    def keep(self, episode, rate):
+        seen = self.results.setdefault(episode, [])
+        seen.append(rate)
+        if len(seen) < self.eta:    # 比べる相手が少ないうちは続ける
+            return True
+        n_keep = max(1, len(seen) // self.eta)
+        return rate >= sorted(seen, reverse=True)[n_keep - 1]
+
+
+def run(spec, workers=None, out='sweep'):
+    configs = make_configs(spec)
+    halving = spec.get('halving', {})
+    evaluation = spec.get('eval', {})
+    n_episodes = max(c.get('n_episodes', 20000) for c in configs)
+    settings = {
+        'rungs': rungs(halving.get('min_episodes', 1000), halving.get('eta', 2), n_episodes),
+        'eval_interval': evaluation.get('interval', 500),
+        'eval_games': evaluation.get('games', 50),
+        'window': evaluation.get('window', 3),
+    }
+    check_intervals(settings)
+    scheduler = Halving(halving.get('eta', 2))
+    workers = workers or mp.cpu_count()
+    messages = mp.Queue()
+    running = {}    # run_id -> (process, decision queue)
+    results = {}
+    pending = list(enumerate(configs))
+    while pending or running:
+        while pending and len(running) < workers:   # 空いているコアで次の設定を始める
+            run_id, config = pending.pop(0)
+            run_dir = os.path.join(out, 'run_{:03d}'.format(run_id))
+            if not os.path.isdir(run_dir):
+                os.makedirs(run_dir)
+            with open(os.path.join(run_dir, 'config.json'), 'w') as f:
+                json.dump(config, f)
+            decision = mp.Queue()
+            p = mp.Process(target=worker, args=(run_id, config, run_dir, settings, messages, decision))
+            p.start()
+            running[run_id] = (p, decision)
+            results[run_id] = {'stopped_at': None}
+        try:
+            message = messages.get(timeout=10)
+        except queue.Empty:     # 異常終了したプロセスは結果なしで終わりにする
+            for run_id, (p, _) in list(running.items()):
+                if not p.is_alive():
+                    results[run_id]['error'] = 'exit code {}'.format(p.exitcode)
+                    running.pop(run_id)
+            continue
+        kind, run_id = message[:2]
+        if kind == 'rung':
+            episode, rate = message[2:]
+            keep = scheduler.keep(episode, rate)
+            if not keep:
+                results[run_id]['stopped_at'] = episode
+            print('run_{:03d}: {} エピソードで勝率 {:.3f} -> {}'.format(
+                run_id, episode, rate, '続行' if keep else '打ち切り'))
+            running[run_id][1].put(keep)
+        else:
+            results[run_id].update(message[2])
+            p, _ = running.pop(run_id)
+            p.join()
+    return write_table(configs, results, out)
+
+
+def write_table(configs, results, out):
+    names = sorted(set(itertools.chain(*configs)))
+    rows = []
+    for run_id, config in enumerate(configs):
+        r = results[run_id]
+        rows.append(['run_{:03d}'.format(run_id)] + [config.get(n, '') for n in names] +
+                    [r.get('episodes'), r['stopped_at'] or r.get('error', ''), r.get('win_rate'), r.get('minutes')])
+    rows.sort(key=lambda row: -(row[-2] if row[-2] is not None else -1))
+    header = ['run'] + names + ['episodes', 'stopped_at', 'win_rate', 'minutes']
+    with open(os.path.join(out, 'results.csv'), 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    print('\t'.join(header))
+    for row in rows:
+        print('\t'.join('{:.3f}'.format(v) if isinstance(v, float) else str(v) for v in row))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('spec', help='スイープのスペック（JSON）')
+    parser.add_argument('--workers', type=int, default=None, help='同時に動かすプロセス数（省略時はCPU数）')
+    parser.add_argument('--out', default='sweep', help='結果を書き出すディレクトリ')
+    args = parser.parse_args()
+    with open(args.spec) as f:
+        spec = json.load(f)
+    run(spec, args.workers, args.out)
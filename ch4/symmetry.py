@@ -0,0 +1,107 @@
+# -*- coding:utf-8 -*-
+""" リバーシの盤面の対称性（回転・反転の8通り）
+
+Boardと同じレイアウトの盤面（１次元に並べたもの、合法手マスクを連結したものも可）と
+行動番号（pos[0] * SIZE + pos[1]）を、8通りの変換でまとめて写す。
+
+- canonicalize: 8通りのうち辞書順で最小の盤面に揃える（Replay Bufferに入れる前の正規化）
+- expand / SymmetricReplayBuffer: １つの遷移を8通りに増やしてReplay Bufferに入れる
+"""
+from __future__ import print_function
+import numpy as np
+from reversi import SIZE
+
+N_TRANSFORMS = 8
+_TABLES = {}    # ボードサイズごとの (ACTION_MAP, INVERSE)
+
+
+def transform_boards(boards, t):
+    """ (..., size, size) の盤面に変換tを適用する。t = 反転するか * 4 + 90度回転の回数 """
+    if t >= 4:
+        boards = np.flip(boards, axis=-1)
+    return np.rot90(boards, t % 4, axes=(-2, -1))
+
+
+def tables(size=SIZE):
+    """ action_map[t][a]: 行動aを変換tで写した行動、inverse[t]: 変換tの逆変換 """
+    if size not in _TABLES:
+        grid = np.arange(size * size).reshape(size, size)
+        action_map = np.zeros((N_TRANSFORMS, size * size), dtype=np.int64)
+        for t in range(N_TRANSFORMS):
+            action_map[t][transform_boards(grid, t).reshape(-1)] = np.arange(size * size)
+        inverse = np.array([[u for u in range(N_TRANSFORMS)
+                             if np.array_equal(action_map[u][action_map[t]], np.arange(size * size))][0]
+                            for t in range(N_TRANSFORMS)])
+        _TABLES[size] = (action_map, inverse)
+    return _TABLES[size]
+
+
+def transform_obs(obs, t, size=SIZE):
+    """ (N, k*size*size) の観測（盤面、盤面＋マスクなど）を変換tで写す """
+    obs = np.asarray(obs)
+    n = len(obs)
+    planes = obs.reshape(n, -1, size, size)
+    return np.ascontiguousarray(transform_boards(planes, t)).reshape(n, -1)
+
+
+def all_transforms(obs, size=SIZE):
+    """ (8, N, D) の全ての変換後の観測 """
+    return np.stack([transform_obs(obs, t, size) for t in range(N_TRANSFORMS)])
+
+
+def canonicalize(obs, size=SIZE):
+    """ 盤面部分（先頭size*size）が辞書順で最小になる変換に揃える。(正規化した観測, 変換番号) を返す """
+    variants = all_transforms(obs, size)
+    n_cells = size * size
+    alive = np.ones(variants.shape[:2], dtype=bool)     # まだ最小の候補である変換
+    for c in range(n_cells):
+        col = np.where(alive, variants[:, :, c], np.inf)
+        alive &= col == col.min(axis=0)
+    t = np.argmax(alive, axis=0)
+    return variants[t, np.arange(len(t))], t
+
+
+def to_original_action(action, t, size=SIZE):
+    """ 変換tで正規化した盤面上の行動を、元の盤面の行動に戻す """
+    action_map, inverse = tables(size)
+    return action_map[inverse[t], action]
+
+
+def to_canonical_action(action, t, size=SIZE):
+    """ 元の盤面の行動を、変換tで正規化した盤面上の行動に写す """
+    return tables(size)[0][t, action]
+
+
+def expand(state, action, next_state, size=SIZE):
+    """ １つの遷移を8通りの (状態, 行動, 次の状態) に増やす。重複する変換は除く """
+    states = all_transforms(np.reshape(state, (1, -1)), size)[:, 0]
+    next_states = all_transforms(np.reshape(next_state, (1, -1)), size)[:, 0]
+    actions = tables(size)[0][:, action]
+    _, unique = np.unique(np.column_stack((states, actions)), axis=0, return_index=True)
+    unique.sort()
+    return states[unique], actions[unique], next_states[unique]
+
+
+class SymmetricReplayBuffer():
+    """ 遷移を8通りの対称形に増やして中のReplay Bufferに入れるラッパー """
+
+    def __init__(self, replay_buffer, size=SIZE):
+        self.replay_buffer = replay_buffer
+        self.size = size
+
+    def append(self, state, action, reward, next_state=None, next_action=None,
+               is_state_terminal=False, **kwargs):
+        if next_state is None:  # 次の状態がなければ変換できないのでそのまま入れる
+            self.replay_buffer.append(state, action, reward, next_state, next_action,
+                                      is_state_terminal, **kwargs)
+            return
+        states, actions, next_states = expand(state, action, next_state, self.size)
+        for s, a, ns in zip(states, actions, next_states):
+            self.replay_buffer.append(state=s, action=int(a), reward=reward, next_state=ns,
+                                      next_action=None, is_state_terminal=is_state_terminal, **kwargs)
+
+    def __len__(self):
+        return len(self.replay_buffer)
+
+    def __getattr__(self, name):    # sample, stop_current_episode, save, load などはそのまま渡す
+        return getattr(self.replay_buffer, name)
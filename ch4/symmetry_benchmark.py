@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+""" 盤面の対称性を使った学習の効果の計測
+
+symmetry=None / 'canonical' / 'expand' でmain()を同じエピソード数だけ学習させ、
+学習したQ関数（greedy）がランダムな相手に何勝したかを、学習時間１分あたりの勝ち数で比べる。
+
+python symmetry_benchmark.py [エピソード数] [評価の対局数]
+"""
+from __future__ import print_function
+import sys
+import time
+import chainer
+import symmetry as sym
+from alphabeta import evaluate, random_move
+from train_reversi_DNN import main, masked_observation, SIZE, BLACK, WHITE
+
+
+def make_move(q_func, mode):
+    """ 学習したQ関数でgreedyに置く場所を決める関数（canonicalなら正規形にしてから選ぶ） """
+    def move(board):
+        if not board.available_pos:
+            return None
+        obs = masked_observation(board)[None]
+        t = 0
+        if mode == 'canonical':
+            obs, t = sym.canonicalize(obs)
+            t = int(t[0])
+        with chainer.no_backprop_mode(), chainer.using_config('train', False):
+            action = int(q_func(obs).greedy_actions.data[0])
+        if mode == 'canonical':
+            action = int(sym.to_original_action(action, t))
+        return divmod(action, SIZE)
+    return move
+
+
+if __name__ == '__main__':
+    n_episodes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_games = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    results = []
+    for mode in (None, 'canonical', 'expand'):
+        start = time.perf_counter()
+        stats = main(n_episodes=n_episodes, masked=True, symmetry=mode)
+        minutes = (time.perf_counter() - start) / 60
+        move = make_move(stats['q_func'], mode)
+        win_b = evaluate(move, BLACK, random_move, n_games)[0]
+        win_w = evaluate(move, WHITE, random_move, n_games)[0]
+        results.append((mode, minutes, win_b, win_w))
+    print('===== {} episodes, ランダム相手に黒・白で各{}局 ====='.format(n_episodes, n_games))
+    for mode, minutes, win_b, win_w in results:
+        print('symmetry={!s:9}: 学習 {:.1f} 分, 黒 {} 勝, 白 {} 勝, {:.1f} 勝/分'.format(
+            mode, minutes, win_b, win_w, (win_b + win_w) / minutes))
@@ -0,0 +1,147 @@
+# -*- coding:utf-8 -*-
+""" 保存したチェックポイントの総当たり戦とEloレーティング
+
+カレントディレクトリの agent_black_N / agent_white_N を全て読み込み、
+黒のチェックポイント×白のチェックポイントの全ての組み合わせを、プロセスプールで並列に対戦させる。
+着手はmain_playと同じく置ける場所の中でQ値最大の場所（greedy）。
+qfunction.npz（numpy_qfunction.py export）を書き出してあれば、ワーカーはchainerを読み込まない。
+greedyだと毎回同じ棋譜になるので、最初の数手だけランダムに打って局を変える。
+結果はElo・勝率の表にしてCSVに書き出す。
+
+python tournament.py [--games 10] [--random-plies 2] [--workers 4] [--out tournament.csv]
+"""
+from __future__ import print_function
+import argparse
+import csv
+import glob
+import math
+import multiprocessing as mp
+import os
+import random
+import re
+import time
+import numpy as np
+from numpy_qfunction import NumpyQFunction, load_model
+from reversi import Board, BLACK, WHITE
+
+_Q_FUNCS = {}   # ワーカープロセスごとに読み込んだQ関数のキャッシュ
+
+
+def get_q_function(path):
+    if path not in _Q_FUNCS:
+        _Q_FUNCS[path] = load_model(path)
+    return _Q_FUNCS[path]
+
+
+def greedy(q_func, board):
+    if isinstance(q_func, NumpyQFunction):
+        return q_func.best_move(board)
+    from train_reversi_DNN import greedy_move
+    return greedy_move(q_func, board)
+
+
+def find_checkpoints(pattern):
+    """ agent_black_N などをNの順に並べる（書き込み中の .tmp- で始まるものは除く） """
+    paths = [p for p in glob.glob(pattern) if not os.path.basename(p).startswith('.tmp-')]
+    return sorted(paths, key=lambda p: int(re.findall(r'\d+', p)[-1]))
+
+
+def play_match(args):
+    """ 黒path_bと白path_wでn_games局対戦し、(path_b, path_w, 黒の勝ち, 黒の負け, 引き分け) を返す """
+    path_b, path_w, n_games, random_plies, seed = args
+    q_funcs = [None, get_q_function(path_b), get_q_function(path_w)]
+    rng = random.Random(seed)
+    board = Board()
+    win = lose = draw = 0
+    for _ in range(n_games):
+        board.board_reset()
+        ply = 0
+        while not board.game_end:
+            if not board.available_pos:
+                board.pss += 1
+                board.end_check()
+            else:
+                if ply < random_plies:  # 最初の数手はランダム
+                    pos = rng.choice(board.available_pos)
+                else:
+                    pos = greedy(q_funcs[board.turn], board)
+                board.agent_action(pos)
+                board.pss = 0
+                ply += 1
+            board.change_turn()
+        if board.nofb > board.nofw:
+            win += 1
+        elif board.nofb < board.nofw:
+            lose += 1
+        else:
+            draw += 1
+    return path_b, path_w, win, lose, draw
+
+
+def fit_elo(players, results, n_iter=500, k=16.0):
+    """ 対戦結果から平均1500のEloレーティングを反復計算する（順序に依存しない） """
+    rating = {p: 1500.0 for p in players}
+    for _ in range(n_iter):
+        expected = {p: 0.0 for p in players}
+        score = {p: 0.0 for p in players}
+        games = {p: 0 for p in players}
+        for b, w, win, lose, draw in results:
+            n = win + lose + draw
+            e = 1 / (1 + 10 ** ((rating[w] - rating[b]) / 400))  # 黒の期待勝率
+            expected[b] += n * e
+            expected[w] += n * (1 - e)
+            score[b] += win + 0.5 * draw
+            score[w] += lose + 0.5 * draw
+            games[b] += n
+            games[w] += n
+        for p in players:
+            if games[p]:
+                rating[p] += k * (score[p] - expected[p]) / math.sqrt(games[p])
+        mean = np.mean(list(rating.values()))
+        rating = {p: r - mean + 1500 for p, r in rating.items()}
+    return rating
+
+
+def run(n_games=10, random_plies=2, workers=None, out='tournament.csv'):
+    blacks = find_checkpoints('agent_black_*')
+    whites = find_checkpoints('agent_white_*')
+    tasks = [(b, w, n_games, random_plies, k) for k, (b, w) in enumerate((b, w) for b in blacks for w in whites)]
+    start = time.perf_counter()
+    pool = mp.Pool(workers or mp.cpu_count())
+    try:
+        results = pool.map(play_match, tasks, chunksize=max(1, len(whites) // 2))
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    players = blacks + whites
+    rating = fit_elo(players, results)
+    rows = []
+    for p in players:
+        color = BLACK if p in blacks else WHITE
+        win = sum(r[2] if color == BLACK else r[3] for r in results if r[color - 1] == p)
+        lose = sum(r[3] if color == BLACK else r[2] for r in results if r[color - 1] == p)
+        draw = sum(r[4] for r in results if r[color - 1] == p)
+        n = win + lose + draw
+        rows.append((p, 'black' if color == BLACK else 'white', n, win, lose, draw,
+                     win / n if n else 0.0, rating[p]))
+    rows.sort(key=lambda r: -r[7])
+    with open(out, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['checkpoint', 'color', 'games', 'win', 'lose', 'draw', 'win_rate', 'elo'])
+        for r in rows:
+            writer.writerow(list(r[:6]) + ['{:.3f}'.format(r[6]), '{:.1f}'.format(r[7])])
+    print('{} 組 × {} 局を {:.1f} 秒で対戦しました'.format(len(tasks), n_games, elapsed))
+    for r in rows:
+        print('{:24s} {:5s} {:5d}局 {:4d}勝 {:4d}敗 {:4d}分 勝率 {:.3f} Elo {:7.1f}'.format(*r))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--games', type=int, default=10, help='１組あたりの対局数')
+    parser.add_argument('--random-plies', type=int, default=2, help='最初にランダムに打つ手数')
+    parser.add_argument('--workers', type=int, default=None, help='プロセス数（省略時はCPU数）')
+    parser.add_argument('--out', default='tournament.csv', help='結果のCSV')
+    args = parser.parse_args()
+    run(args.games, args.random_plies, args.workers, args.out)
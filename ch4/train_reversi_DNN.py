@@ -5,24 +5,14 @@ import chainer.functions as F
 import chainer.links as L
 import chainerrl
 import numpy as np
+import os
 import sys
 import re  # 正規表現
 import random
 import copy
-import itertools
-
-# 定数定義 #
-SIZE = 4    # ボードサイズ SIZE*SIZE
-NONE = 0    # ボードのある座標にある石：なし
-BLACK = 1   # ボードのある座標にある石：黒
-WHITE = 2   # ボードのある座標にある石：しろ
-STONE = [' ', '●', '○']    # 石の表示用
-ROWLABEL = {chr(ord('a') + x): x + 1 for x in range(8)}  # ボードの横軸ラベル
-N2L = [''] + [chr(ord('a') + x) for x in range(8)]
-REWARD_WIN = 1      # 買った時の報酬
-REWARD_LOSE = -1    # 負けた時の報酬
-# ２次元のボード上での隣接８方向の定義
-DIR = tuple(itertools.product(range(-1, 2), range(-1, 2)))
+from reversi import (SIZE, NONE, BLACK, WHITE, STONE, ROWLABEL, N2L, REWARD_WIN, REWARD_LOSE, ILLEGAL_Q,
+                     DIR, ray_table, MoveCache, MOVE_CACHE, zobrist_table, masked_observation, Board,
+                     convert_coordinate, judge)  # ルールは軽量なreversiモジュールに分けてある
 
 
 class QFunction(chainer.Chain):
@@ -44,186 +34,158 @@ class QFunction(chainer.Chain):
         return chainerrl.action_value.DiscreteActionValue(self.l4(h))
 
 
-class Board():
-    """ リバーシボードクラス """
-    # インスタンス（最初はボードの初期化）
-
-    def __init__(self):
-        self.board_reset()
-
-    # ボードの初期化
-    def board_reset(self):
-        # 全ての石をクリア。ボードは２次元配列(i,j)で定義する
-        self.board = np.zeros((SIZE, SIZE), dtype=np.float32)
-        mid = SIZE // 2  # 真ん中の基準ポジション
-        # 初期４つの石を配置
-        self.board[mid, mid] = WHITE
-        self.board[mid - 1, mid - 1] = WHITE
-        self.board[mid - 1, mid] = BLACK
-        self.board[mid, mid - 1] = BLACK
-        self.winner = NONE  # 勝者
-        self.turn = BLACK   # 黒石スタート
-        self.game_end = False   # ゲーム終了チェックフラグ
-        self.pss = 0    # パスチェック用フラグ。双方がパスをするとゲーム終了
-        self.nofb = 0   # ボード上の黒石の数
-        self.nofw = 0   # ボード上の白石の数
-        self.available_pos = self.search_positions()    # self.turnの石が置ける場所のリスト
-
-    # 石を置く＆リバース処理
-    def put_stone(self, pos):
-        if self.is_available(pos):
-            self.board[pos[0], pos[1]] = self.turn
-            self.do_reverse(pos)    # リバース
-            return True
-        else:
-            return False
-
-    # ターンチェンジ
-    def change_turn(self):
-        self.turn = WHITE if self.turn == BLACK else BLACK
-        self.available_pos = self.search_positions()    # 石が置ける場所を探索しておく
-
-    # ランダムに石を置く場所を決める　（ε-greedy用）
-    def random_action(self):
-        if len(self.available_pos) > 0:
-            pos = random.choice(self.available_pos)  # 置く場所をランダムに決める
-            pos = pos[0] * SIZE + pos[1]    # １次元座標に変換（NNの教師データは１次元でないといけない）
-            return pos
-        return False    # 置く場所なし
-
-    # エージェントの行動と勝敗判定。置けない場所に置いたら負けとする
-    def agent_action(self, pos):
-        self.put_stone(pos)
-        self.end_check()    # 石が置けたら、ゲーム終了をチェック
-
-    # リバース処理
-    def do_reverse(self, pos):
-        for di, dj, in DIR:
-            opp = BLACK if self.turn == WHITE else WHITE    # 対戦相手の石
-            boardcopy = self.board.copy()   # 一旦ボードをコピーする（copyを使わないと参照渡しになるので注意）
-            i = pos[0]
-            j = pos[1]
-            flag = False    # 挟み判定用フラグ
-            while 0 <= i < SIZE and 0 <= j < SIZE:  # (i,j)座標が盤面内に収まっている間繰り返す
-                i += di  # i座標（縦）をずらす
-                j += dj  # j座標（横）をずらす
-                # 盤面に収まっており、かつ相手の石だったら
-                if 0 <= i < SIZE and 0 <= j < SIZE and boardcopy[i, j] == opp:
-                    flag = True
-                    boardcopy[i, j] = self.turn  # 自分の石にひっくり返す
-                elif not(0 <= i < SIZE and 0 <= j < SIZE) or (flag == False and boardcopy[i, j] != opp):
-                    break
-                # 自分と同じ色の石が来れば挟んでいるのでリバース処理を確定
-                elif boardcopy[i, j] == self.turn and flag == True:
-                    self.board = boardcopy.copy()
-                    break
-
-    # 石が置ける場所をリストアップする。石が置ける場所がなければ「パス」となる
-    def search_positions(self):
-        pos = []
-        emp = np.where(self.board == 0)  # 石が置かれていない場所を取得
-        for i in range(emp[0].size):    # 石が置かれていない全ての座標に対して
-            p = (emp[0][i], emp[1][i])  # (i,j)座標に変換
-            if self.is_available(p):
-                pos.append(p)   # 石が置ける場所の座標リストの生成
-        return pos
-
-    # 石が置けるかをチェックする
-    def is_available(self, pos):
-        if self.board[pos[0], pos[1]] != NONE:  # すでに石が置いてあれば、置けない
-            return False
-        opp = BLACK if self.turn == WHITE else WHITE
-        for di, dj in DIR:  # ８方向の挟み（リバースできるか）チェック
-            i = pos[0]
-            j = pos[1]
-            flag = False    # 挟み判定用フラグ
-            while 0 <= i < SIZE and 0 <= j < SIZE:  # (i,j)座標が盤面内に収まっている間繰り返す
-                i += di  # i座標（縦）をずらす
-                j += dj  # j座標（横）をずらす
-                # 盤面に収まっており、かつ相手の石だったら
-                if 0 <= i < SIZE and 0 <= j < SIZE and self.board[i, j] == opp:
-                    flag = True
-                elif not(0 <= i < SIZE and 0 <= j < SIZE) or (flag == False and self.board[i, j] != opp) or self.board[i, j] == None:
-                    break
-                elif self.board[i, j] == self.turn and flag == True:  # 自分と同じ色の石
-                    return True
-        return False
-
-    # ゲーム終了チェック
-    def end_check(self):
-        # ボードに全て石が埋まるか、双方がパスしたら
-        if np.count_nonzero(self.board) == SIZE * SIZE or self.pss == 2:
-            self.game_end = True
-            self.nofb = len(np.where(self.board == BLACK)[0])
-            self.nofw = len(np.where(self.board == WHITE)[0])
-            self.winner = BLACK if len(np.where(self.board == BLACK)[0]) > len(
-                np.where(self.board == WHITE)[0]) else WHITE
-
-    # ボード表示
-    def show_board(self):
-        print('  ', end='')
-        for i in range(1, SIZE + 1):
-            print(' {}'.format(N2L[i]), end='')  # 横軸ラベル表示
-        print('')
-        for i in range(0, SIZE):
-            print('{0:2d} '.format(i+1), end='')
-            for j in range(0, SIZE):
-                print('{} '.format(STONE[int(self.board[i][j])]), end='')
-            print('')
-
-# キーボードから入力した座標を２次元配列に対応するよう変換する
-
-
-def convert_coordinate(pos):
-    pos = pos.split(' ')
-    i = int(pos[0]) - 1
-    j = int(ROWLABEL[pos[1]]) - 1
-    return (i, j)   # タプルで返す。iが縦、jが横
-
-
-def judge(board, a, you):
-    if board.winner == a:
-        print('Game over. You lose!')
-    elif board.winner == you:
-        print('Game over You win!')
-    else:
-        print('Game over. Draw.')
+class MaskedQFunction(QFunction):
+    """ 合法手マスク付きのQ関数
 
+    入力は盤面（obs_size）の後ろに合法手マスク（n_actions）を連結したもの。
+    置けない場所のQ値をILLEGAL_Qにするので、greedyな行動は必ず置ける場所になる。
+    パラメータはQFunctionと同じなので、QFunctionで保存したモデルもそのまま読み込める。
+    """
 
-def main():
-    """ メイン関数(学習用) """
-    board = Board()  # ボード初期化
+    def __call__(self, x):
+        x = chainer.as_variable(x)
+        n = self.l4.out_size
+        q = super(MaskedQFunction, self).__call__(x[:, :-n]).q_values
+        legal = x.array[:, -n:] > 0
+        q = F.where(legal, q, self.xp.full(q.shape, ILLEGAL_Q, dtype=q.dtype))
+        return chainerrl.action_value.DiscreteActionValue(q)
+
+
+def load_q_function(path, n_nodes=256):
+    """ agent.save()で保存したディレクトリからQ関数（model.npz）だけを読み込む """
+    q_func = QFunction(SIZE * SIZE, SIZE * SIZE, n_nodes)
+    chainer.serializers.load_npz(os.path.join(path, 'model.npz'), q_func)
+    return q_func
+
+
+def greedy_move(q_func, board):
+    """ 置ける場所の中でQ値最大の場所を返す。置く場所がなければNone """
+    if not board.available_pos:
+        return None
+    with chainer.no_backprop_mode(), chainer.using_config('train', False):
+        q = q_func(board.board.reshape(1, -1).astype(np.float32)).q_values.data
+    legal = masked_observation(board)[SIZE * SIZE:] > 0
+    return divmod(int(np.where(legal, chainer.cuda.to_cpu(q[0]), -np.inf).argmax()), SIZE)
+
+
+def main(n_episodes=20000, use_bitboard=False, masked=False, packed_replay=False, symmetry=None,
+         prioritized=False, profile=None, profile_interval=100, checkpoint_dir=None, keep=3, resume=False,
+         n_nodes=256, gamma=0.99, minibatch_size=128, target_update_interval=1000, decay_steps=50000,
+         callback=None):
+    """ メイン関数(学習用)
+
+    n_nodes: 中間層のノード数、gamma: 減衰率、minibatch_size: バッチサイズ、
+    target_update_interval: target networkを同期する間隔、decay_steps: εを下げきるまでのステップ数。
+    use_bitboard=Trueでビットボード版の盤面を使う。
+    masked=TrueでMaskedQFunctionを使い、置ける場所だけから行動を選ぶ（１手につき順伝播１回）。
+    packed_replay=Trueで盤面を2bitに詰めるPackedReplayBufferを使う。
+    symmetry='canonical'で盤面を回転・反転の8通りのうち正規形に揃えて学習し、
+    symmetry='expand'で遷移を8通りに増やしてReplay Bufferに入れる。
+    prioritized=TrueでTD誤差の大きい遷移ほど多く使う優先度付きReplay Bufferを使う（packed_replayとは併用できない）。
+    profile='profile' などを渡すと段階ごとの時間を計測し、profile_intervalエピソードごとに
+    表示して profile.csv / profile.json に書き出す（Noneなら計測のコストはかからない）。
+    checkpoint_dir='checkpoints' などを渡すと、1000エピソードごとにモデル・optimizer・Replay Buffer・
+    ステップ数・勝敗数をバックグラウンドで保存し（新しいものからkeep個）、resume=Trueで最新のものから再開する。
+    packed_replayと一緒に使うとReplay Bufferはcheckpoint_dirの下のメモリマップになる。
+    callback(エピソード番号, q_func) を100エピソードごとに呼び、Falseが返ってきたら学習を打ち切る（sweep.py用）。
+    最後に順伝播（act_and_train）の回数・着手数と学習したQ関数・黒のReplay Bufferを返す。
+    """
+    if packed_replay and prioritized:   # PackedReplayBufferには優先度がない
+        raise ValueError('packed_replayとprioritizedは一緒に使えません')
+    if use_bitboard:
+        from bitboard import BitBoard
+        board = BitBoard()  # ボード初期化
+    else:
+        board = Board()  # ボード初期化
 
     obs_size = SIZE * SIZE  # ボードサイズ（=NN入力次元数）
     n_actions = SIZE * SIZE  # 行動数はSIZE*SIZE(ボードのどこに石を置くか)
-    n_nodes = 256   # 中間層のノード数
-    q_func = QFunction(obs_size, n_actions, n_nodes)
+    if masked:
+        q_func = MaskedQFunction(obs_size, n_actions, n_nodes)
+        observe = masked_observation    # 盤面＋合法手マスクを入力にする
+    else:
+        q_func = QFunction(obs_size, n_actions, n_nodes)
+        observe = lambda board: np.reshape(board.board.copy(), (-1,))
 
     # optimizerの設定
     optimizer = chainer.optimizers.Adam(eps=1e-2)
     optimizer.setup(q_func)
-    # 減衰率
-    gamma = 0.99
+    if symmetry is not None:
+        import symmetry as sym
+    sym_t = [0]     # canonical: 今の観測を正規形にした変換の番号
+
+    # ランダムに置く場所（canonicalなら正規形の盤面上の座標にする）
+    def random_action():
+        pos = board.random_action()
+        if symmetry == 'canonical' and pos is not False:
+            pos = int(sym.to_canonical_action(pos, sym_t[0]))
+        return pos
+
     # ε-greedy法
     explorer = chainerrl.explorers.LinearDecayEpsilonGreedy(
-        start_epsilon=1.0, end_epsilon=0.1, decay_steps=50000, random_action_func=board.random_action)
+        start_epsilon=1.0, end_epsilon=0.1, decay_steps=decay_steps, random_action_func=random_action)
     # Experience Replay用のバッファ（十分大きく、エージェントごとに用意）
-    replay_buffer_b = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
-    replay_buffer_w = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
+    if packed_replay:
+        from packed_replay_buffer import PackedReplayBuffer
+        # チェックポイントを取るならメモリマップにして、スナップショットごとにコピーしないようにする
+        path_b = path_w = None
+        if checkpoint_dir is not None:
+            path_b = os.path.join(checkpoint_dir, 'replay_black')
+            path_w = os.path.join(checkpoint_dir, 'replay_white')
+        replay_buffer_b = PackedReplayBuffer(10 ** 6, len(observe(board)), path=path_b)
+        replay_buffer_w = PackedReplayBuffer(10 ** 6, len(observe(board)), path=path_w)
+    elif prioritized:
+        from prioritized_replay_buffer import PrioritizedReplayBuffer
+        replay_buffer_b = PrioritizedReplayBuffer(10 ** 6)
+        replay_buffer_w = PrioritizedReplayBuffer(10 ** 6)
+    else:
+        replay_buffer_b = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
+        replay_buffer_w = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
+    if symmetry == 'expand':    # 遷移を8通りの対称形に増やして入れる
+        replay_buffer_b = sym.SymmetricReplayBuffer(replay_buffer_b)
+        replay_buffer_w = sym.SymmetricReplayBuffer(replay_buffer_w)
     # エージェント。黒石用・白石用のエージェントを別々に学習する。DQNを利用。バッチサイズを少し大きめに設定
     agent_black = chainerrl.agents.DQN(q_func, optimizer, replay_buffer_b, gamma, explorer,
-                                       replay_start_size=1000, minibatch_size=128, update_interval=1, target_update_interval=1000)
-    agent_white = chainerrl.agents.DQN(q_func, optimizer, replay_buffer_b, gamma, explorer,
-                                       replay_start_size=1000, minibatch_size=128, update_interval=1, target_update_interval=1000)
+                                       replay_start_size=1000, minibatch_size=minibatch_size, update_interval=1,
+                                       target_update_interval=target_update_interval)
+    agent_white = chainerrl.agents.DQN(q_func, optimizer, replay_buffer_w, gamma, explorer,
+                                       replay_start_size=1000, minibatch_size=minibatch_size, update_interval=1,
+                                       target_update_interval=target_update_interval)
     agents = ['', agent_black, agent_white]
+    timer = None
+    if profile is not None:     # 段階ごとの時間計測
+        from phase_timer import PhaseTimer, instrument_agent
+        timer = PhaseTimer()
+        instrument_agent(timer, agent_black)
+        instrument_agent(timer, agent_white)
+        timer.wrap(board, 'change_turn', 'move_gen')    # 手番交代と次の手番の合法手生成
+        timer.wrap(board, 'agent_action', 'put_stone')  # 石の配置と終局判定
 
-    n_episodes = 20000  # 学習ゲーム回数
     win = 0     # 黒の勝利回数
     lose = 0    # 黒の敗北回数
     draw = 0    # 引き分け回数
+    n_forward = 0   # act_and_trainの呼び出し回数（＝順伝播の回数）
+    n_moves = 0     # 着手数
+
+    # チェックポイント（agent.save()もバックグラウンドで行う）
+    from checkpoint import Checkpointer, latest, restore
+    checkpointer = Checkpointer(checkpoint_dir, keep)
+    ckpt_agents = {'black': agent_black, 'white': agent_white}
+    ckpt_buffers = {'black': replay_buffer_b, 'white': replay_buffer_w}
+    start = 0
+    snapshot = latest(checkpoint_dir) if resume else None
+    if snapshot is not None:
+        state = restore(snapshot, ckpt_agents, ckpt_buffers)
+        start = state['episode']
+        n_forward, n_moves = state['forward_passes'], state['moves']
+        print('{} から再開します（エピソード {}）'.format(snapshot, start))
+    elif packed_replay and checkpoint_dir is not None:     # 前の実行のメモリマップは使わない
+        replay_buffer_b.meta[...] = 0
+        replay_buffer_w.meta[...] = 0
 
     # ゲーム開始（エピソードの繰り返し実行）
-    for i in range(1, n_episodes + 1):
+    i = start
+    for i in range(start + 1, n_episodes + 1):
         board.board_reset()
         rewards = [0, 0, 0]  # 報酬リセット
 
@@ -235,10 +197,17 @@ def main():
                 board.end_check()
             else:
                 # 石を配置する場所を取得。ボードは２次元だが、NNへの入力のため１次元に変換
-                boardcopy = np.reshape(board.board.copy(), (-1,))
-                while True:  # 置ける場所が見つかるまで繰り返す。
+                boardcopy = observe(board)
+                if symmetry == 'canonical':
+                    boardcopy, t = sym.canonicalize(boardcopy[None])
+                    boardcopy = boardcopy[0]
+                    sym_t[0] = int(t[0])
+                while True:  # 置ける場所が見つかるまで繰り返す。（maskedなら１回で見つかる）
                     pos = agents[board.turn].act_and_train(
                         boardcopy, rewards[board.turn])
+                    n_forward += 1
+                    if symmetry == 'canonical':  # 元の盤面の座標に戻す
+                        pos = int(sym.to_original_action(pos, sym_t[0]))
                     pos = divmod(pos, SIZE)  # 座標を２次元(i,j)に変換
                     if board.is_available(pos):
                         break
@@ -246,6 +215,7 @@ def main():
                         rewards[board.turn] = REWARD_LOSE   # 石が置けない場所であれば負の報酬
                 # 石を配置
                 board.agent_action(pos)
+                n_moves += 1
                 if board.pss == 1:  # 石が配置できた場合にはパスフラグをリセットしておく（双方が連続パスするとゲーム終了する）
                     board.pss = 0
 
@@ -262,7 +232,9 @@ def main():
                     rewards[WHITE] = REWARD_WIN     # 白の負け報酬
                     lose += 1
                 # エピソードを終了して学習
-                boardcopy = np.reshape(board.board.copy(), (-1,))
+                boardcopy = observe(board)
+                if symmetry == 'canonical':
+                    boardcopy = sym.canonicalize(boardcopy[None])[0][0]
                 # 勝者のエージェントの学習
                 agents[board.turn].stop_episode_and_train(
                     boardcopy, rewards[board.turn], True)
@@ -281,71 +253,68 @@ def main():
                 agent_black.get_statistics(), agent_black.explorer.epsilon))
             print('<WHITE> statistics: {}, epsilon {}'.format(
                 agent_white.get_statistics(), agent_white.explorer.epsilon))
+            print('<MOVE CACHE> {}'.format(MOVE_CACHE.info()))
+            print('<FORWARD> {:.3f} passes per move'.format(n_forward / n_moves))
             # カウンタ変数の初期化
             win = 0
             lose = 0
             draw = 0
+        # 段階ごとの時間（profile_intervalエピソードごと）
+        if timer is not None and i % profile_interval == 0:
+            timer.counters.update([('episodes', i), ('forward_passes', n_forward), ('moves', n_moves)])
+            print('<TIMER>\n{}'.format(timer.report()))
+            timer.dump(profile)
 
-        if i % 1000 == 0:   # 1000エピソードごとにモデルを保存する
-            agent_black.save('agent_black_' + str(i))
-            agent_white.save('agent_white_' + str(i))
+        if i % 1000 == 0:   # 1000エピソードごとにモデルを保存する（書き込みはバックグラウンド）
+            # 勝敗数は100エピソードごとに表示して0に戻すので、累計の順伝播の回数と手数だけを残す
+            checkpointer.save(i, ckpt_agents, ckpt_buffers,
+                              state={'forward_passes': n_forward, 'moves': n_moves},
+                              exports={'agent_black_' + str(i): agent_black, 'agent_white_' + str(i): agent_white})
+
+        if callback is not None and i % 100 == 0 and callback(i, q_func) is False:
+            break   # 見込みのない設定は打ち切る
+    checkpointer.close()
+
+    return {'forward_passes': n_forward, 'moves': n_moves, 'q_func': q_func, 'replay_buffer': replay_buffer_b,
+            'episodes': i}
 
 
 def main_play():
     """ メイン関数(プレイ用) """
     board = Board()  # ボード初期化
 
-    obs_size = SIZE * SIZE  # ボードサイズ（=NN入力次元数）
-    n_actions = SIZE * SIZE  # 行動数はSIZE*SIZE(ボードのどこに石を置くか)
-    n_nodes = 256   # 中間層のノード数
-    q_func = QFunction(obs_size, n_actions, n_nodes)
-
-    # optimizerの設定
-    optimizer = chainer.optimizers.Adam(eps=1e-2)
-    optimizer.setup(q_func)
-    # 減衰率
-    gamma = 0.99
-    # ε-greedy法
-    explorer = chainerrl.explorers.LinearDecayEpsilonGreedy(
-        start_epsilon=1.0, end_epsilon=0.1, decay_steps=50000, random_action_func=board.random_action)
-    # Experience Replay用のバッファ（十分大きく、エージェントごとに用意）
-    replay_buffer = chainerrl.replay_buffers.ReplayBuffer(capacity=10 ** 6)
-    # エージェント。DQNを利用。バッチサイズを少し大きめに設定
-    agent = chainerrl.agents.DQN(q_func, optimizer, replay_buffer, gamma, explorer,
-                                 replay_start_size=1000, minibatch_size=128, update_interval=1, target_update_interval=1000)
-
     ### ここからゲームスタート ###
     print('=== リバーシ ===')
     you = input('先行（黒石, 1） or 後攻（白石, 2）を選択：')
     you = int(you)
     trn = you
     assert(you == BLACK or you == WHITE)
-    level = input('難易度（弱 1〜10 強）')
-    level = int(level) * 2000
+    level = input('難易度（弱 1〜10 強、ab: αβ探索、perfect: 完全読み）')
+    if level == 'ab':
+        from alphabeta import AlphaBetaPlayer
+        player = AlphaBetaPlayer(time_limit=1.0)
+    elif level == 'perfect':
+        from solver import PerfectPlayer
+        player = PerfectPlayer()    # テーブルがなければ最初に解析する（数秒）
+    else:
+        # 学習済みのQ関数（agent_{white,black}_{level*2000}）で、置ける場所の中からgreedyに選ぶ
+        from play_service import PlayService
+        player = PlayService().player(int(level))
     if you == BLACK:
         s = '「●」（先行）'
-        file = 'agent_white_' + str(level)
         a = WHITE
     else:
         s = '「◯」（後攻）'
-        file = 'agent_black_' + str(level)
         a = BLACK
-    agent.load(file)
     print('あなたは{}です。ゲームスタート！'.format(s))
     board.show_board()
 
     # ゲーム開始
     while not board.game_end:
         if trn == 2:
-            boardcopy = np.reshape(board.board.copy(), (-1,))  # ボードを１次元に変換
-            pos = divmod(agent.act(boardcopy), SIZE)
-            # NNで置く場所が置けない場所であれば置ける場所からランダムに選択する
-            if not board.is_available(pos):
-                pos = board.random_action()
-                if not pos:  # 置く場所がなければパス
-                    board.pss += 1
-                else:
-                    pos = divmod(pos, SIZE)  # 座標を２次元に変換
+            pos = player.act(board)
+            if pos is None:  # 置く場所がなければパス
+                board.pss += 1
             print('エージェントのターン --> ', end='')
             if board.pss > 0 and not pos:
                 print('パスします。{}'.format(board.pss))